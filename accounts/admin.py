@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import Member, Role, AttendanceRecord, Event, Volunteer
-from .models import PrayerTeam, PrayerRequest, PrayerReaction
+from .models import PrayerTeam, PrayerRequest, PrayerReaction, MpesaCallback, ReportArtifact
+from .models import MemberEngagement
 
 # Register simple models
 admin.site.register(PrayerTeam)
@@ -21,3 +22,34 @@ class PrayerRequestAdmin(admin.ModelAdmin):
 @admin.register(PrayerReaction)
 class PrayerReactionAdmin(admin.ModelAdmin):
     list_display = ('prayer', 'user', 'created_at')
+
+
+# M-Pesa callback inbox (read-only: rows are Daraja's payloads as received)
+@admin.register(MpesaCallback)
+class MpesaCallbackAdmin(admin.ModelAdmin):
+    list_display = ('checkout_request_id', 'result_code', 'received_at', 'processed_at', 'error')
+    list_filter = ('result_code', 'processed_at')
+    search_fields = ('checkout_request_id',)
+    readonly_fields = ('checkout_request_id', 'result_code', 'payload', 'received_at', 'processed_at', 'error')
+
+
+@admin.register(ReportArtifact)
+class ReportArtifactAdmin(admin.ModelAdmin):
+    list_display = ('period_start', 'period_end', 'status', 'size', 'created_at', 'generated_at')
+    list_filter = ('status',)
+    readonly_fields = ('key', 'created_at', 'generated_at')
+
+
+# Scores are rebuilt nightly; edits here would be overwritten
+@admin.register(MemberEngagement)
+class MemberEngagementAdmin(admin.ModelAdmin):
+    list_display = ('member', 'score', 'level', 'attendance_rate', 'giving_months', 'volunteer_roles', 'computed_at')
+    list_filter = ('level',)
+    search_fields = ('member__user__username', 'member__user__first_name', 'member__user__last_name')
+    ordering = ('-score',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,325 @@
+# accounts/analytics.py
+"""
+Giving and attendance trends for the reports page, computed with NumPy.
+
+Each source is read with one grouped query (completed gifts per day from
+the daily ledger; attendance per service day from check-ins plus
+headcounts) into a dense daily array covering up to HISTORY_YEARS.
+Everything after the load is array arithmetic, with no Python loop over
+days or months:
+
+* rolling means use a cumulative sum, so a window costs one subtraction;
+* months are summed with ``np.add.at`` into a month index;
+* year-over-year compares each month with the one 12 places earlier;
+* seasonality is each calendar month's share of its year, averaged over
+  the complete years available;
+* the forecast fits a straight line to the deseasonalised months and puts
+  the season back on.
+
+The result is cached for the day under the donations, attendance and
+events data versions.
+
+``cohort_retention`` groups members by the month they joined and reports
+the share still attending 1, 3, 6 and 12 months later, from one grouped
+attendance query pivoted into a cohort x month-offset matrix.
+"""
+from datetime import date
+
+import numpy as np
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from attendance.models import Attendance, EventHeadcount
+from attendance.streaks import SEEN_STATUSES
+from donations.models import DailyLedger
+from koma.cache import get_or_compute, versioned_key
+
+from .models import Member
+
+NAMESPACES = ("donations", "attendance", "events")
+HISTORY_YEARS = 10
+FORECAST_MONTHS = 12
+CHART_MONTHS = 24
+COHORT_NAMESPACES = ("members", "attendance", "events")
+COHORT_OFFSETS = (1, 3, 6, 12)
+COHORT_MONTHS = 24
+
+
+# ------------------------------
+# Loading
+# ------------------------------
+def _dense(rows, since, until):
+    """Scatter ``(date, value)`` rows into a float array with one slot per day."""
+    days = (until - since).days + 1
+    values = np.zeros(days, dtype=np.float64)
+    flat = np.fromiter((v for day, value in rows for v in (day.toordinal(), value)), dtype=np.float64)
+    index = flat[0::2].astype(np.int64) - since.toordinal()
+    keep = (index >= 0) & (index < days)
+    np.add.at(values, index[keep], flat[1::2][keep])
+    return values
+
+
+def daily_giving(since, until):
+    """Completed donations per day from ``since`` to ``until`` inclusive."""
+    rows = (
+        DailyLedger.objects.filter(kind="donation", status="completed", day__range=(since, until))
+        .values_list("day")
+        .annotate(amount=Sum("total"))
+        .order_by()
+    )
+    return _dense(rows, since, until)
+
+
+def daily_attendance(since, until):
+    """People at services per service day: check-ins plus headcount-mode services."""
+    checked_in = (
+        Attendance.objects.filter(status__in=SEEN_STATUSES)
+        .annotate(day=TruncDate("event__date"))
+        .filter(day__range=(since, until))
+        .values_list("day")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    headcounts = (
+        EventHeadcount.objects.annotate(day=TruncDate("event__date"))
+        .filter(day__range=(since, until))
+        .values_list("day")
+        .annotate(count=Sum(F("adults") + F("children") + F("visitors") + F("online")))
+        .order_by()
+    )
+    return _dense(checked_in, since, until) + _dense(headcounts, since, until)
+
+
+# ------------------------------
+# Vectorised measures
+# ------------------------------
+def rolling_mean(values, window):
+    """Trailing ``window``-point mean; NaN until a full window is available."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+
+def monthly(values, since):
+    """Sum a daily array into calendar months. Returns (month index, totals)."""
+    days = np.datetime64(since, "D") + np.arange(len(values))
+    months = days.astype("datetime64[M]")
+    first = months[0] if len(months) else np.datetime64(since, "M")
+    index = (months - first).astype(np.int64)
+    totals = np.zeros(index[-1] + 1 if len(index) else 0)
+    np.add.at(totals, index, values)
+    return first + np.arange(len(totals)), totals
+
+
+def year_over_year(totals):
+    """Percentage change of each month against the same month a year before (NaN without one)."""
+    change = np.full(len(totals), np.nan)
+    if len(totals) > 12:
+        before = totals[:-12]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change[12:] = np.where(before > 0, (totals[12:] - before) / before * 100, np.nan)
+    return change
+
+
+def seasonal_index(totals, months):
+    """
+    Twelve factors (Jan..Dec) averaging 1: how far each calendar month sits
+    above or below its year's mean. Flat (all ones) with under two complete
+    years of history.
+    """
+    calendar_month = months.astype(np.int64) % 12
+    starts = np.flatnonzero(calendar_month == 0)
+    if not len(starts):
+        return np.ones(12)
+    years = (len(totals) - starts[0]) // 12
+    if years < 2:
+        return np.ones(12)
+    block = totals[starts[0]:starts[0] + years * 12].reshape(years, 12)
+    means = block.mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.where(means > 0, block / means, np.nan)
+    if np.isnan(ratios).all():
+        return np.ones(12)
+    index = np.nanmean(ratios, axis=0)
+    index = np.where(np.isnan(index), 1.0, index)
+    return index / index.mean()
+
+
+def forecast(totals, months, horizon=FORECAST_MONTHS):
+    """
+    Seasonal linear forecast for the ``horizon`` months after ``months``.
+
+    Returns (future months, values); empty with fewer than three months.
+    """
+    if len(totals) < 3:
+        return months[:0], totals[:0]
+    season = seasonal_index(totals, months)
+    calendar_month = months.astype(np.int64) % 12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        level = np.where(season[calendar_month] > 0, totals / season[calendar_month], 0.0)
+    t = np.arange(len(totals))
+    slope, intercept = np.polyfit(t, level, 1)
+    future = months[-1] + 1 + np.arange(horizon)
+    ahead = (intercept + slope * (len(totals) + np.arange(horizon))) * season[future.astype(np.int64) % 12]
+    return future, np.clip(ahead, 0, None)
+
+
+# ------------------------------
+# Payload
+# ------------------------------
+def _list(values, digits=2):
+    """JSON-safe floats (NaN -> None)."""
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def _labels(months):
+    return [str(m) for m in months]
+
+
+def _window(values, today, since, days):
+    """Sum of the ``days`` days up to ``today`` (inclusive)."""
+    end = (today - since).days + 1
+    return round(float(values[max(end - days, 0):end].sum()), 2)
+
+
+def _change(now, before):
+    return round((now - before) / before * 100, 1) if before else None
+
+
+def _year_before(day):
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:  # 29 February
+        return day.replace(year=day.year - 1, day=28)
+
+
+def _series(values, since, today, with_forecast):
+    last_year = _year_before(today)
+    months, totals = monthly(values, since)
+    # Fit from the first month with data, and leave out the running month
+    # (it is still partial); both are still shown.
+    first = int(np.argmax(totals > 0))
+    complete, complete_months = totals[first:-1], months[first:-1]
+    shown = slice(max(len(months) - CHART_MONTHS, 0), None)
+    rolling = rolling_mean(values, 28)
+    payload = {
+        "months": _labels(months[shown]),
+        "totals": _list(totals[shown]),
+        "moving_average": _list(rolling_mean(totals, 3)[shown]),
+        "yoy_pct": _list(year_over_year(totals)[shown], 1),
+        "seasonality": _list(seasonal_index(complete, complete_months), 3),
+        "rolling_28": {
+            "days": np.datetime_as_string(np.datetime64(today, "D") - np.arange(len(values))[:365][::-1]).tolist(),
+            "values": _list(rolling[-365:]),
+        },
+        "last_28_days": _window(values, today, since, 28),
+        "last_28_days_prior_year": _window(values, last_year, since, 28),
+        "ytd": _window(values, today, since, today.timetuple().tm_yday),
+        "ytd_prior_year": _window(values, last_year, since, last_year.timetuple().tm_yday),
+    }
+    payload["last_28_days_change_pct"] = _change(payload["last_28_days"], payload["last_28_days_prior_year"])
+    payload["ytd_change_pct"] = _change(payload["ytd"], payload["ytd_prior_year"])
+    if with_forecast:
+        future, ahead = forecast(complete, complete_months)
+        payload["forecast"] = {"months": _labels(future), "values": _list(ahead)}
+    return payload
+
+
+def _compute(today):
+    since = date(today.year - HISTORY_YEARS, 1, 1)
+    return {
+        "as_of": today.isoformat(),
+        "giving": _series(daily_giving(since, today), since, today, with_forecast=True),
+        "attendance": _series(daily_attendance(since, today), since, today, with_forecast=False),
+    }
+
+
+def trends_key(today=None):
+    return versioned_key(NAMESPACES, "trends", (today or timezone.localdate()).isoformat())
+
+
+def trends(today=None):
+    """The trends payload, cached for the day until giving or attendance changes."""
+    today = today or timezone.localdate()
+    return get_or_compute(trends_key(today), lambda: _compute(today))
+
+
+# ------------------------------
+# Cohort retention
+# ------------------------------
+def _month_number(day):
+    return day.year * 12 + day.month - 1
+
+
+def _compute_cohorts(today, cohorts):
+    current = _month_number(today)
+    first = current - cohorts + 1
+    since = date(first // 12, first % 12 + 1, 1)
+
+    sizes = np.zeros(cohorts, dtype=np.int64)
+    joined = (
+        Member.objects.filter(join_date__gte=since, join_date__lte=today)
+        .annotate(cohort=TruncMonth("join_date"))
+        .values_list("cohort")
+        .annotate(n=Count("pk"))
+        .order_by()
+    )
+    for cohort, n in joined:
+        sizes[_month_number(cohort) - first] += n
+
+    # Distinct members seen per (join month, attendance month), in one query
+    seen = (
+        Attendance.objects.filter(
+            status__in=SEEN_STATUSES, member__member__join_date__gte=since, member__member__join_date__lte=today,
+        )
+        .annotate(cohort=TruncMonth("member__member__join_date"), month=TruncMonth("event__date"))
+        .values_list("cohort", "month")
+        .annotate(n=Count("member", distinct=True))
+        .order_by()
+    )
+    flat = np.fromiter(
+        (v for cohort, month, n in seen for v in (_month_number(cohort), _month_number(month), n)),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    width = max(COHORT_OFFSETS) + 1
+    retained = np.zeros((cohorts, width), dtype=np.int64)
+    rows, offsets = flat[:, 0] - first, flat[:, 1] - flat[:, 0]
+    keep = (offsets >= 0) & (offsets < width)
+    np.add.at(retained, (rows[keep], offsets[keep]), flat[keep, 2])
+
+    columns = np.array(COHORT_OFFSETS)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = retained[:, columns] / sizes[:, None] * 100
+    # A cohort can't be measured at an offset that hasn't come round yet
+    observable = (first + np.arange(cohorts))[:, None] + columns[None, :] <= current
+    share = np.where(observable & (sizes[:, None] > 0), share, np.nan)
+    # Weighted by cohort size, over the cohorts that can be measured
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = (retained[:, columns] * observable).sum(axis=0) / (sizes[:, None] * observable).sum(axis=0) * 100
+
+    labels = [str(m) for m in np.datetime64(since, "M") + np.arange(cohorts)]
+    return {
+        "offsets": list(COHORT_OFFSETS),
+        "cohorts": [
+            {"month": label, "size": int(size), "retention": _list(row, 1)}
+            for label, size, row in zip(labels, sizes, share)
+            if size
+        ][::-1],
+        "average": _list(average, 1),
+    }
+
+
+def cohort_retention(today=None, cohorts=COHORT_MONTHS):
+    """
+    Retention of the last ``cohorts`` join-month cohorts, newest first.
+
+    Each cohort lists its size and the percentage of its members who
+    attended a service 1, 3, 6 and 12 months after the month they joined
+    (None where that month hasn't happened yet).
+    """
+    today = today or timezone.localdate()
+    key = versioned_key(COHORT_NAMESPACES, "cohorts", today.strftime("%Y-%m"), cohorts)
+    return get_or_compute(key, lambda: _compute_cohorts(today, cohorts))
@@ -1,6 +1,9 @@
 import json
+from channels.consumer import SyncConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from . import reports, stk
+
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         if self.scope["user"].is_anonymous:
@@ -18,3 +21,20 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'message': message
         }))
+
+
+# =====================================================
+# Background workers (python manage.py runworker mpesa-stk)
+# =====================================================
+class MpesaStkWorker(SyncConsumer):
+    def stk_push(self, message):
+        stk.submit(message["donation_id"])
+
+    def callback_process(self, message):
+        stk.process_callbacks([message["checkout_request_id"]])
+
+
+# python manage.py runworker reports
+class ReportWorker(SyncConsumer):
+    def report_build(self, message):
+        reports.build_pdf(message["artifact_id"])
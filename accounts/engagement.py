@@ -0,0 +1,155 @@
+# accounts/engagement.py
+"""
+Nightly member engagement scoring.
+
+Five features are read with one grouped query each over the last
+ENGAGEMENT_WINDOW_DAYS (180 by default), keyed by user id:
+
+* services attended (Present or Late), as a share of the services held;
+* months with a completed gift, as a share of the months in the window;
+* approved volunteer roles (any role counts in full);
+* prayer activity: requests made plus prayers for others;
+* chat messages sent.
+
+They are laid out as a member x feature matrix. Counts without a natural
+ceiling are squashed with log1p against a cap, so a very chatty member
+doesn't outscore a regular attender. The score is the weighted sum, 0-100,
+stored in MemberEngagement for sorting and filtering member_management.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from attendance.models import Attendance
+from attendance.streaks import SEEN_STATUSES, past_services
+from chat.models import Message
+from donations.models import Donation
+from volunteers.models import Volunteer
+
+from .models import Member, MemberEngagement, PrayerReaction, PrayerRequest
+
+FEATURES = ("attendance", "giving", "volunteering", "prayer", "chat")
+WEIGHTS = {"attendance": 0.40, "giving": 0.30, "volunteering": 0.15, "prayer": 0.10, "chat": 0.05}
+# Counts at or above these earn the feature's full weight
+CAPS = {"prayer": 10, "chat": 50}
+LEVELS = ((60, "high"), (30, "medium"), (1, "low"), (0, "inactive"))
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ------------------------------
+# Grouped feature queries
+# ------------------------------
+def _counts(queryset, key):
+    """``{user id: count}`` from one GROUP BY query."""
+    return dict(queryset.values_list(key).annotate(n=Count("pk")).order_by())
+
+
+def feature_counts(since):
+    """Raw per-user counts for every feature, plus the window's service count."""
+    now = timezone.now()
+    services = past_services().filter(date__gte=since).count()
+    gift_months = dict(
+        Donation.objects.filter(status="completed", date_donated__gte=since, member__isnull=False)
+        .annotate(month=TruncMonth("date_donated"))
+        .values_list("member__user_id")
+        .annotate(n=Count("month", distinct=True))
+        .order_by()
+    )
+    prayer = _counts(PrayerRequest.objects.filter(created_at__gte=since), "user_id")
+    for user_id, n in _counts(PrayerReaction.objects.filter(created_at__gte=since), "user_id").items():
+        prayer[user_id] = prayer.get(user_id, 0) + n
+    return services, {
+        "attendance": _counts(
+            Attendance.objects.filter(status__in=SEEN_STATUSES, event__date__gte=since, event__date__lte=now),
+            "member_id",
+        ),
+        "giving": gift_months,
+        "volunteering": _counts(Volunteer.objects.filter(status__iexact="approved"), "user_id"),
+        "prayer": prayer,
+        "chat": _counts(Message.objects.filter(timestamp__gte=since), "sender_id"),
+    }
+
+
+def _column(counts, user_ids):
+    """Counts for ``user_ids`` (sorted) as an array, zero for users without any."""
+    column = np.zeros(len(user_ids))
+    if counts:
+        keys = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        at = np.searchsorted(user_ids, keys)
+        found = (at < len(user_ids)) & (user_ids[np.minimum(at, len(user_ids) - 1)] == keys)
+        column[at[found]] = values[found]
+    return column
+
+
+# ------------------------------
+# Vectorised scoring
+# ------------------------------
+def normalise(raw, services, months):
+    """Scale the raw member x feature matrix to 0..1 per feature."""
+    scaled = np.empty_like(raw)
+    scaled[:, 0] = raw[:, 0] / services if services else 0
+    scaled[:, 1] = raw[:, 1] / months
+    scaled[:, 2] = raw[:, 2] > 0
+    for i, name in ((3, "prayer"), (4, "chat")):
+        scaled[:, i] = np.log1p(raw[:, i]) / np.log1p(CAPS[name])
+    return np.clip(scaled, 0, 1)
+
+
+def score(scaled, weights=None):
+    weights = weights or _setting("ENGAGEMENT_WEIGHTS", WEIGHTS)
+    vector = np.array([weights[name] for name in FEATURES])
+    return np.rint(scaled @ vector / vector.sum() * 100).astype(np.int64)
+
+
+def level_of(scores):
+    thresholds = np.array([threshold for threshold, _ in LEVELS])
+    names = np.array([name for _, name in LEVELS])
+    # LEVELS is ordered high to low; the first threshold met wins
+    return names[np.argmax(scores[:, None] >= thresholds[None, :], axis=1)]
+
+
+def compute(now=None, batch_size=1000):
+    """Score every member and store the results. Returns the number of members scored."""
+    now = now or timezone.now()
+    window = _setting("ENGAGEMENT_WINDOW_DAYS", 180)
+    since = now - timedelta(days=window)
+
+    members = np.array(list(Member.objects.order_by("user_id").values_list("pk", "user_id")), dtype=np.int64)
+    if not len(members):
+        return 0
+    member_ids, user_ids = members[:, 0], members[:, 1]
+    services, counts = feature_counts(since)
+    raw = np.column_stack([_column(counts[name], user_ids) for name in FEATURES])
+    scores = score(normalise(raw, services, max(window / 30.44, 1)))
+    levels = level_of(scores)
+
+    rows = [
+        MemberEngagement(
+            member_id=int(member_id), score=int(s), level=str(level),
+            attendance_rate=round(min(float(r[0]) / services, 1.0), 3) if services else 0.0,
+            giving_months=int(r[1]), volunteer_roles=int(r[2]),
+            prayer_activity=int(r[3]), chat_messages=int(r[4]), computed_at=now,
+        )
+        for member_id, s, level, r in zip(member_ids, scores, levels, raw)
+    ]
+    with transaction.atomic():
+        MemberEngagement.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["member"],
+            update_fields=[
+                "score", "level", "attendance_rate", "giving_months", "volunteer_roles",
+                "prayer_activity", "chat_messages", "computed_at",
+            ],
+        )
+    return len(rows)
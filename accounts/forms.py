@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from donations.models import Donation
 from .models import NewsPost, PrayerRequest, Event, MediaItem
+from .widgets import MemberAutocomplete
 
 
 # ===========================
@@ -32,6 +33,7 @@ class DonationForm(forms.ModelForm):
         model = Donation
         fields = ['member', 'amount', 'payment_method', 'category', 'status']
         widgets = {
+            'member': MemberAutocomplete(),
             'amount': forms.NumberInput(attrs={'step': '0.01', 'placeholder': 'Enter amount', 'class': 'form-control'}),
             'payment_method': forms.Select(attrs={'class': 'form-control'}),
             'category': forms.Select(attrs={'class': 'form-control'}),
@@ -39,6 +41,41 @@ class DonationForm(forms.ModelForm):
         }
 
 
+def clean_mpesa_phone(value):
+    """Daraja wants 2547XXXXXXXX; accept the local 07XX / +254 forms too."""
+    digits = ''.join(ch for ch in value if ch.isdigit())
+    if digits.startswith('0'):
+        digits = '254' + digits[1:]
+    if len(digits) != 12 or not digits.startswith('254'):
+        raise forms.ValidationError("Enter a Safaricom number like 0712345678 or 254712345678.")
+    return digits
+
+
+class MpesaDonationForm(forms.ModelForm):
+    """What a member fills in to give via an M-Pesa STK push."""
+    phone_number = forms.CharField(
+        max_length=13,
+        widget=forms.TextInput(attrs={'placeholder': '2547XXXXXXXX', 'class': 'form-control'}),
+    )
+
+    class Meta:
+        model = Donation
+        fields = ['category', 'amount', 'phone_number']
+        widgets = {
+            'amount': forms.NumberInput(attrs={'step': '1', 'min': '1', 'placeholder': 'Enter amount', 'class': 'form-control'}),
+            'category': forms.Select(attrs={'class': 'form-control'}),
+        }
+
+    def clean_phone_number(self):
+        return clean_mpesa_phone(self.cleaned_data['phone_number'])
+
+    def clean_amount(self):
+        amount = self.cleaned_data['amount']
+        if amount < 1:
+            raise forms.ValidationError("M-Pesa payments must be at least Ksh 1.")
+        return amount
+
+
 # ===========================
 # News Post Form
 # ===========================
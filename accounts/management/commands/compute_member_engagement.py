@@ -0,0 +1,18 @@
+# accounts/management/commands/compute_member_engagement.py
+
+from django.core.management.base import BaseCommand
+from accounts import engagement
+
+
+class Command(BaseCommand):
+    help = "Score every member's engagement (run nightly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Score rows written per INSERT (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        scored = engagement.compute(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Scored engagement for {scored} members."))
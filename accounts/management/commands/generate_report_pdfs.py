@@ -0,0 +1,15 @@
+# accounts/management/commands/generate_report_pdfs.py
+
+from django.core.management.base import BaseCommand
+from accounts import reports
+
+
+class Command(BaseCommand):
+    help = "Build report PDFs that are still waiting for the reports worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Build at most this many PDFs.")
+
+    def handle(self, *args, **options):
+        ready, failed = reports.build_pending(limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(f"Built {ready} report PDFs; {failed} failed."))
@@ -0,0 +1,79 @@
+# accounts/management/commands/mpesa_bench.py
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+from requests.auth import HTTPBasicAuth
+
+from accounts.mpesa import MpesaClient
+from accounts.mpesa_stub import start_in_thread
+
+
+class Command(BaseCommand):
+    help = "Compare STK push latency of the pooled M-Pesa client against one-off requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-n", "--requests", type=int, default=200, dest="count")
+        parser.add_argument("-c", "--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--base-url",
+            help="Daraja endpoint to hit (default: start a local stub).",
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.01,
+            help="Per-request delay for the local stub, in seconds.",
+        )
+
+    def handle(self, *args, **options):
+        stub = None
+        base_url = options["base_url"]
+        if not base_url:
+            stub = start_in_thread(latency=options["latency"])
+            base_url = stub.url
+
+        client = MpesaClient(base_url=base_url, pool_size=options["concurrency"])
+        client.invalidate_token()
+
+        def unpooled():
+            # What every push used to cost: a token fetch and a new connection each time.
+            token = requests.get(
+                f"{base_url}/oauth/v1/generate?grant_type=client_credentials",
+                auth=HTTPBasicAuth(client.consumer_key, client.consumer_secret),
+                timeout=client.timeout,
+            ).json()["access_token"]
+            requests.post(
+                f"{base_url}/mpesa/stkpush/v1/processrequest",
+                json={"Amount": 1, "PhoneNumber": "254700000000"},
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=client.timeout,
+            ).json()
+
+        def pooled():
+            client.stk_push(1, "254700000000", "Bench", "Benchmark")
+
+        for label, call in (("one-off requests", unpooled), ("pooled client", pooled)):
+            self.stdout.write(self._run(label, call, options["count"], options["concurrency"]))
+
+        if stub:
+            self.stdout.write(f"Stub requests served: {stub.state.counts}")
+            stub.shutdown()
+
+    def _run(self, label, call, count, concurrency):
+        def timed(_):
+            started = time.perf_counter()
+            call()
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = sorted(pool.map(timed, range(count)))
+        elapsed = time.perf_counter() - started
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        return (
+            f"{label:>18}: {count / elapsed:7.1f} req/s  "
+            f"p50 {p50:6.1f} ms  p95 {p95:6.1f} ms"
+        )
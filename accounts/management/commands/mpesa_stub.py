@@ -0,0 +1,48 @@
+# accounts/management/commands/mpesa_stub.py
+
+from django.core.management.base import BaseCommand
+from accounts.mpesa_stub import make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local stub of the M-Pesa Daraja API (OAuth + STK push) for tests and benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--latency", type=float, default=0.0,
+            help="Seconds to sleep before answering each request.",
+        )
+        parser.add_argument(
+            "--callback-delay", type=float, default=None,
+            help="Post the STK result to the CallBackURL after this many seconds.",
+        )
+        parser.add_argument(
+            "--result-code", type=int, default=0,
+            help="ResultCode sent in callbacks (0 = paid, 1032 = cancelled by user).",
+        )
+        parser.add_argument(
+            "--fail-every", type=int, default=0,
+            help="Answer every Nth STK push with a 503, to exercise retries.",
+        )
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options["host"], options["port"],
+            latency=options["latency"],
+            callback_delay=options["callback_delay"],
+            result_code=options["result_code"],
+            fail_every=options["fail_every"],
+        )
+        host, port = server.server_address
+        self.stdout.write(self.style.SUCCESS(
+            f"Daraja stub listening on http://{host}:{port} (set MPESA_BASE_URL to use it)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Requests served: {server.state.counts}")
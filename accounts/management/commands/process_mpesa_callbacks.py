@@ -0,0 +1,17 @@
+# accounts/management/commands/process_mpesa_callbacks.py
+
+from django.core.management.base import BaseCommand
+from accounts import stk
+
+
+class Command(BaseCommand):
+    help = "Apply stored M-Pesa callbacks that the worker has not processed yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Process at most this many callbacks.")
+
+    def handle(self, *args, **options):
+        handled, waiting = stk.process_callbacks(limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {handled} callbacks; {waiting} still have no matching donation."
+        ))
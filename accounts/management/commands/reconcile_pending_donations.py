@@ -0,0 +1,39 @@
+# accounts/management/commands/reconcile_pending_donations.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from accounts import stk
+from accounts.mpesa import MpesaClient
+
+
+class Command(BaseCommand):
+    help = "Query M-Pesa for pending donations whose callback never arrived and settle them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=10,
+            help="Only check donations pending for at least this many minutes (default: 10).",
+        )
+        parser.add_argument("--limit", type=int, default=500, help="Maximum donations per run.")
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent status queries.")
+        parser.add_argument(
+            "--rate", type=float, default=5,
+            help="Maximum status queries per second across all workers (default: 5).",
+        )
+        parser.add_argument("--base-url", help="Daraja endpoint to query, e.g. a local stub.")
+
+    def handle(self, *args, **options):
+        client = MpesaClient(base_url=options["base_url"], pool_size=options["workers"]) if options["base_url"] else None
+        stats = stk.reconcile_pending(
+            older_than=timedelta(minutes=options["older_than"]),
+            limit=options["limit"],
+            workers=options["workers"],
+            rate=options["rate"],
+            client=client,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {stats['checked']} pending donations: {stats['completed']} completed, "
+            f"{stats['failed']} failed, {stats['unknown']} unconfirmed, "
+            f"{stats['undecided']} still pending."
+        ))
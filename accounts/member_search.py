@@ -0,0 +1,136 @@
+# accounts/member_search.py
+"""
+Prefix search over member names for the autocomplete pickers.
+
+Each process keeps a sorted array of lowercased search keys (full name,
+surname, username and phone digits per member) and answers a prefix query
+with one bisect plus a short forward scan, which is what a trie walk does
+without the per-node overhead. The array is tagged with the ``members``
+data version and rebuilt by the first request that sees it is stale;
+requests arriving while that rebuild runs use an istartswith query instead.
+"""
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Q
+
+from koma.cache import get_versions
+
+from .models import Member
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 25
+
+
+def _normalise(text):
+    return " ".join((text or "").lower().split())
+
+
+def _digits(text):
+    return "".join(ch for ch in text or "" if ch.isdigit())
+
+
+def as_result(member_id, user_id, first, last, username, phone):
+    name = f"{first} {last}".strip() or username
+    return {"id": member_id, "user": user_id, "name": name, "phone": (phone or "")[-3:]}
+
+
+def _members():
+    return Member.objects.filter(user__is_active=True).values_list(
+        "id", "user_id", "user__first_name", "user__last_name", "user__username", "phone"
+    )
+
+
+class MemberIndex:
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = []
+        pairs = []
+        for row in rows:
+            entry = as_result(*row)
+            position = len(self.rows)
+            self.rows.append(entry)
+            _, _, first, last, username, phone = row
+            keys = {_normalise(entry["name"]), _normalise(last), _normalise(username)}
+            digits = _digits(phone)
+            if len(digits) >= 9:
+                # Match 07.., 2547.. and bare 7.. the same way
+                keys.add(digits[-9:])
+                keys.add("0" + digits[-9:])
+            pairs.extend((key, position) for key in keys if key)
+        # Order ties by name so equal prefixes come back alphabetically
+        pairs.sort(key=lambda pair: (pair[0], self.rows[pair[1]]["name"].lower()))
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def search(self, query, limit):
+        query = _normalise(query)
+        if query.startswith("+"):
+            query = query[1:]
+        if query.startswith("254") and query.isdigit():
+            query = query[3:]
+        start = bisect_left(self.keys, query)
+        seen, results = set(), []
+        for i in range(start, len(self.keys)):
+            if not self.keys[i].startswith(query):
+                break
+            position = self.positions[i]
+            if position in seen:
+                continue
+            seen.add(position)
+            results.append(self.rows[position])
+            if len(results) >= limit:
+                break
+        return results
+
+
+_index = None
+_rebuild_lock = threading.Lock()
+
+
+def get_index():
+    """The current index, rebuilding it if members changed; None while another thread rebuilds."""
+    global _index
+    version = get_versions("members")["members"]
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    if not _rebuild_lock.acquire(blocking=False):
+        return None
+    try:
+        if _index is None or _index.version != version:
+            _index = MemberIndex(version, _members().iterator(chunk_size=2000))
+        return _index
+    finally:
+        _rebuild_lock.release()
+
+
+def search_database(query, limit):
+    """Prefix match in SQL (LIKE 'x%'), for when the in-memory index isn't available."""
+    query = query.strip()
+    words = query.split()
+    match = (
+        Q(user__first_name__istartswith=query)
+        | Q(user__last_name__istartswith=query)
+        | Q(user__username__istartswith=query)
+    )
+    if len(words) > 1:
+        match |= Q(user__first_name__istartswith=words[0], user__last_name__istartswith=words[-1])
+    digits = _digits(query)
+    if len(digits) >= 3 and digits == query.lstrip("+"):
+        match |= Q(phone__startswith=query)
+    rows = _members().filter(match).order_by("user__first_name", "user__last_name", "user__username")[:limit]
+    return [as_result(*row) for row in rows]
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    """Top ``limit`` members whose name, surname, username or phone starts with ``query``."""
+    if not query or not query.strip():
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+    if getattr(settings, "MEMBER_SEARCH_INDEX", True):
+        index = get_index()
+        if index is not None:
+            return index.search(query, limit)
+    return search_database(query, limit)
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:51
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+
+def populate_giving_totals(apps, schema_editor):
+    Member = apps.get_model('accounts', 'Member')
+    Donation = apps.get_model('donations', 'Donation')
+
+    year = timezone.localdate().year
+    start = timezone.make_aware(datetime(year, 1, 1))
+    end = timezone.make_aware(datetime(year + 1, 1, 1))
+    grouped = (
+        Donation.objects.filter(status='completed')
+        .values('member_id')
+        .annotate(
+            total=Sum('amount'),
+            ytd=Sum('amount', filter=Q(date_donated__gte=start, date_donated__lt=end), default=0),
+            last=Max('date_donated'),
+        )
+        .order_by()
+    )
+    totals = {row['member_id']: row for row in grouped}
+
+    members = list(Member.objects.filter(pk__in=totals))
+    for member in members:
+        row = totals[member.pk]
+        member.total_contributions = row['total']
+        member.ytd_contributions = row['ytd']
+        member.ytd_year = year
+        member.last_gift_date = row['last']
+    Member.objects.bulk_update(
+        members, ['total_contributions', 'ytd_contributions', 'ytd_year', 'last_gift_date'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_mpesa_callback_inbox'),
+        ('donations', '0005_donation_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='last_gift_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='ytd_contributions',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='ytd_year',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_giving_totals, migrations.RunPython.noop),
+    ]
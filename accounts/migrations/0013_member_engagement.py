@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_report_artifacts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberEngagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveSmallIntegerField(db_index=True, default=0)),
+                ('level', models.CharField(choices=[('high', 'High'), ('medium', 'Medium'), ('low', 'Low'), ('inactive', 'Inactive')], default='inactive', max_length=10)),
+                ('attendance_rate', models.FloatField(default=0)),
+                ('giving_months', models.PositiveSmallIntegerField(default=0)),
+                ('volunteer_roles', models.PositiveSmallIntegerField(default=0)),
+                ('prayer_activity', models.PositiveIntegerField(default=0)),
+                ('chat_messages', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='engagement', to='accounts.member')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['level', 'score'], name='accounts_me_level_6a81cd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_member_engagement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportartifact',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from koma.cache import bump_version
+
 # =====================================================
 # Role Model
 # =====================================================
@@ -46,7 +48,11 @@ class Member(models.Model):
     join_date = models.DateField(default=timezone.now)
     notes = models.TextField(blank=True, null=True)
 
+    # Completed giving, kept current by donations.contributions
     total_contributions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ytd_contributions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ytd_year = models.PositiveSmallIntegerField(null=True, blank=True)  # year ytd_contributions is for
+    last_gift_date = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -57,6 +63,11 @@ class Member(models.Model):
     def __str__(self):
         return self.user.username
 
+    @property
+    def contributions_this_year(self):
+        # ytd_contributions still holds last year's figure until the first gift of the new year
+        return self.ytd_contributions if self.ytd_year == timezone.localdate().year else 0
+
 
 # =====================================================
 # Attendance Model
@@ -240,3 +251,108 @@ class MediaItem(models.Model):
 
     def __str__(self):
         return self.title
+
+
+# =====================================================
+# M-Pesa Callback Inbox
+# =====================================================
+class MpesaCallback(models.Model):
+    """
+    Raw STK callbacks as Daraja delivered them.
+
+    The callback view only stores the payload and acks; matching it to a
+    donation happens afterwards (worker or process_mpesa_callbacks), so a
+    burst of callbacks never waits on that work. Replays of the same
+    CheckoutRequestID are dropped by the unique constraint.
+    """
+    checkout_request_id = models.CharField(max_length=100, unique=True)
+    result_code = models.IntegerField(null=True, blank=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    error = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"{self.checkout_request_id} ({self.result_code})"
+
+
+# =====================================================
+# Member Engagement (scored nightly)
+# =====================================================
+class MemberEngagement(models.Model):
+    """
+    A member's engagement score over the last few months, with the
+    features it was computed from. Rebuilt in batch by
+    `manage.py compute_member_engagement` (see accounts.engagement).
+    """
+    LEVEL_CHOICES = [
+        ("high", "High"),
+        ("medium", "Medium"),
+        ("low", "Low"),
+        ("inactive", "Inactive"),
+    ]
+
+    member = models.OneToOneField(Member, on_delete=models.CASCADE, related_name="engagement")
+    score = models.PositiveSmallIntegerField(default=0, db_index=True)  # 0-100
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default="inactive")
+    attendance_rate = models.FloatField(default=0)  # share of services attended
+    giving_months = models.PositiveSmallIntegerField(default=0)  # months with a completed gift
+    volunteer_roles = models.PositiveSmallIntegerField(default=0)  # approved volunteer roles
+    prayer_activity = models.PositiveIntegerField(default=0)  # requests made plus prayers for others
+    chat_messages = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["level", "score"])]
+
+    def __str__(self):
+        return f"{self.member}: {self.score} ({self.level})"
+
+
+# =====================================================
+# Generated Report PDFs
+# =====================================================
+class ReportArtifact(models.Model):
+    """
+    A Reports & Analytics PDF for one period, built in the background.
+
+    ``key`` includes the data versions the report reads (see
+    accounts.reports), so a stored PDF is reused until something it
+    summarises changes; the next download then builds a new artifact.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Generating"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    ]
+
+    key = models.CharField(max_length=255, unique=True)
+    period_start = models.DateField()  # first day of the first month
+    period_end = models.DateField()  # first day of the last month
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    file = models.FileField(upload_to="reports/", blank=True)
+    size = models.PositiveIntegerField(default=0)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)  # when the current build began
+    generated_at = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Report {self.period_start:%b %Y}–{self.period_end:%b %Y} ({self.status})"
+
+
+# =====================================================
+# Signals: Invalidate Cached Member Rosters
+# =====================================================
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Member)
+def bump_members_version(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login; don't throw away rosters for that.
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    bump_version("members")
@@ -1,8 +1,16 @@
 # accounts/mpesa.py
+import base64
+import threading
+import time
+from datetime import datetime
+
 import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
-from datetime import datetime
-import base64
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
 
 # Your Mpesa credentials
 MPESA_CONSUMER_KEY = "aOufe5D70rWbAdn5Vjmt9fdEk9b72FbmFp4QHWAPTedGCib2"
@@ -16,29 +24,216 @@ if MPESA_ENV == "sandbox":
 else:
     MPESA_BASE_URL = "https://api.safaricom.co.ke"
 
+MPESA_CALLBACK_URL = "https://yourdomain.com/accounts/mpesa-callback/"
+
+# (connect, read) seconds. Daraja is usually quick to answer; a hung
+# socket should fail the request, not tie up a web worker.
+DEFAULT_TIMEOUT = (3.05, 15)
+
+# Refresh the token this many seconds before Daraja says it expires.
+TOKEN_EXPIRY_MARGIN = 60
+
+
+class MpesaError(Exception):
+    """
+    Daraja could not be reached or returned an unusable response.
+
+    ``retryable`` is True only when Daraja cannot have acted on the request:
+    the connection was never made, or it answered with a server error.
+    After a read timeout the request may well have been carried out.
+    """
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _never_sent(exc):
+    """True when ``exc`` happened while connecting, before anything was sent."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(exc, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+class MpesaClient:
+    """
+    Daraja API client holding a pooled keep-alive session.
+
+    The OAuth token is cached in the Django cache (so every worker shares
+    it) until shortly before it expires. When it does expire, one caller
+    refreshes it while the others wait briefly for the new value instead of
+    all hitting the OAuth endpoint at once.
+    """
+
+    def __init__(self, base_url=None, consumer_key=None, consumer_secret=None,
+                 shortcode=None, passkey=None, callback_url=None, timeout=None, pool_size=10):
+        self.base_url = (base_url or getattr(settings, "MPESA_BASE_URL", None) or MPESA_BASE_URL).rstrip("/")
+        self.consumer_key = consumer_key or getattr(settings, "MPESA_CONSUMER_KEY", None) or MPESA_CONSUMER_KEY
+        self.consumer_secret = (
+            consumer_secret or getattr(settings, "MPESA_CONSUMER_SECRET", None) or MPESA_CONSUMER_SECRET
+        )
+        self.shortcode = shortcode or getattr(settings, "MPESA_SHORTCODE", None) or MPESA_SHORTCODE
+        self.passkey = passkey or getattr(settings, "MPESA_PASSKEY", None) or MPESA_PASSKEY
+        self.callback_url = callback_url or getattr(settings, "MPESA_CALLBACK_URL", None) or MPESA_CALLBACK_URL
+        self.timeout = timeout or DEFAULT_TIMEOUT
+
+        self.session = requests.Session()
+        # Only the token fetch is retried: an STK push is not idempotent and
+        # a blind retry could prompt the member's phone twice.
+        retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token = None
+        self._token_expires = 0
+        self._lock = threading.Lock()
+
+    # ------------------------------
+    # OAuth token
+    # ------------------------------
+    @property
+    def _cache_key(self):
+        return f"mpesa:token:{self.base_url}:{self.consumer_key}"
+
+    def _fetch_token(self):
+        try:
+            response = self.session.get(
+                f"{self.base_url}/oauth/v1/generate",
+                params={"grant_type": "client_credentials"},
+                auth=HTTPBasicAuth(self.consumer_key, self.consumer_secret),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as exc:
+            # Nothing has been asked of Daraja yet, so the caller may retry
+            raise MpesaError(f"Could not get an M-Pesa access token: {exc}", retryable=True) from exc
+        token = data.get("access_token")
+        if not token:
+            raise MpesaError("M-Pesa OAuth response had no access_token", retryable=True)
+        ttl = max(int(data.get("expires_in", 3599)) - TOKEN_EXPIRY_MARGIN, 1)
+        return token, ttl
+
+    def access_token(self):
+        # Per-process copy first: saves a cache round trip on every push.
+        if self._token and time.monotonic() < self._token_expires:
+            return self._token
+
+        with self._lock:
+            if self._token and time.monotonic() < self._token_expires:
+                return self._token
+
+            token = cache.get(self._cache_key)
+            if token is None:
+                token = self._refresh_shared()
+            # The shared entry's remaining lifetime is unknown here, so keep
+            # the local copy short and let the cache stay authoritative.
+            self._token, self._token_expires = token, time.monotonic() + TOKEN_EXPIRY_MARGIN
+            return token
+
+    def _refresh_shared(self):
+        lock_key = f"{self._cache_key}:refreshing"
+        if cache.add(lock_key, 1, timeout=30):
+            try:
+                token, ttl = self._fetch_token()
+                cache.set(self._cache_key, token, ttl)
+                return token
+            finally:
+                cache.delete(lock_key)
+
+        # Someone else is refreshing; wait for their token rather than
+        # stampeding the OAuth endpoint, but don't wait forever.
+        deadline = time.monotonic() + self.timeout[0] + 2
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            token = cache.get(self._cache_key)
+            if token is not None:
+                return token
+        token, ttl = self._fetch_token()
+        cache.set(self._cache_key, token, ttl)
+        return token
+
+    def invalidate_token(self):
+        self._token, self._token_expires = None, 0
+        cache.delete(self._cache_key)
+
+    # ------------------------------
+    # API calls
+    # ------------------------------
+    def _post(self, path, payload):
+        for attempt in range(2):
+            try:
+                response = self.session.post(
+                    f"{self.base_url}{path}",
+                    json=payload,
+                    headers={"Authorization": f"Bearer {self.access_token()}"},
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as exc:
+                raise MpesaError(f"M-Pesa request to {path} failed: {exc}", retryable=_never_sent(exc)) from exc
+            # A token revoked early is rejected before anything happens,
+            # so fetching a new one and resending is safe.
+            if response.status_code == 401 and attempt == 0:
+                self.invalidate_token()
+                continue
+            if response.status_code >= 500:
+                raise MpesaError(f"M-Pesa answered {path} with {response.status_code}", retryable=True)
+            try:
+                return response.json()
+            except ValueError as exc:
+                raise MpesaError(f"M-Pesa returned a non-JSON response ({response.status_code})") from exc
+
+    def _password(self, timestamp):
+        return base64.b64encode(f"{self.shortcode}{self.passkey}{timestamp}".encode()).decode()
+
+    def stk_push(self, amount, phone_number, account_reference, transaction_desc, callback_url=None):
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        payload = {
+            "BusinessShortCode": self.shortcode,
+            "Password": self._password(timestamp),
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": float(amount),
+            "PartyA": phone_number,  # User phone number
+            "PartyB": self.shortcode,
+            "PhoneNumber": phone_number,
+            "CallBackURL": callback_url or self.callback_url,
+            "AccountReference": account_reference,
+            "TransactionDesc": transaction_desc,
+        }
+        return self._post("/mpesa/stkpush/v1/processrequest", payload)
+
+    def stk_query(self, checkout_request_id):
+        """Ask Daraja how an STK push ended (ResultCode "0" means paid)."""
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        payload = {
+            "BusinessShortCode": self.shortcode,
+            "Password": self._password(timestamp),
+            "Timestamp": timestamp,
+            "CheckoutRequestID": checkout_request_id,
+        }
+        return self._post("/mpesa/stkpushquery/v1/query", payload)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, so every request reuses the same connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MpesaClient()
+    return _client
+
+
 def get_access_token():
-    url = f"{MPESA_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
-    response = requests.get(url, auth=HTTPBasicAuth(MPESA_CONSUMER_KEY, MPESA_CONSUMER_SECRET))
-    return response.json().get("access_token")
+    return get_client().access_token()
+
 
 def lipa_na_mpesa(amount, phone_number, account_reference, transaction_desc):
-    token = get_access_token()
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    password = base64.b64encode(f"{MPESA_SHORTCODE}{MPESA_PASSKEY}{timestamp}".encode()).decode()
-    
-    headers = {"Authorization": f"Bearer {token}"}
-    payload = {
-        "BusinessShortCode": MPESA_SHORTCODE,
-        "Password": password,
-        "Timestamp": timestamp,
-        "TransactionType": "CustomerPayBillOnline",
-        "Amount": float(amount),
-        "PartyA": phone_number,  # User phone number
-        "PartyB": MPESA_SHORTCODE,
-        "PhoneNumber": phone_number,
-        "CallBackURL": "https://yourdomain.com/accounts/mpesa-callback/",
-        "AccountReference": account_reference,
-        "TransactionDesc": transaction_desc
-    }
-    response = requests.post(f"{MPESA_BASE_URL}/mpesa/stkpush/v1/processrequest", json=payload, headers=headers)
-    return response.json()
+    return get_client().stk_push(amount, phone_number, account_reference, transaction_desc)
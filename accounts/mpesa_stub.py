@@ -0,0 +1,167 @@
+# accounts/mpesa_stub.py
+"""
+A local stand-in for the Daraja API, for tests and latency benchmarks.
+
+Serves the OAuth, STK push and STK query endpoints with canned responses, an optional
+artificial delay per request, and (optionally) posts the STK callback back
+to the CallBackURL like Safaricom does. Run it with
+``python manage.py mpesa_stub`` and point MPESA_BASE_URL at it.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+STUB_TOKEN_TTL = 3599
+
+
+class StubState:
+    def __init__(self, latency=0.0, callback_delay=None, result_code=0, fail_every=0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.callback_delay = callback_delay
+        self.result_code = result_code
+        self.tokens = set()
+        self.checkouts = set()
+        self.lock = threading.Lock()
+        self.counts = {"token": 0, "stk_push": 0, "stk_query": 0, "callbacks": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+
+class DarajaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    server_version = "DarajaStub/1.0"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out and hung up
+
+    def do_GET(self):
+        time.sleep(self.state.latency)
+        if urlparse(self.path).path != "/oauth/v1/generate":
+            return self._send_json(404, {"errorMessage": "Not found"})
+        if not self.headers.get("Authorization", "").startswith("Basic "):
+            return self._send_json(400, {"errorMessage": "Invalid Authentication passed"})
+        self.state.count("token")
+        token = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.tokens.add(token)
+        self._send_json(200, {"access_token": token, "expires_in": str(STUB_TOKEN_TTL)})
+
+    def do_POST(self):
+        time.sleep(self.state.latency)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"errorMessage": "Bad JSON"})
+
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token not in self.state.tokens:
+            return self._send_json(401, {"errorCode": "404.001.03", "errorMessage": "Invalid Access Token"})
+
+        path = urlparse(self.path).path
+        if path == "/mpesa/stkpushquery/v1/query":
+            return self._stk_query(payload)
+        if path != "/mpesa/stkpush/v1/processrequest":
+            return self._send_json(404, {"errorMessage": "Not found"})
+
+        self.state.count("stk_push")
+        with self.state.lock:
+            pushes = self.state.counts["stk_push"]
+        if self.state.fail_every and pushes % self.state.fail_every == 0:
+            return self._send_json(503, {"errorMessage": "Service Unavailable"})
+        checkout_id = f"ws_CO_{uuid.uuid4().hex[:20]}"
+        with self.state.lock:
+            self.state.checkouts.add(checkout_id)
+        self._send_json(200, {
+            "MerchantRequestID": uuid.uuid4().hex[:12],
+            "CheckoutRequestID": checkout_id,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+        })
+        if self.state.callback_delay is not None and payload.get("CallBackURL"):
+            threading.Timer(
+                self.state.callback_delay, self._send_callback, args=(payload, checkout_id)
+            ).start()
+
+    def _stk_query(self, payload):
+        self.state.count("stk_query")
+        checkout_id = payload.get("CheckoutRequestID")
+        if checkout_id not in self.state.checkouts:
+            return self._send_json(500, {
+                "requestId": uuid.uuid4().hex[:12],
+                "errorCode": "500.001.1001",
+                "errorMessage": "No transaction found for this CheckoutRequestID",
+            })
+        result_code = self.state.result_code
+        self._send_json(200, {
+            "ResponseCode": "0",
+            "ResponseDescription": "The service request has been accepted successsfully",
+            "MerchantRequestID": uuid.uuid4().hex[:12],
+            "CheckoutRequestID": checkout_id,
+            "ResultCode": str(result_code),
+            "ResultDesc": "The service request is processed successfully." if result_code == 0
+            else "Request cancelled by user",
+        })
+
+    def _send_callback(self, payload, checkout_id):
+        result_code = self.state.result_code
+        callback = {"stkCallback": {
+            "MerchantRequestID": uuid.uuid4().hex[:12],
+            "CheckoutRequestID": checkout_id,
+            "ResultCode": result_code,
+            "ResultDesc": "The service request is processed successfully." if result_code == 0
+            else "Request cancelled by user",
+        }}
+        if result_code == 0:
+            callback["stkCallback"]["CallbackMetadata"] = {"Item": [
+                {"Name": "Amount", "Value": payload.get("Amount")},
+                {"Name": "MpesaReceiptNumber", "Value": uuid.uuid4().hex[:10].upper()},
+                {"Name": "TransactionDate", "Value": int(time.strftime("%Y%m%d%H%M%S"))},
+                {"Name": "PhoneNumber", "Value": payload.get("PhoneNumber")},
+            ]}
+        try:
+            requests.post(payload["CallBackURL"], json={"Body": callback}, timeout=10)
+            self.state.count("callbacks")
+        except requests.RequestException:
+            pass
+
+
+def make_server(host="127.0.0.1", port=0, **state_options):
+    """Build (but don't start) a stub server; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), DarajaStubHandler)
+    server.daemon_threads = True
+    server.state = StubState(**state_options)
+    return server
+
+
+def start_in_thread(**options):
+    """Start a stub server in a daemon thread and return it; its URL is ``server.url``."""
+    server = make_server(**options)
+    server.url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,86 @@
+"""
+Reports & Analytics PDF layout.
+
+Takes the plain data assembled by accounts.reports.pdf_data, so the
+layout can be changed without touching the queries.
+"""
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+SUMMARY_STYLE = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, -1), colors.whitesmoke),
+    ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
+    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+    ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 0), (-1, -1), 11),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+])
+
+TABLE_STYLE = TableStyle([
+    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+])
+
+
+def _section(elements, styles, title, header, rows, empty, widths):
+    elements.append(Paragraph(f"<b>{title}</b>", styles["Heading2"]))
+    elements.append(Spacer(1, 6))
+    table = Table([header, *rows] if rows else [[empty]], colWidths=widths)
+    table.setStyle(TABLE_STYLE)
+    elements.append(table)
+    elements.append(Spacer(1, 20))
+
+
+def render_report(report):
+    """
+    Build the report and return the PDF bytes.
+
+    ``report`` has the ``period`` label, ``totals`` (donations, members,
+    volunteers, events) and row lists for ``donations`` (month, amount),
+    ``attendance`` (event, count), ``volunteers`` (opportunity, count) and
+    ``members`` (month, new members).
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title=f"Reports & Analytics {report['period']}")
+    styles = getSampleStyleSheet()
+    totals = report["totals"]
+
+    elements = [
+        Paragraph(f"<b>Reports &amp; Analytics ({report['period']})</b>", styles["Title"]),
+        Spacer(1, 12),
+    ]
+    summary = Table([
+        ["💰 Total Donations", f"Ksh {totals['donations']:,.2f}"],
+        ["👥 Members", str(totals["members"])],
+        ["🤝 Volunteers", str(totals["volunteers"])],
+        ["📅 Events", str(totals["events"])],
+    ], colWidths=[250, 200])
+    summary.setStyle(SUMMARY_STYLE)
+    elements += [summary, Spacer(1, 20)]
+
+    _section(
+        elements, styles, "💰 Monthly Donations", ["Month", "Total (Ksh)"],
+        [[month, f"{amount:,.2f}"] for month, amount in report["donations"]],
+        "No donation data available", [250, 150],
+    )
+    _section(
+        elements, styles, "🧍 Event Attendance", ["Event", "Attendance Count"],
+        report["attendance"], "No attendance data available", [300, 100],
+    )
+    _section(
+        elements, styles, "🤝 Volunteers by Opportunity", ["Opportunity Description", "Volunteers"],
+        report["volunteers"], "No volunteer data available", [300, 100],
+    )
+    _section(
+        elements, styles, "👥 Member Growth", ["Month", "New Members"],
+        report["members"], "No new members data available", [300, 100],
+    )
+
+    doc.build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,367 @@
+# accounts/reports.py
+"""
+Payload for the Reports & Analytics page, cached between data changes.
+
+The page used to run its aggregates on every load. Now each calendar
+year's month buckets (donations, attendance, new members, events) are
+computed once and cached under the data versions of everything they read;
+a period report is assembled from those buckets, so switching between a
+year and a month range only queries years not seen yet. Model signals bump
+the versions (see koma.cache), which is what invalidates both layers.
+Recomputation goes through ``get_or_compute`` so admins refreshing the
+page together run the queries once.
+
+The PDF download is keyed the same way: ``request_pdf`` finds or creates
+the ReportArtifact for the period at the current data versions and queues
+its build on the ``reports`` channel (``python manage.py runworker
+reports``, or the generate_report_pdfs command from cron). A stored PDF is
+served until the data changes.
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from attendance.models import EventAttendanceTotal, EventHeadcount
+from donations import ledger
+from donations.models import MonthlyLedger
+from events.models import Event
+from koma.cache import get_last_modified, get_or_compute, versioned_key
+from volunteers.models import Volunteer
+
+from .models import Member, ReportArtifact
+from .report_pdf import render_report
+
+logger = logging.getLogger(__name__)
+
+PDF_CHANNEL = "reports"
+NAMESPACES = ("donations", "members", "volunteers", "events", "attendance")
+# What each chart series reads, so its ETag only changes with that data
+SERIES = {
+    "donations": ("donations",),
+    "attendance": ("attendance", "events"),
+    "members": ("members",),
+    "events": ("events",),
+    "volunteers": ("volunteers",),
+}
+MAX_MONTHS = 36
+MIN_YEAR, MAX_YEAR = 1900, 9998  # leaves room for the month arithmetic either side
+MONTHS = [date(2000, m, 1).strftime("%b") for m in range(1, 13)]
+
+
+# ------------------------------
+# Month buckets (one cache entry per year)
+# ------------------------------
+def _by_month(rows):
+    months = [0] * 12
+    for month, value in rows:
+        months[month - 1] += value
+    return months
+
+
+def _compute_year(year):
+    attendance = _by_month(
+        EventAttendanceTotal.objects.filter(month__year=year)
+        .values_list("month__month")
+        .annotate(count=Sum("count"))
+        .order_by()
+    )
+    # Headcount-mode services count towards the month the event is held in
+    headcounts = _by_month(
+        EventHeadcount.objects.filter(event__date__year=year)
+        .values_list("event__date__month")
+        .annotate(count=Sum(F("adults") + F("children") + F("visitors") + F("online")))
+        .order_by()
+    )
+    return {
+        "donations": [float(total) for total in _by_month(ledger.monthly_totals("donation", year))],
+        "attendance": [a + h for a, h in zip(attendance, headcounts)],
+        "members": _by_month(
+            Member.objects.filter(join_date__year=year)
+            .values_list("join_date__month")
+            .annotate(count=Count("id"))
+            .order_by()
+        ),
+        "events": _by_month(
+            Event.objects.filter(date__year=year)
+            .values_list("date__month")
+            .annotate(count=Count("id"))
+            .order_by()
+        ),
+    }
+
+
+def month_buckets(year):
+    """``{series: [12 monthly values]}`` for one calendar year."""
+    return get_or_compute(versioned_key(NAMESPACES, "report-months", year), lambda: _compute_year(year))
+
+
+# ------------------------------
+# Periods
+# ------------------------------
+def _month(value):
+    """Parse ``YYYY-MM`` into the first day of that month, or None (also outside MIN_YEAR..MAX_YEAR)."""
+    try:
+        year, month = (int(part) for part in value.split("-"))
+        day = date(year, month, 1)
+    except (AttributeError, ValueError):
+        return None
+    return day if MIN_YEAR <= year <= MAX_YEAR else None
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def period_from(params):
+    """
+    ``(first month, last month)`` selected by the query string.
+
+    ``?from=YYYY-MM&to=YYYY-MM`` picks a range (at most MAX_MONTHS long),
+    ``?year=YYYY`` a calendar year; anything else means this year.
+    """
+    start, end = _month(params.get("from")), _month(params.get("to"))
+    if start and end:
+        if end < start:
+            start, end = end, start
+        return max(start, _add_months(end, 1 - MAX_MONTHS)), end
+    try:
+        year = int(params.get("year"))
+    except (TypeError, ValueError):
+        year = timezone.localdate().year
+    year = min(max(year, MIN_YEAR), MAX_YEAR)
+    return date(year, 1, 1), date(year, 12, 1)
+
+
+def _compute_years():
+    years = {timezone.localdate().year}
+    years.update(d.year for d in MonthlyLedger.objects.dates("month", "year"))
+    years.update(d.year for d in Member.objects.dates("join_date", "year"))
+    years.update(d.year for d in Event.objects.datetimes("date", "year"))
+    return sorted(years, reverse=True)
+
+
+def period_label(start, end):
+    """"2026" for a calendar year, otherwise "Nov 2025 – Feb 2026"."""
+    if start.year == end.year and start.month == 1 and end.month == 12:
+        return str(start.year)
+    return f"{start:%b %Y} – {end:%b %Y}"
+
+
+def available_years():
+    """Years with any data, newest first, always including the current one."""
+    key = versioned_key(("donations", "members", "events"), "report-years", timezone.localdate().year)
+    return get_or_compute(key, _compute_years)
+
+
+# ------------------------------
+# Report
+# ------------------------------
+def _compute_report(start, end):
+    months = []
+    day = start
+    while day <= end:
+        months.append(day)
+        day = _add_months(day, 1)
+    buckets = {year: month_buckets(year) for year in sorted({m.year for m in months})}
+
+    def series(name):
+        return [buckets[m.year][name][m.month - 1] for m in months]
+
+    one_year = start.year == end.year
+    labels = [MONTHS[m.month - 1] if one_year else f"{MONTHS[m.month - 1]} {m.year}" for m in months]
+    volunteers = (
+        Volunteer.objects.values_list("opportunity__department")
+        .annotate(count=Count("id"))
+        .order_by("-count")
+    )
+    return {
+        "labels": labels,
+        "donations": series("donations"),
+        "attendance": series("attendance"),
+        "members": series("members"),
+        "events": series("events"),
+        "volunteer_departments": [department or "Unassigned" for department, _ in volunteers],
+        "volunteer_counts": [count for _, count in volunteers],
+        "totals": {
+            "donations": float(ledger.grand_total("donation")),
+            "members": Member.objects.count(),
+            "volunteers": Volunteer.objects.count(),
+            "events": Event.objects.count(),
+        },
+    }
+
+
+def report(start, end):
+    """The cached report payload for the months ``start``..``end`` (first days of months)."""
+    key = versioned_key(NAMESPACES, "report", start.isoformat(), end.isoformat())
+    return get_or_compute(key, lambda: _compute_report(start, end))
+
+
+
+# ------------------------------
+# Chart series (JSON API)
+# ------------------------------
+def series_key(name, start, end):
+    """Cache/ETag key for one chart series; only bumps of that series' data change it."""
+    return versioned_key(SERIES[name], "report-series", name, start.isoformat(), end.isoformat())
+
+
+def series_last_modified(name):
+    return get_last_modified(*SERIES[name])
+
+
+def series(name, start, end):
+    """``{"labels": [...], "values": [...]}`` for one chart, sliced from the cached report."""
+    data = report(start, end)
+    if name == "volunteers":
+        return {"labels": data["volunteer_departments"], "values": data["volunteer_counts"]}
+    return {"labels": data["labels"], "values": data[name]}
+
+# ------------------------------
+# PDF artifacts
+# ------------------------------
+def pdf_data(start, end):
+    """The plain data accounts.report_pdf lays out for the months ``start``..``end``."""
+    data = report(start, end)
+    since = timezone.make_aware(datetime(start.year, start.month, 1))
+    next_month = _add_months(end, 1)
+    until = timezone.make_aware(datetime(next_month.year, next_month.month, 1))
+
+    attendance = dict(
+        EventAttendanceTotal.objects.filter(month__range=(start, end))
+        .values_list("event__title")
+        .annotate(total=Sum("count"))
+        .order_by()
+    )
+    headcounts = (
+        EventHeadcount.objects.filter(event__date__gte=since, event__date__lt=until)
+        .values_list("event__title")
+        .annotate(total=Sum(F("adults") + F("children") + F("visitors") + F("online")))
+        .order_by()
+    )
+    for title, total in headcounts:
+        attendance[title] = attendance.get(title, 0) + total
+    volunteers = (
+        Volunteer.objects.values_list("opportunity__description")
+        .annotate(total=Count("id"))
+        .order_by("opportunity__description")
+    )
+    return {
+        "period": period_label(start, end),
+        "totals": data["totals"],
+        "donations": [(label, amount) for label, amount in zip(data["labels"], data["donations"]) if amount],
+        "attendance": sorted(attendance.items(), key=lambda item: -item[1]),
+        "volunteers": [(description or "—", total) for description, total in volunteers],
+        "members": [(label, count) for label, count in zip(data["labels"], data["members"]) if count],
+    }
+
+
+def pdf_filename(artifact):
+    label = period_label(artifact.period_start, artifact.period_end)
+    return f"Reports_Analytics_{label.replace(' – ', '_to_').replace(' ', '_')}.pdf"
+
+
+def _enqueue(artifact):
+    if not getattr(settings, "REPORT_PDF_BACKGROUND", True):
+        build_pdf(artifact.pk)
+        artifact.refresh_from_db()
+        return
+
+    def send():
+        try:
+            async_to_sync(get_channel_layer().send)(
+                PDF_CHANNEL, {"type": "report.build", "artifact_id": artifact.pk},
+            )
+        except Exception:
+            # Still pending; generate_report_pdfs builds it on its next run.
+            logger.exception("Could not queue report PDF %s", artifact.pk)
+
+    transaction.on_commit(send)
+
+
+def request_pdf(start, end, user=None):
+    """
+    The PDF artifact for the period at the current data versions.
+
+    A new (or previously failed) artifact is queued for building; one
+    that is pending, running or ready is returned as it is.
+    """
+    key = versioned_key(NAMESPACES, "report-pdf", start.isoformat(), end.isoformat())
+    artifact, created = ReportArtifact.objects.get_or_create(
+        key=key, defaults={"period_start": start, "period_end": end, "requested_by": user},
+    )
+    if created:
+        _enqueue(artifact)
+    elif artifact.status == "failed":
+        if ReportArtifact.objects.filter(pk=artifact.pk, status="failed").update(status="pending", error=""):
+            artifact.status, artifact.error = "pending", ""
+            _enqueue(artifact)
+    return artifact
+
+
+def _discard_older(artifact):
+    """Delete finished PDFs for the same period that this one replaces."""
+    older = ReportArtifact.objects.filter(
+        period_start=artifact.period_start, period_end=artifact.period_end,
+        pk__lt=artifact.pk, status__in=("ready", "failed"),
+    )
+    for old in older:
+        if old.file:
+            old.file.delete(save=False)
+    older.delete()
+
+
+def build_pdf(artifact_id):
+    """Render and store one pending artifact. Returns it, or None if someone else took it."""
+    claimed = ReportArtifact.objects.filter(pk=artifact_id, status="pending").update(
+        status="running", started_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+    artifact = ReportArtifact.objects.get(pk=artifact_id)
+    try:
+        pdf = render_report(pdf_data(artifact.period_start, artifact.period_end))
+        path = f"reports/analytics-{artifact.period_start:%Y-%m}-{artifact.period_end:%Y-%m}-{artifact.pk}.pdf"
+        artifact.file.name = default_storage.save(path, ContentFile(pdf))
+    except Exception as exc:
+        logger.exception("Report PDF %s failed", artifact_id)
+        artifact.status, artifact.error = "failed", str(exc)[:255]
+        artifact.save(update_fields=["status", "error"])
+        return artifact
+    artifact.size, artifact.status, artifact.error = len(pdf), "ready", ""
+    artifact.generated_at = timezone.now()
+    artifact.save(update_fields=["file", "size", "status", "error", "generated_at"])
+    _discard_older(artifact)
+    return artifact
+
+
+def build_pending(limit=None):
+    """
+    Build queued artifacts, for when the worker is down. Returns (ready, failed).
+
+    Builds started more than REPORT_PDF_STALE seconds ago and still
+    "running" (a worker that died mid-way) are queued again first. Age is
+    counted from when the build started, not from the request, so a PDF
+    that waited in the queue isn't taken from a worker still rendering it.
+    """
+    stale = timezone.now() - timedelta(seconds=getattr(settings, "REPORT_PDF_STALE", 15 * 60))
+    ReportArtifact.objects.filter(
+        Q(started_at__lt=stale) | Q(started_at__isnull=True, created_at__lt=stale), status="running",
+    ).update(status="pending")
+    pending = ReportArtifact.objects.filter(status="pending").order_by("created_at").values_list("pk", flat=True)
+    ready = failed = 0
+    for artifact_id in list(pending[:limit] if limit else pending):
+        artifact = build_pdf(artifact_id)
+        if artifact is not None:
+            ready += artifact.status == "ready"
+            failed += artifact.status == "failed"
+    return ready, failed
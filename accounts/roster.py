@@ -0,0 +1,40 @@
+# accounts/roster.py
+"""
+Compact member rosters for screens that work offline: the attendance
+kiosk and the Sunday offering count.
+
+Both download the whole list once per session as
+``{"version": ..., "members": [[id, display name, phone suffix], ...]}``
+and revalidate with If-None-Match. The JSON is cached under the members
+data version, which is also the ETag, so an unchanged roster costs one
+cache lookup and a 304.
+"""
+import json
+
+from django.http import HttpResponse
+
+from koma.cache import get_or_compute, versioned_key
+
+
+def compact(rows):
+    """``(id, first name, last name, username, phone)`` rows as roster entries."""
+    return [
+        [pk, f"{first} {last}".strip() or username, (phone or "")[-3:]]
+        for pk, first, last, username, phone in rows
+    ]
+
+
+def roster_response(request, name, build):
+    """
+    Serve the roster called ``name``, built by ``build()`` (a list of
+    roster entries) when the members version has moved on.
+    """
+    key = versioned_key(("members",), name)
+    etag = f'"{key}"'
+    if request.headers.get("If-None-Match") == etag:
+        return HttpResponse(status=304)
+
+    payload = get_or_compute(key, lambda: json.dumps({"version": key, "members": build()}))
+    response = HttpResponse(payload, content_type="application/json")
+    response["ETag"] = etag
+    return response
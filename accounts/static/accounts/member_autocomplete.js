@@ -0,0 +1,73 @@
+// Member picker: searches accounts:member_autocomplete as you type and puts
+// the chosen member's id (or user id) in the hidden input next to the box.
+(function () {
+    const DEBOUNCE_MS = 150;
+
+    function setup(box) {
+        if (box.dataset.ready) return;
+        box.dataset.ready = "1";
+        const hidden = box.querySelector("input[type=hidden]");
+        const input = box.querySelector(".member-autocomplete-input");
+        const results = box.querySelector(".member-autocomplete-results");
+        const field = box.dataset.valueField || "id";
+        let timer = null;
+        let controller = null;
+
+        function clear() { results.innerHTML = ""; }
+
+        function choose(member) {
+            hidden.value = member[field];
+            input.value = member.name;
+            input.setCustomValidity("");
+            clear();
+            box.dispatchEvent(new CustomEvent("member-selected", { detail: member, bubbles: true }));
+        }
+
+        function show(members) {
+            clear();
+            members.forEach(function (m) {
+                const item = document.createElement("button");
+                item.type = "button";
+                item.className = "list-group-item list-group-item-action";
+                item.textContent = m.name + (m.phone ? "  ·  …" + m.phone : "");
+                item.addEventListener("mousedown", function (e) { e.preventDefault(); choose(m); });
+                results.appendChild(item);
+            });
+        }
+
+        input.addEventListener("input", function () {
+            hidden.value = "";
+            const q = input.value.trim();
+            clearTimeout(timer);
+            if (q.length < 2) return clear();
+            timer = setTimeout(function () {
+                if (controller) controller.abort();
+                controller = new AbortController();
+                fetch(box.dataset.url + "?q=" + encodeURIComponent(q), {
+                    credentials: "same-origin", signal: controller.signal
+                })
+                    .then(function (r) { return r.json(); })
+                    .then(function (data) { show(data.results || []); })
+                    .catch(function () {});
+            }, DEBOUNCE_MS);
+        });
+
+        input.addEventListener("keydown", function (e) {
+            if (e.key === "Enter" && results.firstChild) {
+                e.preventDefault();
+                results.firstChild.dispatchEvent(new MouseEvent("mousedown"));
+            }
+            if (e.key === "Escape") clear();
+        });
+        input.addEventListener("blur", function () {
+            setTimeout(clear, 150);
+            // Typed text without picking a match isn't a member
+            input.setCustomValidity(input.value && !hidden.value ? "Pick a member from the list" : "");
+        });
+    }
+
+    window.setupMemberAutocomplete = function (root) {
+        (root || document).querySelectorAll(".member-autocomplete").forEach(setup);
+    };
+    document.addEventListener("DOMContentLoaded", function () { window.setupMemberAutocomplete(); });
+})();
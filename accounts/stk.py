@@ -0,0 +1,402 @@
+# accounts/stk.py
+"""
+Background M-Pesa jobs: STK push submission and callback processing.
+
+The web request only records a pending Donation and queues its id on the
+``mpesa-stk`` channel; ``python manage.py runworker mpesa-stk`` talks to
+Daraja. Callbacks are stored in the MpesaCallback inbox and matched to
+their donation by the same worker. The member's page polls
+``donation_status`` until the donation leaves the pending state, and
+``reconcile_pending_donations`` settles the ones whose callback never came.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from donations import campaigns, contributions, ledger
+from donations.models import Donation
+from koma.cache import bump_version
+
+from .models import MpesaCallback
+from .mpesa import MpesaError, get_client
+
+logger = logging.getLogger(__name__)
+
+STK_CHANNEL = "mpesa-stk"
+
+
+class CircuitBreaker:
+    """
+    Shared (cache-backed) circuit breaker.
+
+    After ``threshold`` failures within ``window`` seconds the circuit opens
+    for ``reset_after`` seconds and callers fail fast instead of queueing up
+    behind a degraded service. The first call after that is let through; if
+    it fails too the circuit opens again straight away.
+    """
+
+    def __init__(self, name, threshold=5, window=60, reset_after=30):
+        self.name = name
+        self.threshold = threshold
+        self.window = window
+        self.reset_after = reset_after
+
+    @property
+    def _failures_key(self):
+        return f"circuit:{self.name}:failures"
+
+    @property
+    def _open_key(self):
+        return f"circuit:{self.name}:open"
+
+    def is_open(self):
+        return cache.get(self._open_key) is not None
+
+    def record_failure(self):
+        cache.add(self._failures_key, 0, timeout=self.window)
+        try:
+            failures = cache.incr(self._failures_key)
+        except ValueError:
+            cache.set(self._failures_key, 1, timeout=self.window)
+            failures = 1
+        if failures >= self.threshold:
+            cache.set(self._open_key, 1, timeout=self.reset_after)
+            logger.warning("Circuit %s opened after %s failures", self.name, failures)
+
+    def record_success(self):
+        cache.delete_many([self._failures_key, self._open_key])
+
+
+def mpesa_breaker():
+    return CircuitBreaker(
+        "mpesa",
+        threshold=getattr(settings, "MPESA_BREAKER_THRESHOLD", 5),
+        reset_after=getattr(settings, "MPESA_BREAKER_RESET", 30),
+    )
+
+
+def _send_on_commit(message):
+    def send():
+        try:
+            async_to_sync(get_channel_layer().send)(STK_CHANNEL, message)
+        except Exception:
+            # The row is already saved: process_mpesa_callbacks picks up a
+            # stored callback, and reconcile_pending_donations moves a push
+            # that was never sent to "unknown" for an admin to follow up.
+            # Nothing re-sends the push itself. Either way, the worker being
+            # unreachable must not turn into a 500 for the member (or a
+            # retry storm from Daraja).
+            logger.exception("Could not queue %s", message)
+
+    transaction.on_commit(send)
+
+
+def enqueue(donation):
+    """Queue the STK push once the donation's transaction has committed."""
+    _send_on_commit({"type": "stk.push", "donation_id": donation.pk})
+
+
+def _fail(donation, message):
+    donation.status = "failed"
+    donation.stk_error = message[:255]
+    donation.save(update_fields=["status", "stk_error", "stk_attempts"])
+
+
+def push_prompt(donation, client=None, limiter=None):
+    """
+    Ask Daraja to prompt the donor's phone, without touching the database.
+
+    Failures Daraja cannot have acted on (no connection, a 5xx answer)
+    are retried with backoff, counted in ``donation.stk_attempts``; Daraja
+    rejecting the request (bad number, amount, ...) is final. Returns
+    ``(checkout request id, error)`` with exactly one of them set, or
+    ``(None, None)`` when the outcome is unknown: the request timed out
+    after being sent, so the phone may have been prompted. Sending it
+    again could prompt twice, so the donation stays pending (with the
+    reason in ``donation.stk_error``) for reconcile_pending to settle.
+    ``limiter`` (a RateLimiter) paces the calls when many prompts are
+    sent at once.
+    """
+    breaker = mpesa_breaker()
+    max_attempts = getattr(settings, "MPESA_STK_MAX_ATTEMPTS", 3)
+    error = donation.stk_error
+    while donation.stk_attempts < max_attempts:
+        if breaker.is_open():
+            return None, "M-Pesa is temporarily unavailable. Please try again in a few minutes."
+
+        donation.stk_attempts += 1
+        if limiter is not None:
+            limiter.wait()
+        try:
+            response = (client or get_client()).stk_push(
+                amount=donation.amount,
+                phone_number=donation.phone_number,
+                account_reference=f"Donation-{donation.id}",
+                transaction_desc="Church Donation",
+            )
+        except MpesaError as exc:
+            breaker.record_failure()
+            logger.warning("STK push for donation %s failed: %s", donation.id, exc)
+            error = str(exc)[:255]
+            if not exc.retryable:
+                donation.stk_error = "No answer from M-Pesa; the prompt may have been sent."
+                return None, None
+            time.sleep(min(2 ** (donation.stk_attempts - 1), 8))
+            continue
+
+        breaker.record_success()
+        if response.get("ResponseCode") == "0":
+            return response.get("CheckoutRequestID"), ""
+        return None, response.get("errorMessage") or response.get("ResponseDescription") or "Mpesa payment failed."
+
+    return None, error or "Mpesa payment failed."
+
+
+def submit(donation_id):
+    """
+    Send the STK push for one pending donation (runs in the worker).
+
+    A push Daraja accepts stores its CheckoutRequestID; one with an
+    unknown outcome stays pending; anything else fails the donation (see
+    push_prompt). Safe to run twice for the same id: a donation already
+    pushed (or maybe pushed) is left alone.
+    """
+    donation = Donation.objects.filter(pk=donation_id).first()
+    if donation is None or donation.status != "pending" or donation.checkout_request_id or donation.stk_attempts:
+        return donation
+
+    checkout_request_id, error = push_prompt(donation)
+    if checkout_request_id:
+        donation.checkout_request_id = checkout_request_id
+        donation.stk_error = ""
+        donation.save(update_fields=["checkout_request_id", "stk_error", "stk_attempts"])
+    elif error is None:
+        donation.save(update_fields=["stk_error", "stk_attempts"])
+    else:
+        _fail(donation, error)
+    return donation
+
+
+# ------------------------------
+# Callback inbox
+# ------------------------------
+def record_callback(data):
+    """
+    Store a raw Daraja callback and queue it for processing.
+
+    Returns False for payloads without a CheckoutRequestID. Replays are
+    accepted but stored only once.
+    """
+    try:
+        callback = data["Body"]["stkCallback"]
+        checkout_request_id = str(callback["CheckoutRequestID"])
+        result_code = int(callback.get("ResultCode"))
+    except (KeyError, TypeError, ValueError):
+        return False
+
+    with transaction.atomic():
+        MpesaCallback.objects.bulk_create(
+            [MpesaCallback(checkout_request_id=checkout_request_id, result_code=result_code, payload=data)],
+            ignore_conflicts=True,
+        )
+        _send_on_commit({"type": "callback.process", "checkout_request_id": checkout_request_id})
+    return True
+
+
+def _metadata(callback):
+    items = (callback.get("CallbackMetadata") or {}).get("Item") or []
+    return {item.get("Name"): item.get("Value") for item in items if isinstance(item, dict)}
+
+
+def _unconfirmed_push(inbox):
+    """
+    The one donation a successful callback can only belong to when no
+    donation has its CheckoutRequestID: a push whose answer was lost (see
+    push_prompt), for the same phone and amount. None unless exactly one.
+    """
+    if inbox.result_code != 0:
+        return None
+    paid = _metadata(inbox.payload["Body"]["stkCallback"])
+    try:
+        phone, amount = str(int(paid["PhoneNumber"])), Decimal(str(paid["Amount"]))
+    except (KeyError, TypeError, ValueError, ArithmeticError):
+        return None
+    candidates = list(
+        Donation.objects.filter(
+            payment_method="mpesa", status__in=("pending", "unknown"), checkout_request_id__isnull=True,
+            stk_attempts__gt=0, phone_number=phone, amount=amount, date_donated__lte=inbox.received_at,
+        )[:2]
+    )
+    if len(candidates) != 1:
+        return None
+    donation = candidates[0]
+    updated = Donation.objects.filter(pk=donation.pk, checkout_request_id__isnull=True).update(
+        checkout_request_id=inbox.checkout_request_id,
+    )
+    return donation if updated else None
+
+
+def process_callback(inbox):
+    """
+    Apply one stored callback to its donation. Returns True once handled.
+
+    Only pending or unconfirmed donations change state, and the inbox row
+    is claimed with a conditional update, so replays and concurrent
+    workers are harmless.
+    """
+    donation = (
+        Donation.objects.filter(checkout_request_id=inbox.checkout_request_id).first()
+        or _unconfirmed_push(inbox)
+    )
+    if donation is None:
+        # The callback can beat the worker saving the CheckoutRequestID;
+        # leave it for the next pass.
+        MpesaCallback.objects.filter(pk=inbox.pk).update(error="No donation with this CheckoutRequestID yet")
+        return False
+
+    callback = inbox.payload["Body"]["stkCallback"]
+    with transaction.atomic():
+        claimed = MpesaCallback.objects.filter(pk=inbox.pk, processed_at__isnull=True).update(
+            processed_at=timezone.now(), error=""
+        )
+        if not claimed:
+            return True
+        donation = Donation.objects.select_for_update().get(pk=donation.pk)
+        if donation.status not in ("pending", "unknown"):
+            return True
+        if inbox.result_code == 0:
+            donation.status = "completed"
+            donation.transaction_id = _metadata(callback).get("MpesaReceiptNumber") or donation.transaction_id
+            donation.stk_error = ""
+        else:
+            donation.status = "failed"
+            donation.stk_error = str(callback.get("ResultDesc") or "Payment was not completed.")[:255]
+        donation.save(update_fields=["status", "transaction_id", "stk_error"])
+    return True
+
+
+def process_callbacks(checkout_request_ids=None, limit=None):
+    """Process unhandled inbox rows (optionally only some). Returns (handled, waiting)."""
+    inbox = MpesaCallback.objects.filter(processed_at__isnull=True).order_by("received_at")
+    if checkout_request_ids is not None:
+        inbox = inbox.filter(checkout_request_id__in=checkout_request_ids)
+    if limit:
+        inbox = inbox[:limit]
+    handled = waiting = 0
+    for row in inbox.iterator():
+        if process_callback(row):
+            handled += 1
+        else:
+            waiting += 1
+    return handled, waiting
+
+
+# ------------------------------
+# Reconciling lost callbacks
+# ------------------------------
+class RateLimiter:
+    """Thread-safe limiter allowing ``rate`` calls per second, spaced evenly."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def stale_pending(older_than, limit=None):
+    """Pending M-Pesa donations started before ``older_than`` ago (status/date index)."""
+    donations = Donation.objects.filter(
+        status="pending",
+        date_donated__lt=timezone.now() - older_than,
+        payment_method="mpesa",
+    ).order_by("date_donated")
+    return donations[:limit] if limit else donations
+
+
+def _query_outcome(client, limiter, donation):
+    """Return (status, error) Daraja reports for a donation, or None if still undecided."""
+    if not donation.checkout_request_id:
+        # Nothing to ask Daraja about: the push was never sent, or it was
+        # and the answer was lost. The member may have paid, so don't fail
+        # it; a matching callback, the statement or an admin settles it.
+        return "unknown", donation.stk_error or "M-Pesa never confirmed the prompt."
+    limiter.wait()
+    try:
+        response = client.stk_query(donation.checkout_request_id)
+    except MpesaError as exc:
+        logger.warning("STK query for donation %s failed: %s", donation.id, exc)
+        return None
+    result_code = response.get("ResultCode")
+    if result_code is None:
+        # Still being processed, throttled, or unknown to Daraja for now.
+        return None
+    if str(result_code) == "0":
+        return "completed", ""
+    return "failed", str(response.get("ResultDesc") or "Payment was not completed.")[:255]
+
+
+def reconcile_pending(older_than=timedelta(minutes=10), limit=500, workers=4, rate=5, client=None):
+    """
+    Ask Daraja about stuck pending donations and settle them in one write.
+
+    Only a ResultCode from Daraja completes or fails a donation; one that
+    was never given a CheckoutRequestID can't be asked about and is
+    marked "unknown" instead. Queries run on a bounded pool, paced to
+    ``rate`` requests per second overall. Returns a dict of counts.
+    """
+    client = client or get_client()
+    donations = list(stale_pending(older_than, limit))
+    limiter = RateLimiter(rate)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        outcomes = list(pool.map(lambda d: _query_outcome(client, limiter, d), donations))
+
+    decided = {d.pk: (d, outcome) for d, outcome in zip(donations, outcomes) if outcome}
+    stats = {
+        "checked": len(donations), "completed": 0, "failed": 0, "unknown": 0,
+        "undecided": len(donations) - len(decided),
+    }
+    if not decided:
+        return stats
+
+    with transaction.atomic():
+        # A callback may have settled some of these while we were asking.
+        still_pending = set(
+            Donation.objects.select_for_update()
+            .filter(pk__in=decided, status="pending")
+            .values_list("pk", flat=True)
+        )
+        changed = []
+        for pk in still_pending:
+            donation, (status, error) = decided[pk]
+            ledger_before, totals_before = ledger.entry(donation), contributions.line(donation)
+            campaign_before = campaigns.line(donation)
+            donation.status, donation.stk_error = status, error
+            # bulk_update skips the signals, so move the amounts here.
+            ledger.move(ledger_before, ledger.entry(donation))
+            contributions.move(totals_before, contributions.line(donation))
+            campaigns.move(campaign_before, campaigns.line(donation))
+            changed.append(donation)
+            stats[status] += 1
+        Donation.objects.bulk_update(changed, ["status", "stk_error"], batch_size=500)
+        stats["undecided"] += len(decided) - len(still_pending)
+    if changed:
+        bump_version("donations")
+    return stats
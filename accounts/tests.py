@@ -1,3 +1,173 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from donations import contributions, ledger
+from donations.models import Donation
+
+from . import stk
+from .models import Member, MpesaCallback
+from .mpesa import MpesaClient
+from .mpesa_stub import start_in_thread
+
+
+def callback_payload(checkout_request_id, result_code=0, receipt="QKX123ABC", phone=254712345678):
+    callback = {
+        "MerchantRequestID": "m-1",
+        "CheckoutRequestID": checkout_request_id,
+        "ResultCode": result_code,
+        "ResultDesc": "Processed" if result_code == 0 else "Request cancelled by user",
+    }
+    if result_code == 0:
+        callback["CallbackMetadata"] = {"Item": [
+            {"Name": "Amount", "Value": 100},
+            {"Name": "MpesaReceiptNumber", "Value": receipt},
+            {"Name": "PhoneNumber", "Value": phone},
+        ]}
+    return {"Body": {"stkCallback": callback}}
+
+
+class StkTestCase(TestCase):
+    """Runs the STK jobs against the local Daraja stub (accounts.mpesa_stub)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = start_in_thread()
+        cls.addClassCleanup(cls.stub.shutdown)
+
+    def setUp(self):
+        cache.clear()
+        state = self.stub.state
+        state.latency, state.fail_every, state.result_code = 0.0, 0, 0
+        state.counts = dict.fromkeys(state.counts, 0)
+        self.client_ = MpesaClient(base_url=self.stub.url, consumer_key="key", consumer_secret="secret")
+        patcher = mock.patch("accounts.stk.get_client", return_value=self.client_)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create_user("giver")
+        self.member = Member.objects.get_or_create(user=user)[0]
+
+    def donation(self, **fields):
+        fields = {
+            "member": self.member, "amount": 100, "category": "tithe", "payment_method": "mpesa",
+            "phone_number": "254712345678", "status": "pending", **fields,
+        }
+        return Donation.objects.create(**fields)
+
+
+class SubmitTests(StkTestCase):
+    def test_accepted_push_stores_checkout_request_id(self):
+        donation = stk.submit(self.donation().pk)
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, "pending")
+        self.assertTrue(donation.checkout_request_id.startswith("ws_CO_"))
+        self.assertEqual(donation.stk_attempts, 1)
+
+    def test_submit_twice_prompts_once(self):
+        donation = self.donation()
+        stk.submit(donation.pk)
+        stk.submit(donation.pk)
+        self.assertEqual(self.stub.state.counts["stk_push"], 1)
+
+    @mock.patch("accounts.stk.time.sleep")
+    def test_server_errors_are_retried_then_fail(self, sleep):
+        self.stub.state.fail_every = 1
+        donation = stk.submit(self.donation().pk)
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, "failed")
+        self.assertEqual(donation.stk_attempts, 3)
+        self.assertEqual(self.stub.state.counts["stk_push"], 3)
+
+    def test_read_timeout_leaves_donation_pending(self):
+        self.client_.access_token()  # so only the push itself is slow
+        self.client_.timeout = (1, 0.2)
+        self.stub.state.latency = 0.5
+        donation = self.donation()
+        stk.submit(donation.pk)
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, "pending")
+        self.assertIsNone(donation.checkout_request_id)
+        self.assertEqual(donation.stk_attempts, 1)
+        # Resubmitting must not prompt the phone again
+        with mock.patch.object(self.client_, "stk_push") as push:
+            stk.submit(donation.pk)
+        push.assert_not_called()
+
+
+class CallbackTests(StkTestCase):
+    def test_success_completes_donation_once(self):
+        donation = self.donation(checkout_request_id="ws_CO_1")
+        self.assertTrue(stk.record_callback(callback_payload("ws_CO_1")))
+        self.assertTrue(stk.record_callback(callback_payload("ws_CO_1", receipt="REPLAYED")))
+        self.assertEqual(MpesaCallback.objects.count(), 1)
+
+        self.assertEqual(stk.process_callbacks(), (1, 0))
+        self.assertEqual(stk.process_callbacks(), (0, 0))
+        donation.refresh_from_db()
+        self.assertEqual((donation.status, donation.transaction_id), ("completed", "QKX123ABC"))
+
+    def test_cancelled_prompt_fails_donation(self):
+        donation = self.donation(checkout_request_id="ws_CO_2")
+        stk.record_callback(callback_payload("ws_CO_2", result_code=1032))
+        stk.process_callbacks()
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, "failed")
+        self.assertEqual(donation.stk_error, "Request cancelled by user")
+
+    def test_callback_before_checkout_id_waits(self):
+        stk.record_callback(callback_payload("ws_CO_3"))
+        self.assertEqual(stk.process_callbacks(), (0, 1))
+
+        donation = self.donation(checkout_request_id="ws_CO_3")
+        self.assertEqual(stk.process_callbacks(), (1, 0))
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, "completed")
+
+    def test_callback_settles_push_whose_answer_was_lost(self):
+        donation = self.donation(status="unknown", stk_attempts=1)
+        stk.record_callback(callback_payload("ws_CO_4"))
+        self.assertEqual(stk.process_callbacks(), (1, 0))
+        donation.refresh_from_db()
+        self.assertEqual((donation.status, donation.checkout_request_id), ("completed", "ws_CO_4"))
+
+    def test_malformed_callback_is_refused(self):
+        self.assertFalse(stk.record_callback({"Body": {}}))
+
+
+class ReconcileTests(StkTestCase):
+    def test_settles_stale_pending_donations(self):
+        paid = stk.submit(self.donation().pk)
+        never_sent = self.donation()
+        unknown_to_daraja = self.donation(checkout_request_id="ws_CO_missing")
+        recent = stk.submit(self.donation().pk)
+        Donation.objects.exclude(pk=recent.pk).update(date_donated=timezone.now() - timedelta(hours=1))
+
+        stats = stk.reconcile_pending(client=self.client_, rate=0)
+
+        self.assertEqual(stats, {"checked": 3, "completed": 1, "failed": 0, "unknown": 1, "undecided": 1})
+        statuses = dict(Donation.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[paid.pk], "completed")
+        # Without an answer from Daraja the member may still have paid
+        self.assertEqual(statuses[never_sent.pk], "unknown")
+        self.assertEqual(statuses[unknown_to_daraja.pk], "pending")
+        self.assertEqual(statuses[recent.pk], "pending")
+        # bulk_update skips the signals; the rollups must still agree
+        self.assertEqual(ledger.verify(), [])
+        self.assertEqual(contributions.verify(), [])
 
-# Create your tests here.
+    def test_callback_already_handled_wins(self):
+        donation = stk.submit(self.donation().pk)
+        Donation.objects.filter(pk=donation.pk).update(date_donated=timezone.now() - timedelta(hours=1))
+        self.stub.state.result_code = 1032
+        with mock.patch("accounts.stk.stale_pending", return_value=[donation]):
+            stk.record_callback(callback_payload(donation.checkout_request_id))
+            stk.process_callbacks()
+            stats = stk.reconcile_pending(client=self.client_, rate=0)
+        self.assertEqual(stats["undecided"], 1)
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, "completed")
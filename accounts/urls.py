@@ -46,6 +46,8 @@ path("manage-prayer-requests/", views.manage_prayer_requests, name="manage_praye
     # --------------------------------
     path("admin-dashboard/reports/", views.reports_analytics, name="reports_analytics"),
     path("admin-dashboard/reports/pdf/", views.reports_pdf_view, name="reports_pdf"),
+    path("admin-dashboard/reports/data/<slug:series>/", views.report_series, name="report_series"),
+    path("admin-dashboard/reports/trends/", views.report_trends, name="report_trends"),
 
     # --------------------------------
     # Profile & Account Management
@@ -60,6 +62,8 @@ path("manage-prayer-requests/", views.manage_prayer_requests, name="manage_praye
     path("donations/", views.donations_view, name="donations"),
     path("contributions/", views.contributions, name="contributions"),
     path("make-donation/", views.make_donation, name="make_donation"),
+    path("donations/<int:pk>/pending/", views.donation_pending, name="donation_pending"),
+    path("donations/<int:pk>/status/", views.donation_status, name="donation_status"),
     path("make-contribution/", views.make_contribution, name="make_contribution"),
     path("donations-finances/", views.donations_finances, name="donations_finances"),
 
@@ -91,6 +95,7 @@ path("manage-prayer-requests/", views.manage_prayer_requests, name="manage_praye
     path("volunteer-management/", views.volunteer_management, name="volunteer_management"),
     path("send-notifications/", views.send_notifications, name="send_notifications"),
     path("news-feed-management/", views.news_feed_management, name="news_feed_management"),
+    path("members/autocomplete/", views.member_autocomplete, name="member_autocomplete"),
     path("member/<int:member_id>/edit/", views.edit_member, name="edit_member"),
     path("member/<int:member_id>/delete/", views.delete_member, name="delete_member"),
     path("admin/prayer-requests/", views.admin_prayer_requests, name="admin_prayer_requests"),
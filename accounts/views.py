@@ -7,30 +7,34 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm, PasswordChangeForm
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse
+from django.db import transaction
 from django.utils.timezone import now
-from django.db.models import Sum
+from django.db.models import F, Sum
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.contrib.admin.views.decorators import staff_member_required
 
 # Models
-from .models import Member, AttendanceRecord, Volunteer, Role, NewsPost, PrayerRequest
+from .models import Member, AttendanceRecord, Volunteer, Role, NewsPost, PrayerRequest, MemberEngagement
 from donations.models import Donation  # ✅ Correct Donation model with 'member' field
+from koma.cache import get_last_modified
 
 # Forms
-from .forms import DonationForm, PrayerRequestForm
+from .forms import MpesaDonationForm, PrayerRequestForm
 
 # Serializers
 from .serializers import MemberSerializer, RoleSerializer
 
 # External services
-from .mpesa import lipa_na_mpesa
+from . import analytics, member_search, reports, stk
 
 # REST framework
 from rest_framework import viewsets, permissions
 
 # Standard libraries
 import json
+import re
 # Utility
 # =====================================================
 def is_admin(user):
@@ -101,8 +105,8 @@ def profile_view(request):
     attendance_records = AttendanceRecord.objects.filter(member=member)
     volunteer_roles = Volunteer.objects.filter(user=request.user)
 
-    # Total donations
-    total_donations = donations.aggregate(total=Sum("amount"))["total"] or 0
+    # Totals are kept on the member row as donations are recorded
+    total_donations = member.total_contributions
 
     # Chart Data (limit to latest 10 donations)
     ordered_donations = donations.order_by("date_donated")[:10]
@@ -116,6 +120,8 @@ def profile_view(request):
         "profile_completion": 0,  # You can calculate this later
         "badges": [],
         "total_donations": total_donations,
+        "ytd_contributions": member.contributions_this_year,
+        "last_gift_date": member.last_gift_date,
         "events_attended_count": attendance_records.count(),
         "volunteer_count": volunteer_roles.count(),
         "recent_donations": donations.order_by("-date_donated")[:5],
@@ -174,14 +180,14 @@ def update_notifications(request):
 def donations_view(request):
     # Filter donations for the logged-in user's member profile
     donations = Donation.objects.filter(member__user=request.user).order_by("-date_donated")
-
-    # Calculate total donations
-    total_donations = donations.aggregate(total=Sum("amount"))["total"] or 0
+    member = Member.objects.filter(user=request.user).first()
 
     # Pass data to the template
     context = {
         "donations": donations,
-        "total_donations": total_donations,
+        "total_donations": member.total_contributions if member else 0,
+        "ytd_contributions": member.contributions_this_year if member else 0,
+        "last_gift_date": member.last_gift_date if member else None,
     }
     return render(request, "accounts/donations.html", context)
 
@@ -193,32 +199,60 @@ def contributions(request):
 
 @login_required
 def make_donation(request):
+    """
+    Record a pending M-Pesa donation and hand the STK push to the worker.
+
+    The request never waits on Daraja; the pending page polls
+    donation_status until the callback (or the worker) settles it.
+    """
+    breaker = stk.mpesa_breaker()
     if request.method == "POST":
-        form = DonationForm(request.POST)
-        phone_number = request.POST.get("phone_number")
-        if form.is_valid():
-            donation = form.save(commit=False)
-            donation.user = request.user
-            donation.save()
-
-            # Trigger Mpesa STK Push
-            response = lipa_na_mpesa(
-                amount=donation.amount,
-                phone_number=phone_number,
-                account_reference=f"Donation-{donation.id}",
-                transaction_desc="Church Donation",
-            )
-
-            if response.get("ResponseCode") == "0":
-                return render(request, "accounts/donation_pending.html", {"donation": donation})
-            else:
-                donation.delete()
-                form.add_error(None, "Mpesa payment failed. Try again.")
+        form = MpesaDonationForm(request.POST)
+        if breaker.is_open():
+            form.add_error(None, "M-Pesa is temporarily unavailable. Please try again in a few minutes.")
+        elif form.is_valid():
+            member, _ = Member.objects.get_or_create(user=request.user)
+            with transaction.atomic():
+                donation = form.save(commit=False)
+                donation.member = member
+                donation.payment_method = "mpesa"
+                donation.status = "pending"
+                donation.save()
+                stk.enqueue(donation)
+            return redirect("accounts:donation_pending", pk=donation.pk)
     else:
-        form = DonationForm()
+        initial = {}
+        member = Member.objects.filter(user=request.user).first()
+        if member and member.phone:
+            initial["phone_number"] = member.phone
+        form = MpesaDonationForm(initial=initial)
     return render(request, "accounts/make_donation.html", {"form": form})
 
 
+def _own_donation(request, pk):
+    donation = get_object_or_404(Donation.objects.select_related("member"), pk=pk)
+    if donation.member.user_id != request.user.id and not request.user.is_staff:
+        raise Http404
+    return donation
+
+
+@login_required
+def donation_pending(request, pk):
+    donation = _own_donation(request, pk)
+    return render(request, "accounts/donation_pending.html", {"donation": donation})
+
+
+@login_required
+def donation_status(request, pk):
+    donation = _own_donation(request, pk)
+    return JsonResponse({
+        "id": donation.pk,
+        "status": donation.status,
+        "submitted": bool(donation.checkout_request_id),
+        "error": donation.stk_error,
+    })
+
+
 @login_required
 def make_contribution(request):
     if request.method == "POST":
@@ -238,17 +272,16 @@ def make_contribution(request):
 # Mpesa Callback
 # =====================================================
 @csrf_exempt
+@require_POST
 def mpesa_callback(request):
-    data = json.loads(request.body)
-    checkout_request_id = data["Body"]["stkCallback"]["CheckoutRequestID"]
-    result_code = data["Body"]["stkCallback"]["ResultCode"]
-
-    donation = Donation.objects.filter(id=checkout_request_id).first()
-    if donation and result_code == 0:
-        donation.paid = True
-        donation.save()
-
-    return HttpResponse("OK")
+    """Store the callback and ack at once; the mpesa-stk worker applies it."""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"ResultCode": 1, "ResultDesc": "Invalid JSON"}, status=400)
+    if not stk.record_callback(data):
+        return JsonResponse({"ResultCode": 1, "ResultDesc": "Invalid payload"}, status=400)
+    return JsonResponse({"ResultCode": 0, "ResultDesc": "Accepted"})
 
 
 # =====================================================
@@ -331,8 +364,36 @@ def forums_view(request):
 @login_required
 @user_passes_test(is_admin)
 def member_management(request):
-    members = Member.objects.all()
-    return render(request, "accounts/member_management.html", {"members": members})
+    members = Member.objects.select_related("user", "role", "engagement")
+
+    # Engagement scores come from the nightly batch (accounts/engagement.py)
+    level = request.GET.get("level", "")
+    if level in dict(MemberEngagement.LEVEL_CHOICES):
+        members = members.filter(engagement__level=level)
+    elif level == "unscored":
+        members = members.filter(engagement__isnull=True)
+    try:
+        min_score = int(request.GET.get("min_score", ""))
+        members = members.filter(engagement__score__gte=min_score)
+    except ValueError:
+        min_score = None
+
+    sort = request.GET.get("sort", "")
+    orderings = {
+        "score": [F("engagement__score").asc(nulls_first=True), "user__username"],
+        "-score": [F("engagement__score").desc(nulls_last=True), "user__username"],
+        "name": ["user__first_name", "user__last_name", "user__username"],
+        "joined": ["-user__date_joined"],
+    }
+    members = members.order_by(*orderings.get(sort, ["id"]))
+
+    return render(request, "accounts/member_management.html", {
+        "members": members,
+        "levels": MemberEngagement.LEVEL_CHOICES,
+        "level": level,
+        "min_score": min_score,
+        "sort": sort,
+    })
 
 
 @login_required
@@ -703,284 +764,159 @@ from django.shortcuts import render
 from django.db.models import Sum, Count
 from django.utils import timezone
 from datetime import datetime
-from donations.models import Donation
 from events.models import Event
 from volunteers.models import Volunteer
 from accounts.models import Member
-from attendance.models import Attendance
 from django.contrib.auth.decorators import login_required
 
 
 @login_required
+@user_passes_test(is_admin)
 def reports_analytics(request):
-    current_year = timezone.now().year
+    # Cached per period and recomputed once per data change (accounts/reports.py)
+    start, end = reports.period_from(request.GET)
+    data = reports.report(start, end)
+    totals = data["totals"]
 
-    # -----------------------------
-    # Total Counts
-    # -----------------------------
-    total_donations = Donation.objects.aggregate(total=Sum('amount'))['total'] or 0
-    total_members = Member.objects.count()
-    total_volunteers = Volunteer.objects.count()
-    total_events = Event.objects.count()
+    context = {
+        "current_year": start.year,
+        "period_label": reports.period_label(start, end),
+        "pdf_query": request.GET.urlencode(),
+        "series_query": f"from={start:%Y-%m}&to={end:%Y-%m}",
+        "years": reports.available_years(),
+        "range_from": start.strftime("%Y-%m"),
+        "range_to": end.strftime("%Y-%m"),
+        "is_range": "from" in request.GET,
+        "total_donations": totals["donations"],
+        "total_members": totals["members"],
+        "total_volunteers": totals["volunteers"],
+        "total_events": totals["events"],
+        "trends": analytics.trends(),
+        "cohorts": analytics.cohort_retention(),
+    }
 
-    # -----------------------------
-    # Monthly Donations (Bar Chart)
-    # -----------------------------
-    monthly_data = (
-        Donation.objects.filter(date_donated__year=current_year)
-        .values_list('date_donated__month')
-        .annotate(total=Sum('amount'))
-        .order_by('date_donated__month')
-    )
-    donation_months = [datetime(2000, m, 1).strftime('%b') for m, _ in monthly_data]
-    donation_totals = [total for _, total in monthly_data]
+    return render(request, "accounts/reports_analytics.html", context)
 
-    # -----------------------------
-    # Event Attendance (Line Chart)
-    # -----------------------------
-    try:
-        attendance_data_qs = (
-            Attendance.objects.filter(date__year=current_year)
-            .values_list('date__month')
-            .annotate(count=Count('id'))
-            .order_by('date__month')
-        )
-        attendance_labels = [datetime(2000, m, 1).strftime('%b') for m, _ in attendance_data_qs]
-        attendance_data = [count for _, count in attendance_data_qs]
-    except Exception:
-        attendance_labels = []
-        attendance_data = []
 
-    # -----------------------------
-    # Volunteers by Department (Pie Chart)
-    # -----------------------------
-    volunteer_stats = (
-        Volunteer.objects.values_list('opportunity__department')
-        .annotate(count=Count('id'))
-        .order_by('-count')
-    )
-    volunteer_departments = [v[0] or "Unassigned" for v in volunteer_stats]
-    volunteer_counts = [v[1] for v in volunteer_stats]
+def _series_period(request, series):
+    if series not in reports.SERIES:
+        raise Http404("No such chart series")
+    return reports.period_from(request.GET)
 
-    # -----------------------------
-    # Member Growth (Line Chart)
-    # -----------------------------
-    member_growth = (
-        Member.objects.filter(join_date__year=current_year)
-        .values_list('join_date__month')
-        .annotate(count=Count('id'))
-        .order_by('join_date__month')
-    )
-    member_growth_months = [datetime(2000, m, 1).strftime('%b') for m, _ in member_growth]
-    member_growth_counts = [count for _, count in member_growth]
 
-    # -----------------------------
-    # Context
-    # -----------------------------
-    context = {
-        "current_year": current_year,
-        "total_donations": total_donations,
-        "total_members": total_members,
-        "total_volunteers": total_volunteers,
-        "total_events": total_events,
-        "donation_months": donation_months,
-        "donation_totals": donation_totals,
-        "attendance_labels": attendance_labels,
-        "attendance_data": attendance_data,
-        "volunteer_departments": volunteer_departments,
-        "volunteer_counts": volunteer_counts,
-        "member_growth_months": member_growth_months,
-        "member_growth_counts": member_growth_counts,
-    }
+def _series_etag(request, series):
+    return reports.series_key(series, *_series_period(request, series)) if series in reports.SERIES else None
 
-    return render(request, "accounts/reports_analytics.html", context)
+
+def _series_last_modified(request, series):
+    return reports.series_last_modified(series) if series in reports.SERIES else None
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_GET
+@condition(
+    etag_func=lambda request: analytics.trends_key(),
+    last_modified_func=lambda request: get_last_modified(*analytics.NAMESPACES),
+)
+def report_trends(request):
+    """Moving averages, year-over-year, seasonality and the giving forecast (accounts/analytics.py)."""
+    return JsonResponse(analytics.trends())
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_GET
+@condition(etag_func=_series_etag, last_modified_func=_series_last_modified)
+def report_series(request, series):
+    """
+    One chart's data as JSON, for the same ?year= / ?from=&to= as the page.
+
+    The ETag and Last-Modified come from the data versions that series
+    reads, so a revalidation is answered with a 304 before any query runs.
+    """
+    start, end = _series_period(request, series)
+    return JsonResponse({
+        "series": series,
+        "period": reports.period_label(start, end),
+        **reports.series(series, start, end),
+    })
 # accounts/views.py
 # accounts/views.py
 
-from io import BytesIO
 from django.http import HttpResponse
 from django.utils import timezone
 from django.db.models import Sum, Count
-from django.db.models.functions import TruncMonth
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
 
-from donations.models import Donation
 from accounts.models import Member
 from volunteers.models import Volunteer
 from events.models import Event
-from attendance.models import Attendance
-
-
-def reports_pdf_view(request):
-    """Generate dynamic Reports & Analytics (2025) PDF."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elements = []
 
-    current_year = timezone.now().year
-
-    # -------------------------------------------------------
-    # HEADER
-    # -------------------------------------------------------
-    elements.append(Paragraph("<b>Reports &amp; Analytics (2025)</b>", styles["Title"]))
-    elements.append(Spacer(1, 12))
-
-    # -------------------------------------------------------
-    # SUMMARY METRICS
-    # -------------------------------------------------------
-    total_donations = Donation.objects.aggregate(total=Sum("amount"))["total"] or 0
-    total_members = Member.objects.count()
-    total_volunteers = Volunteer.objects.count()
-    total_events = Event.objects.count()
-
-    summary_data = [
-        ["💰 Total Donations", f"Ksh {total_donations:,}"],
-        ["👥 Members", str(total_members)],
-        ["🤝 Volunteers", str(total_volunteers)],
-        ["📅 Events", str(total_events)],
-    ]
-
-    summary_table = Table(summary_data, colWidths=[250, 200])
-    summary_table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, -1), colors.whitesmoke),
-        ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
-        ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
-        ("FONTSIZE", (0, 0), (-1, -1), 11),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 20))
-
-    # -------------------------------------------------------
-    # MONTHLY DONATIONS
-    # -------------------------------------------------------
-    elements.append(Paragraph("<b>💰 Monthly Donations</b>", styles["Heading2"]))
-    elements.append(Spacer(1, 6))
-
-    monthly_donations = (
-        Donation.objects.filter(date_donated__year=current_year)
-        .annotate(month=TruncMonth("date_donated"))
-        .values("month")
-        .annotate(total=Sum("amount"))
-        .order_by("month")
-    )
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
 
-    if monthly_donations:
-        donation_data = [["Month", "Total (Ksh)"]]
-        for item in monthly_donations:
-            donation_data.append([item["month"].strftime("%B"), f"{item['total']:,}"])
-    else:
-        donation_data = [["No donation data available"]]
-
-    donation_table = Table(donation_data, colWidths=[250, 150])
-    donation_table.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-    ]))
-    elements.append(donation_table)
-    elements.append(Spacer(1, 20))
-
-    # -------------------------------------------------------
-    # EVENT ATTENDANCE
-    # -------------------------------------------------------
-    elements.append(Paragraph("<b>🧍 Event Attendance</b>", styles["Heading2"]))
-    elements.append(Spacer(1, 6))
-
-    attendance_data = (
-        Attendance.objects.values("event__title")
-        .annotate(total=Count("id"))
-        .order_by("-total")
-    )
 
-    if attendance_data:
-        attendance_table_data = [["Event", "Attendance Count"]]
-        for record in attendance_data:
-            attendance_table_data.append([record["event__title"], record["total"]])
+def _byte_range(header, size):
+    """
+    ``(first, last)`` for a single-range ``Range`` header, None to send the
+    whole file, or "unsatisfiable".
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None  # multiple ranges or junk: the full body is a valid answer
+    first, last = match.groups()
+    if first:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
     else:
-        attendance_table_data = [["No attendance data available"]]
-
-    attendance_table = Table(attendance_table_data, colWidths=[300, 100])
-    attendance_table.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-    ]))
-    elements.append(attendance_table)
-    elements.append(Spacer(1, 20))
-
-    # -------------------------------------------------------
-    # VOLUNTEERS BY OPPORTUNITY
-    # -------------------------------------------------------
-    elements.append(Paragraph("<b>🤝 Volunteers by Opportunity</b>", styles["Heading2"]))
-    elements.append(Spacer(1, 6))
-
-    volunteers_by_opportunity = (
-        Volunteer.objects.values("opportunity__description")
-        .annotate(total=Count("id"))
-        .order_by("opportunity__description")
-    )
+        first, last = max(size - int(last), 0), size - 1
+    if first > last or first >= size:
+        return "unsatisfiable"
+    return first, last
+
+
+def _serve_artifact(request, artifact):
+    """Serve a stored PDF with ETag revalidation and byte-range support."""
+    etag = f'"{artifact.key}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    size = artifact.size
+    byte_range = None
+    if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+        byte_range = _byte_range(request.headers["Range"], size)
+    if byte_range == "unsatisfiable":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    with artifact.file.open("rb") as pdf:
+        if byte_range:
+            first, last = byte_range
+            pdf.seek(first)
+            response = HttpResponse(pdf.read(last - first + 1), status=206, content_type="application/pdf")
+            response["Content-Range"] = f"bytes {first}-{last}/{size}"
+        else:
+            response = HttpResponse(pdf.read(), content_type="application/pdf")
+    response["ETag"] = etag
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{reports.pdf_filename(artifact)}"'
+    return response
 
-    if volunteers_by_opportunity:
-        volunteer_table_data = [["Opportunity Description", "Volunteers"]]
-        for item in volunteers_by_opportunity:
-            volunteer_table_data.append([item["opportunity__description"], item["total"]])
-    else:
-        volunteer_table_data = [["No volunteer data available"]]
-
-    volunteer_table = Table(volunteer_table_data, colWidths=[300, 100])
-    volunteer_table.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-    ]))
-    elements.append(volunteer_table)
-    elements.append(Spacer(1, 20))
-
-    # -------------------------------------------------------
-    # MEMBER GROWTH
-    # -------------------------------------------------------
-    elements.append(Paragraph("<b>👥 Member Growth</b>", styles["Heading2"]))
-    elements.append(Spacer(1, 6))
-
-    member_growth = (
-        Member.objects.filter(join_date__year=current_year)
-        .annotate(month=TruncMonth("join_date"))
-        .values("month")
-        .annotate(total=Count("id"))
-        .order_by("month")
-    )
 
-    if member_growth:
-        growth_table_data = [["Month", "New Members"]]
-        for mg in member_growth:
-            growth_table_data.append([mg["month"].strftime("%B"), mg["total"]])
-    else:
-        growth_table_data = [["No new members data available"]]
-
-    growth_table = Table(growth_table_data, colWidths=[300, 100])
-    growth_table.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-    ]))
-    elements.append(growth_table)
-    elements.append(Spacer(1, 20))
-
-    # -------------------------------------------------------
-    # BUILD AND RETURN PDF
-    # -------------------------------------------------------
-    doc.build(elements)
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type="application/pdf")
-    response["Content-Disposition"] = 'attachment; filename="Reports_Analytics_2025.pdf"'
-    return response
+@login_required
+@user_passes_test(is_admin)
+def reports_pdf_view(request):
+    """Download the Reports & Analytics PDF, built in the background and kept until the data changes."""
+    start, end = reports.period_from(request.GET)
+    artifact = reports.request_pdf(start, end, request.user)
+    if artifact.status == "ready":
+        return _serve_artifact(request, artifact)
+    return render(request, "accounts/report_pdf_pending.html", {
+        "artifact": artifact,
+        "period_label": reports.period_label(start, end),
+        "back_query": request.GET.urlencode(),
+    }, status=202)
 from django.shortcuts import render, redirect
 from django.contrib import messages
 
@@ -1570,3 +1506,18 @@ def user_dashboard(request):
     return render(request, 'accounts/user_dashboard.html', {
         'upcoming_events': upcoming_events
     })
+
+
+# ----------------------------
+# Member Autocomplete
+# ----------------------------
+@user_passes_test(is_admin)
+@require_GET
+def member_autocomplete(request):
+    """Top matches for the member pickers: ?q=<name or phone prefix>&limit=8."""
+    try:
+        limit = int(request.GET.get("limit", member_search.DEFAULT_LIMIT))
+    except ValueError:
+        limit = member_search.DEFAULT_LIMIT
+    results = member_search.search(request.GET.get("q", ""), limit)
+    return JsonResponse({"results": results})
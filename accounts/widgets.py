@@ -0,0 +1,47 @@
+# accounts/widgets.py
+from django import forms
+from django.urls import reverse
+
+from . import member_search
+from .models import Member
+
+
+class MemberAutocomplete(forms.Widget):
+    """
+    Text box that searches members as you type and submits the chosen id.
+
+    Replaces a Select over every member: only the current value's name is
+    rendered, and matches come from ``accounts:member_autocomplete``.
+    ``value_field`` is "id" for Member foreign keys or "user" for fields
+    that point at the member's User.
+    """
+    template_name = "accounts/widgets/member_autocomplete.html"
+
+    class Media:
+        js = ("accounts/member_autocomplete.js",)
+
+    def __init__(self, attrs=None, value_field="id", required=False):
+        super().__init__(attrs)
+        self.value_field = value_field
+        # Form fields set this themselves; it's for pickers rendered on their own
+        self.is_required = required
+
+    def current_label(self, value):
+        if value in (None, ""):
+            return ""
+        lookup = {"user_id": value} if self.value_field == "user" else {"pk": value}
+        row = (
+            Member.objects.filter(**lookup)
+            .values_list("id", "user_id", "user__first_name", "user__last_name", "user__username", "phone")
+            .first()
+        )
+        return member_search.as_result(*row)["name"] if row else ""
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"].update({
+            "label": self.current_label(value),
+            "url": reverse("accounts:member_autocomplete"),
+            "value_field": self.value_field,
+        })
+        return context
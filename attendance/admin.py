@@ -1,8 +1,73 @@
-from django.contrib import admin
-from .models import Attendance
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path
+
+from .importer import import_attendance
+from .models import Attendance, EventHeadcount, MemberAttendanceState
+
+
+class AttendanceImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with columns: member, event, date and optionally status.")
+
 
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
     list_display = ('member', 'event', 'status', 'date')
     list_filter = ('status', 'event')
     search_fields = ('member__username', 'event__title')
+    change_list_template = 'admin/attendance/attendance/change_list.html'
+
+    def get_urls(self):
+        custom = [
+            path('import-csv/', self.admin_site.admin_view(self.import_csv), name='attendance_attendance_import'),
+        ]
+        return custom + super().get_urls()
+
+    def import_csv(self, request):
+        """Stream an uploaded CSV straight into the importer without loading it into memory."""
+        rejects = []
+        form = AttendanceImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+
+            def on_reject(line, reason, row):
+                if len(rejects) < 200:
+                    rejects.append({'line': line, 'reason': reason, 'row': row})
+
+            try:
+                stats = import_attendance(upload, on_reject=on_reject)
+            except ValueError as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(
+                    request,
+                    f"Read {stats['read']} rows: {stats['inserted']} inserted, "
+                    f"{stats['duplicates']} already recorded, {stats['rejected']} rejected.",
+                )
+                if not rejects:
+                    return redirect('admin:attendance_attendance_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import attendance from CSV',
+            'form': form,
+            'rejects': rejects,
+        }
+        return render(request, 'admin/attendance/attendance/import_csv.html', context)
+
+
+@admin.register(EventHeadcount)
+class EventHeadcountAdmin(admin.ModelAdmin):
+    list_display = ('event', 'adults', 'children', 'visitors', 'online', 'updated_by', 'updated_at')
+    search_fields = ('event__title',)
+
+
+@admin.register(MemberAttendanceState)
+class MemberAttendanceStateAdmin(admin.ModelAdmin):
+    list_display = ('member', 'last_seen_at', 'last_event', 'current_streak', 'longest_streak', 'updated_at')
+    search_fields = ('member__username',)
+    ordering = ('last_seen_at',)
@@ -0,0 +1,209 @@
+import csv
+from collections import Counter
+from datetime import datetime, time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from events.models import Event
+
+from . import rollups, streaks
+from .models import Attendance, MonthlyAttendance
+
+CHUNK_SIZE = 5000
+VALID_STATUSES = {choice for choice, _ in Attendance.STATUS_CHOICES}
+
+
+def _phone_key(phone):
+    """Compare phone numbers on their last nine digits (07.. / 2547.. / +2547..)."""
+    digits = "".join(ch for ch in phone or "" if ch.isdigit())
+    return digits[-9:] if len(digits) >= 9 else None
+
+
+def build_member_lookup():
+    """Map usernames, emails and phone numbers to user ids in one pass."""
+    lookup = {}
+    rows = User.objects.values_list("id", "username", "email", "member__phone")
+    for user_id, username, email, phone in rows.iterator(chunk_size=5000):
+        if email:
+            lookup.setdefault(email.lower(), user_id)
+        phone = _phone_key(phone)
+        if phone:
+            lookup.setdefault(phone, user_id)
+        lookup[username.lower()] = user_id  # usernames are unique, so they win
+    return lookup
+
+
+def build_event_lookup():
+    """Map event ids, (title, day) pairs and unambiguous titles to event ids."""
+    by_id, by_title_day, by_title = {}, {}, {}
+    for event_id, title, date in Event.objects.values_list("id", "title", "date"):
+        by_id[str(event_id)] = event_id
+        key = title.strip().lower()
+        by_title_day[(key, timezone.localtime(date).date())] = event_id
+        # A title shared by several events can only be resolved with a date
+        by_title[key] = None if key in by_title else event_id
+    return by_id, by_title_day, by_title
+
+
+def _parse_when(value, tz):
+    value = (value or "").strip()
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        when = datetime.combine(day, time.min)
+    if timezone.is_naive(when):
+        when = when.replace(tzinfo=tz)
+    day = timezone.localtime(when, tz).date()
+    return connection.ops.adapt_datetimefield_value(when), day, rollups.month_of(when)
+
+
+def iter_rows(lines, delimiter=","):
+    """Yield (line number, row dict) lazily from any iterable of CSV lines."""
+    reader = csv.DictReader(lines, delimiter=delimiter)
+    missing = {"member", "event", "date"} - set(f.strip().lower() for f in reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"CSV is missing required column(s): {', '.join(sorted(missing))}")
+    for row in reader:
+        yield reader.line_num, {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+
+
+def _insert(model, columns, rows, update=None, unique=None):
+    """
+    Same effect as ``bulk_create(ignore_conflicts=True)`` for plain tuples,
+    or ``bulk_create(update_conflicts=True, update_fields=update,
+    unique_fields=unique)`` when ``update`` is given.
+
+    Building a model instance per row costs more than parsing the CSV did,
+    so rows are sent through executemany with the backend's own
+    INSERT-or-ignore / upsert syntax instead.
+    """
+    if not rows:
+        return
+    ops = connection.ops
+    on_conflict = OnConflict.UPDATE if update else OnConflict.IGNORE
+    fields = [model._meta.get_field(c) for c in columns]
+    update_columns = [model._meta.get_field(c).column for c in update or ()]
+    unique_columns = [model._meta.get_field(c).column for c in unique or ()]
+    sql = "{insert} {table} ({columns}) VALUES ({params}) {suffix}".format(
+        insert=ops.insert_statement(on_conflict=on_conflict),
+        table=ops.quote_name(model._meta.db_table),
+        columns=", ".join(ops.quote_name(f.column) for f in fields),
+        params=", ".join(["%s"] * len(fields)),
+        suffix=ops.on_conflict_suffix_sql(fields, on_conflict, update_columns, unique_columns) or "",
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _flush(batch):
+    """Insert one chunk of parsed rows and return the new rows' (event id, month) pairs."""
+    existing = set(
+        Attendance.objects.filter(
+            event_id__in={r[1] for r in batch},
+            member_id__in={r[0] for r in batch},
+        ).values_list("member_id", "event_id")
+    )
+    attendance, monthly, added = [], [], []
+    for member_id, event_id, date, status, month in batch:
+        if (member_id, event_id) in existing:
+            continue
+        existing.add((member_id, event_id))
+        attendance.append((member_id, event_id, date, status))
+        monthly.append((member_id, event_id, month, 1))
+        added.append((event_id, month))
+
+    with transaction.atomic():
+        _insert(Attendance, ["member", "event", "date", "status"], attendance)
+        # The pair is new, but a removed check-in can leave its rollup row at
+        # zero. A member has at most one check-in per event, so the month's
+        # count for the pair is exactly 1 and can simply be overwritten.
+        _insert(
+            MonthlyAttendance, ["member", "event", "month", "count"], monthly,
+            update=["count"], unique=["member", "event", "month"],
+        )
+        for (event_id, month), count in Counter(added).items():
+            rollups.bump_event_total(event_id, month, count)
+    return len(attendance)
+
+
+def import_attendance(lines, delimiter=",", chunk_size=CHUNK_SIZE, on_reject=None):
+    """
+    Stream attendance rows from CSV into the database.
+
+    Columns: member (username, email or phone), event (id or title),
+    date (ISO date or datetime) and an optional status. Rows already
+    present for the same (member, event) are skipped. Bad rows are passed
+    to ``on_reject(line_number, reason, row)`` and never stop the import.
+    Returns a dict of counters.
+    """
+    members = build_member_lookup()
+    events_by_id, events_by_title_day, events_by_title = build_event_lookup()
+    stats = {"read": 0, "rejected": 0, "inserted": 0}
+    dates = {}
+    tz = timezone.get_current_timezone()
+
+    def reject(line, reason, row):
+        stats["rejected"] += 1
+        if on_reject:
+            on_reject(line, reason, row)
+
+    batch = []
+    seen_members = set()
+    for line, row in iter_rows(lines, delimiter):
+        stats["read"] += 1
+
+        member_ref = row.get("member", "").lower()
+        member_id = members.get(member_ref) or members.get(_phone_key(member_ref))
+        if member_id is None:
+            reject(line, "Unknown member", row)
+            continue
+
+        raw_date = row.get("date")
+        # Exports repeat the same few service dates, so parse each one once
+        if raw_date not in dates:
+            dates[raw_date] = _parse_when(raw_date, tz)
+        parsed = dates[raw_date]
+        if parsed is None:
+            reject(line, "Invalid date", row)
+            continue
+        db_date, day, month = parsed
+
+        event_ref = row.get("event", "")
+        title = event_ref.lower()
+        event_id = (
+            events_by_id.get(event_ref)
+            or events_by_title_day.get((title, day))
+            or events_by_title.get(title)
+        )
+        if event_id is None:
+            reject(line, "Unknown or ambiguous event", row)
+            continue
+
+        status = (row.get("status") or "Present").capitalize()
+        if status not in VALID_STATUSES:
+            reject(line, "Invalid status", row)
+            continue
+
+        batch.append((member_id, event_id, db_date, status, month))
+        if status in streaks.SEEN_STATUSES:
+            seen_members.add(member_id)
+        if len(batch) >= chunk_size:
+            stats["inserted"] += _flush(batch)
+            batch = []
+
+    if batch:
+        stats["inserted"] += _flush(batch)
+
+    # Imported history can land anywhere in a member's timeline, so rebuild
+    # streaks for the members touched rather than advancing them in order.
+    if seen_members:
+        streaks.recompute(member_ids=seen_members)
+
+    stats["duplicates"] = stats["read"] - stats["rejected"] - stats["inserted"]
+    return stats
@@ -0,0 +1,54 @@
+# attendance/management/commands/import_attendance.py
+
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from attendance.importer import CHUNK_SIZE, import_attendance
+
+
+class Command(BaseCommand):
+    help = "Import historical attendance from a CSV export (member, event, date[, status])"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to import, or - for stdin")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--rejects", help="Write rejected rows to this CSV file")
+
+    def handle(self, *args, **options):
+        source = sys.stdin if options["path"] == "-" else open(
+            options["path"], newline="", encoding="utf-8-sig"
+        )
+        rejects_file = open(options["rejects"], "w", newline="") if options["rejects"] else None
+        rejects_writer = csv.writer(rejects_file) if rejects_file else None
+        if rejects_writer:
+            rejects_writer.writerow(["line", "reason", "member", "event", "date", "status"])
+
+        def on_reject(line, reason, row):
+            if rejects_writer:
+                rejects_writer.writerow([
+                    line, reason, row.get("member"), row.get("event"), row.get("date"), row.get("status"),
+                ])
+            else:
+                self.stderr.write(f"line {line}: {reason}")
+
+        try:
+            stats = import_attendance(
+                source,
+                delimiter=options["delimiter"],
+                chunk_size=options["chunk_size"],
+                on_reject=on_reject,
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if rejects_file:
+                rejects_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {stats['read']} rows: {stats['inserted']} inserted, "
+            f"{stats['duplicates']} already recorded, {stats['rejected']} rejected."
+        ))
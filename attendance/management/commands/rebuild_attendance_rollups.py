@@ -0,0 +1,23 @@
+# attendance/management/commands/rebuild_attendance_rollups.py
+
+from django.core.management.base import BaseCommand
+from attendance import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the monthly attendance rollups from raw attendance rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event", type=int, action="append", dest="events",
+            help="Only rebuild the given event id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        if options["events"]:
+            monthly, totals = rollups.refresh_events(options["events"])
+        else:
+            monthly, totals = rollups.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {monthly} member/event/month rows and {totals} event/month rows."
+        ))
@@ -0,0 +1,22 @@
+# attendance/management/commands/recompute_attendance_streaks.py
+
+from django.core.management.base import BaseCommand
+from attendance import streaks
+
+
+class Command(BaseCommand):
+    help = "Rebuild attendance streaks and last-seen dates from raw attendance rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--member", type=int, action="append", dest="members",
+            help="Only recompute the given member id (repeatable).",
+        )
+        parser.add_argument(
+            "--block-size", type=int, default=2000,
+            help="Members processed per attendance matrix (default: 2000).",
+        )
+
+    def handle(self, *args, **options):
+        written = streaks.recompute(member_ids=options["members"], block_size=options["block_size"])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed attendance state for {written} members."))
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:12
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicate_attendance(apps, schema_editor):
+    """Keep only the most recent row per (member, event) before adding the constraint."""
+    Attendance = apps.get_model('attendance', 'Attendance')
+    keep = (
+        Attendance.objects.values('member_id', 'event_id')
+        .annotate(latest=Max('id'))
+        .values_list('latest', flat=True)
+    )
+    Attendance.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0001_initial'),
+        ('events', '0007_alter_event_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendance',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(drop_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('member', 'event'), name='unique_attendance_per_event'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_kiosk_checkin'),
+        ('events', '0007_alter_event_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventAttendanceTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_totals', to='events.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='attendance__month_2778a9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'month'), name='unique_event_attendance_total')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_attendance', to='events.event')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_attendance', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['member', 'month'], name='attendance__member__6241fe_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'event', 'month'), name='unique_monthly_attendance')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_event_headcount'),
+        ('events', '0007_alter_event_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberAttendanceState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_seen_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('current_streak', models.PositiveIntegerField(default=0)),
+                ('longest_streak', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='events.event')),
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_state', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Member attendance state',
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from events.models import Event  # Import Event model
 
 class Attendance(models.Model):
@@ -11,8 +12,99 @@ class Attendance(models.Model):
 
     member = models.ForeignKey(User, on_delete=models.CASCADE)
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='attendance_records')
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(default=timezone.now)  # kiosks send the scan time of offline check-ins
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Present')
 
+    class Meta:
+        constraints = [
+            # One row per member per event: lets check-ins be upserted in bulk
+            # and makes replayed kiosk batches harmless.
+            models.UniqueConstraint(fields=['member', 'event'], name='unique_attendance_per_event'),
+        ]
+
     def __str__(self):
         return f"{self.member.username} - {self.event.title} ({self.status})"
+
+
+# =====================================================
+# Attendance Rollups
+# =====================================================
+# Incrementally maintained counts so charts read a handful of rows per month
+# instead of every raw check-in. Kept in step by attendance/signals.py and
+# rebuildable with `manage.py rebuild_attendance_rollups`.
+class MonthlyAttendance(models.Model):
+    """Attendance rows per (member, event, month)."""
+    member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_attendance')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='monthly_attendance')
+    month = models.DateField()  # first day of the month
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['member', 'event', 'month'], name='unique_monthly_attendance'),
+        ]
+        indexes = [models.Index(fields=['member', 'month'])]
+
+    def __str__(self):
+        return f"{self.member_id} @ {self.event_id} ({self.month:%b %Y}): {self.count}"
+
+
+class EventAttendanceTotal(models.Model):
+    """Attendance rows per event, bucketed by month for the reports charts."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='attendance_totals')
+    month = models.DateField()  # first day of the month
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'month'], name='unique_event_attendance_total'),
+        ]
+        indexes = [models.Index(fields=['month'])]
+
+    def __str__(self):
+        return f"{self.event_id} ({self.month:%b %Y}): {self.count}"
+
+
+# =====================================================
+# Headcount Mode
+# =====================================================
+class EventHeadcount(models.Model):
+    """Category totals for services too large to record member by member."""
+    CATEGORIES = ('adults', 'children', 'visitors', 'online')
+
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name='headcount')
+    adults = models.PositiveIntegerField(default=0)
+    children = models.PositiveIntegerField(default=0)
+    visitors = models.PositiveIntegerField(default=0)
+    online = models.PositiveIntegerField(default=0, verbose_name='online viewers')
+    updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def total(self):
+        return self.adults + self.children + self.visitors + self.online
+
+    def __str__(self):
+        return f"{self.event.title}: {self.total} attendees"
+
+
+# =====================================================
+# Streaks & Last-Seen State
+# =====================================================
+class MemberAttendanceState(models.Model):
+    """
+    Per-member attendance summary, kept current on every check-in and
+    repaired nightly by `manage.py recompute_attendance_streaks`.
+    """
+    member = models.OneToOneField(User, on_delete=models.CASCADE, related_name='attendance_state')
+    last_seen_at = models.DateTimeField(null=True, blank=True, db_index=True)  # date of the last service attended
+    last_event = models.ForeignKey(Event, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    current_streak = models.PositiveIntegerField(default=0)  # consecutive services up to last_seen_at
+    longest_streak = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Member attendance state"
+
+    def __str__(self):
+        return f"{self.member.username}: streak {self.current_streak}"
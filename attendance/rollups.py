@@ -0,0 +1,86 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from koma.cache import bump_version
+
+from .models import Attendance, EventAttendanceTotal, MonthlyAttendance
+
+
+def month_of(value):
+    """First day of the (local) month a check-in falls in."""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def _bump(model, delta, **keys):
+    updated = model.objects.filter(**keys).update(count=F('count') + delta)
+    if updated or delta < 0:
+        # Never create rows on a decrement: during cascade deletes the
+        # parent event or member may already be on its way out.
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **keys)
+    except IntegrityError:
+        model.objects.filter(**keys).update(count=F('count') + delta)
+
+
+def bump_event_total(event_id, month, delta):
+    _bump(EventAttendanceTotal, delta, event_id=event_id, month=month)
+    bump_version('attendance')  # the reports read these totals
+
+
+def record(member_id, event_id, when, delta=1):
+    """Apply a single attendance row being added (delta=1) or removed (delta=-1)."""
+    month = month_of(when)
+    _bump(MonthlyAttendance, delta, member_id=member_id, event_id=event_id, month=month)
+    bump_event_total(event_id, month, delta)
+
+
+def _insert_grouped(model, attendance_qs, group_by):
+    """INSERT ... SELECT the grouped counts so rebuilds never round-trip rows through Python."""
+    select = (
+        attendance_qs.annotate(bucket=TruncDate(TruncMonth('date')))
+        .values(*group_by, 'bucket')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    sql, params = select.query.sql_with_params()
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(f).column)
+        for f in [*(g.replace('_id', '') for g in group_by), 'month', 'count']
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+def _rebuild(attendance_qs, monthly_qs, totals_qs):
+    with transaction.atomic():
+        monthly_qs.delete()
+        totals_qs.delete()
+        monthly = _insert_grouped(MonthlyAttendance, attendance_qs, ['member_id', 'event_id'])
+        totals = _insert_grouped(EventAttendanceTotal, attendance_qs, ['event_id'])
+    bump_version('attendance')
+    return monthly, totals
+
+
+def refresh_events(event_ids):
+    """Recompute rollups for a few events, e.g. after a bulk upsert skipped signals."""
+    event_ids = list(event_ids)
+    return _rebuild(
+        Attendance.objects.filter(event_id__in=event_ids),
+        MonthlyAttendance.objects.filter(event_id__in=event_ids),
+        EventAttendanceTotal.objects.filter(event_id__in=event_ids),
+    )
+
+
+def rebuild_all():
+    """Recompute every rollup row from raw attendance."""
+    return _rebuild(
+        Attendance.objects.all(),
+        MonthlyAttendance.objects.all(),
+        EventAttendanceTotal.objects.all(),
+    )
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from koma.cache import bump_version
+
+from . import rollups, streaks
+from .models import Attendance, EventHeadcount
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, created, raw=False, **kwargs):
+    # Status edits don't change how many rows a member has for the month.
+    if created and not raw:
+        rollups.record(instance.member_id, instance.event_id, instance.date, 1)
+    # Downgrades (e.g. Present -> Absent) are picked up by the nightly recompute.
+    if not raw and instance.status in streaks.SEEN_STATUSES:
+        streaks.record_event(instance.event, [instance.member_id])
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, **kwargs):
+    rollups.record(instance.member_id, instance.event_id, instance.date, -1)
+
+
+@receiver([post_save, post_delete], sender=EventHeadcount)
+def headcount_changed(sender, **kwargs):
+    bump_version("attendance")
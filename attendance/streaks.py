@@ -0,0 +1,176 @@
+from bisect import bisect_right
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from events.models import Event
+
+from .models import Attendance, MemberAttendanceState
+
+# Statuses that count as having been at a service
+SEEN_STATUSES = ('Present', 'Late')
+
+
+def lapsed_threshold():
+    """How many consecutive missed services make a member 'lapsed'."""
+    return getattr(settings, 'LAPSED_AFTER_MISSED_SERVICES', 3)
+
+
+def past_services():
+    return Event.objects.filter(date__lte=timezone.now())
+
+
+# ------------------------------
+# Incremental updates (on each check-in)
+# ------------------------------
+def record_event(event, member_ids):
+    """
+    Advance the streak state of members seen at ``event``.
+
+    Check-ins for a service older than a member's last one (back-filled
+    history) are left to the nightly recompute.
+    """
+    member_ids = set(member_ids)
+    if not member_ids:
+        return
+    with transaction.atomic():
+        states = {
+            s.member_id: s
+            for s in MemberAttendanceState.objects.select_for_update().filter(member_id__in=member_ids)
+        }
+        # Members sharing the same previous service share the answer to
+        # "was anything held in between?", so ask once per distinct date.
+        consecutive = {}
+        for last_seen in {s.last_seen_at for s in states.values() if s.last_seen_at}:
+            if last_seen < event.date:
+                consecutive[last_seen] = not past_services().filter(
+                    date__gt=last_seen, date__lt=event.date
+                ).exists()
+
+        created, changed = [], []
+        for member_id in member_ids:
+            state = states.get(member_id)
+            if state is None:
+                state = MemberAttendanceState(member_id=member_id)
+                created.append(state)
+            elif state.last_seen_at and state.last_seen_at >= event.date:
+                continue
+            else:
+                changed.append(state)
+            state.current_streak = state.current_streak + 1 if consecutive.get(state.last_seen_at) else 1
+            state.longest_streak = max(state.longest_streak, state.current_streak)
+            state.last_seen_at = event.date
+            state.last_event = event
+
+        MemberAttendanceState.objects.bulk_create(created)
+        MemberAttendanceState.objects.bulk_update(
+            changed, ['current_streak', 'longest_streak', 'last_seen_at', 'last_event']
+        )
+
+
+# ------------------------------
+# Lapsed members (indexed range lookup)
+# ------------------------------
+def lapsed_members(missed=None):
+    """
+    States of members who have missed at least ``missed`` services in a row.
+
+    Having missed N services means the last one attended is older than the
+    Nth most recent service, so this is a range scan on ``last_seen_at``.
+    """
+    missed = missed or lapsed_threshold()
+    cutoff = past_services().order_by('-date').values_list('date', flat=True)[missed - 1:missed].first()
+    if cutoff is None:
+        return MemberAttendanceState.objects.none()
+    return (
+        MemberAttendanceState.objects.filter(last_seen_at__lt=cutoff, member__is_active=True)
+        .select_related('member', 'last_event')
+        .order_by('last_seen_at')
+    )
+
+
+def missed_counter(window=104):
+    """Return a function giving how many of the last ``window`` services were held after a date."""
+    dates = sorted(past_services().order_by('-date').values_list('date', flat=True)[:window])
+
+    def missed_since(last_seen):
+        return len(dates) - bisect_right(dates, last_seen)
+
+    return missed_since
+
+
+# ------------------------------
+# Vectorised repair (nightly)
+# ------------------------------
+def recompute(member_ids=None, block_size=2000):
+    """
+    Rebuild streak state from raw attendance with NumPy.
+
+    Attendance is laid out as a member x service boolean matrix (processed
+    in blocks of ``block_size`` members to bound memory). The last attended
+    column, the run ending there and the longest run are then array ops.
+    Returns the number of state rows written.
+    """
+    import numpy as np
+
+    services = list(past_services().order_by('date', 'id').values_list('id', 'date'))
+    service_ids = np.array([s[0] for s in services], dtype=np.int64)
+    order = np.argsort(service_ids)
+    n = len(services)
+
+    all_members = np.fromiter(User.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    if member_ids is not None:
+        # Intersect in memory: an import can touch more ids than fit in one IN clause.
+        all_members = np.intersect1d(all_members, np.fromiter(member_ids, dtype=np.int64))
+
+    written = 0
+    for start in range(0, len(all_members), block_size):
+        block = all_members[start:start + block_size]
+        pairs = Attendance.objects.filter(
+            member_id__in=block.tolist(), status__in=SEEN_STATUSES, event__date__lte=timezone.now(),
+        ).values_list('member_id', 'event_id')
+        flat = np.fromiter((v for pair in pairs for v in pair), dtype=np.int64)
+        rows = np.searchsorted(block, flat[0::2])
+        cols = order[np.searchsorted(service_ids, flat[1::2], sorter=order)] if n else flat[1::2]
+
+        seen = np.zeros((len(block), n), dtype=bool)
+        seen[rows, cols] = True
+        attended = seen.any(axis=1)
+
+        # Index of the last attended service (only meaningful where attended)
+        last = n - 1 - np.argmax(seen[:, ::-1], axis=1) if n else np.zeros(len(block), dtype=np.int64)
+
+        # Length of the run of True ending at each column: the column index
+        # minus the index of the most recent False before it.
+        positions = np.arange(n, dtype=np.int32)
+        last_false = np.maximum.accumulate(np.where(seen, -1, positions), axis=1)
+        runs = positions - last_false
+        current = runs[np.arange(len(block)), last] if n else np.zeros(len(block), dtype=np.int64)
+        longest = runs.max(axis=1) if n else np.zeros(len(block), dtype=np.int64)
+
+        states = []
+        for i, member_id in enumerate(block.tolist()):
+            if attended[i]:
+                event_id, date = services[last[i]]
+                states.append(MemberAttendanceState(
+                    member_id=member_id, last_seen_at=date, last_event_id=event_id,
+                    current_streak=int(current[i]), longest_streak=int(longest[i]),
+                ))
+            else:
+                states.append(MemberAttendanceState(
+                    member_id=member_id, last_seen_at=None, last_event_id=None,
+                    current_streak=0, longest_streak=0,
+                ))
+
+        with transaction.atomic():
+            MemberAttendanceState.objects.bulk_create(
+                states,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['member'],
+                update_fields=['last_seen_at', 'last_event', 'current_streak', 'longest_streak', 'updated_at'],
+            )
+        written += len(states)
+    return written
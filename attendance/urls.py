@@ -15,4 +15,14 @@ urlpatterns = [
     # Admin/Staff Attendance Management
     path('event/<int:event_id>/manage/', views.manage_event_attendance, name='manage_event_attendance'),
     path('event/<int:event_id>/save/', views.save_attendance, name='save_attendance'),  # ✅ Added to handle POST save
+    path('lapsed/', views.lapsed_members, name='lapsed_members'),
+
+    # Headcount Mode (category totals for large services)
+    path('event/<int:event_id>/headcount/', views.headcount, name='headcount'),
+    path('event/<int:event_id>/headcount/adjust/', views.headcount_adjust, name='headcount_adjust'),
+
+    # Kiosk Mode (offline-capable check-in)
+    path('kiosk/roster/', views.kiosk_roster, name='kiosk_roster'),
+    path('kiosk/<int:event_id>/', views.kiosk, name='kiosk'),
+    path('kiosk/<int:event_id>/checkin/', views.kiosk_checkin, name='kiosk_checkin'),
 ]
@@ -1,10 +1,22 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from .models import Attendance
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET, require_POST
+from .models import Attendance, EventHeadcount, MonthlyAttendance
+from . import rollups, streaks
 from events.models import Event
+from accounts import roster
+from accounts.widgets import MemberAutocomplete
+from koma.cache import bump_version
 from calendar import month_name
-from django.db.models import Count
+from django.db.models import Sum
 from datetime import datetime
 # ------------------------------
 # Helper function
@@ -26,12 +38,12 @@ def attendance_records(request):
         records = records.filter(event__id=event_filter)
 
     events = Event.objects.all()
-    members = User.objects.all()
 
     context = {
         'records': records,
         'events': events,
-        'members': members,
+        # Attendance rows point at the User, so the picker submits user ids
+        'member_picker': MemberAutocomplete(value_field='user', required=True).render('member', None),
     }
     return render(request, 'attendance/attendance_records.html', context)
 
@@ -45,18 +57,20 @@ def mark_attendance(request):
         member_id = request.POST.get('member')
         event_id = request.POST.get('event')
         status = request.POST.get('status')
-        remarks = request.POST.get('remarks')
 
+        # Attendance has no remarks column, so only the status is stored
         Attendance.objects.update_or_create(
             member_id=member_id,
             event_id=event_id,
-            defaults={'status': status, 'remarks': remarks}
+            defaults={'status': status}
         )
         return redirect('attendance:attendance_records')
 
     events = Event.objects.all()
-    members = User.objects.all()
-    return render(request, 'attendance/mark_attendance.html', {'events': events, 'members': members})
+    return render(request, 'attendance/mark_attendance.html', {
+        'events': events,
+        'member_picker': MemberAutocomplete(value_field='user', required=True).render('member', None),
+    })
 
 
 # ------------------------------
@@ -82,11 +96,16 @@ def my_attendance(request):
     years = [y.year for y in years]
     months = {i: month_name[i] for i in range(1, 13)}
 
-    # Chart data
+    # Chart data (read from the monthly rollup, not the raw rows)
+    buckets = MonthlyAttendance.objects.filter(member=request.user)
+    if year:
+        buckets = buckets.filter(month__year=year)
+    if month:
+        buckets = buckets.filter(month__month=month)
     chart_data_qs = (
-        records.values_list('date__month')
-        .annotate(count=Count('id'))
-        .order_by('date__month')
+        buckets.values_list('month__month')
+        .annotate(count=Sum('count'))
+        .order_by('month__month')
     )
     chart_labels = [month_name[m[0]] for m in chart_data_qs]
     chart_data = [m[1] for m in chart_data_qs]
@@ -95,7 +114,7 @@ def my_attendance(request):
         'records': records,
         'years': years,
         'months': months,
-        'total_attendances': records.count(),
+        'total_attendances': sum(chart_data),
         'chart_labels': chart_labels,
         'chart_data': chart_data,
     }
@@ -108,24 +127,29 @@ def my_attendance(request):
 @user_passes_test(is_admin)
 def manage_event_attendance(request, event_id):
     event = get_object_or_404(Event, id=event_id)
-    members = User.objects.all()
 
     if request.method == 'POST':
-        for member in members:
-            status = request.POST.get(f'status_{member.id}')
-            if status:
+        # Only the members on the form are posted; look them up in one query
+        submitted = {
+            int(key.split('_', 1)[1]): value
+            for key, value in request.POST.items()
+            if key.startswith('status_') and key.split('_', 1)[1].isdigit()
+        }
+        members = User.objects.in_bulk(list(submitted))
+        for member_id, status in submitted.items():
+            if member_id in members and status:
                 Attendance.objects.update_or_create(
-                    member=member,
+                    member=members[member_id],
                     event=event,
                     defaults={'status': status}
                 )
         return redirect('attendance:attendance_records')
 
-    attendance_records = Attendance.objects.filter(event=event)
+    attendance_records = Attendance.objects.filter(event=event).select_related('member').order_by('member__username')
     return render(request, 'attendance/manage_event_attendance.html', {
         'event': event,
-        'members': members,
-        'attendance_records': attendance_records
+        'attendance_records': attendance_records,
+        'member_picker': MemberAutocomplete(value_field='user').render('new_member', None),
     })
 
 
@@ -151,3 +175,176 @@ from django.shortcuts import render
 
 def records(request):
     return render(request, 'attendance/records.html')
+
+
+# ------------------------------
+# Kiosk Mode: Roster Snapshot + Batched Check-ins
+# ------------------------------
+KIOSK_BATCH_LIMIT = 500
+VALID_STATUSES = {choice for choice, _ in Attendance.STATUS_CHOICES}
+
+
+def _is_member_id(value):
+    # JSON true/false would pass isinstance(..., int) and pick user 1 or 0
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def build_kiosk_roster():
+    """Compact member list for kiosks: [user id, display name, phone suffix]."""
+    rows = (
+        User.objects.filter(is_active=True)
+        .order_by('first_name', 'last_name', 'username')
+        .values_list('id', 'first_name', 'last_name', 'username', 'member__phone')
+    )
+    return roster.compact(rows)
+
+
+@user_passes_test(is_admin)
+@require_GET
+def kiosk_roster(request):
+    """Serve the roster once per service; kiosks revalidate with If-None-Match."""
+    return roster.roster_response(request, 'kiosk-roster', build_kiosk_roster)
+
+
+@user_passes_test(is_admin)
+@require_POST
+def kiosk_checkin(request, event_id):
+    """
+    Upsert a batch of offline-queued check-ins for one event.
+
+    Body: {"checkins": [{"member": <user id>, "status": "Present",
+    "checked_in_at": "<ISO 8601>"}, ...]}. Replaying a batch is harmless:
+    rows are keyed on (member, event) and only the status is refreshed.
+    """
+    event = get_object_or_404(Event, id=event_id)
+    try:
+        checkins = json.loads(request.body).get('checkins', [])
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(checkins, list):
+        return JsonResponse({'error': '"checkins" must be a list'}, status=400)
+    if len(checkins) > KIOSK_BATCH_LIMIT:
+        return JsonResponse({'error': f'At most {KIOSK_BATCH_LIMIT} check-ins per batch'}, status=413)
+
+    # Type-check before hashing: a list or object from the client would
+    # otherwise raise TypeError for the whole batch.
+    requested_ids = {
+        c.get('member') for c in checkins if isinstance(c, dict) and _is_member_id(c.get('member'))
+    }
+    known_ids = set(User.objects.filter(id__in=requested_ids).values_list('id', flat=True))
+
+    rows, rejected = {}, []
+    for item in checkins:
+        member_id = item.get('member') if isinstance(item, dict) else None
+        status = item.get('status', 'Present') if isinstance(item, dict) else None
+        if not _is_member_id(member_id) or member_id not in known_ids:
+            rejected.append({'member': member_id, 'error': 'Unknown member'})
+            continue
+        if not isinstance(status, str) or status not in VALID_STATUSES:
+            rejected.append({'member': member_id, 'error': 'Invalid status'})
+            continue
+        try:
+            checked_in_at = parse_datetime(item.get('checked_in_at') or '') or timezone.now()
+        except (TypeError, ValueError):
+            rejected.append({'member': member_id, 'error': 'Invalid check-in time'})
+            continue
+        if timezone.is_naive(checked_in_at):
+            checked_in_at = timezone.make_aware(checked_in_at)
+        # Later entries for the same member win, matching queue order.
+        rows[member_id] = Attendance(
+            member_id=member_id, event=event, status=status, date=checked_in_at
+        )
+
+    with transaction.atomic():
+        Attendance.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['member', 'event'],
+            update_fields=['status'],
+        )
+        # bulk_create skips signals, so bring this event's rollups up to date.
+        rollups.refresh_events([event.id])
+        streaks.record_event(
+            event, [r.member_id for r in rows.values() if r.status in streaks.SEEN_STATUSES]
+        )
+
+    return JsonResponse({'accepted': len(rows), 'rejected': rejected})
+
+
+@user_passes_test(is_admin)
+def kiosk(request, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    return render(request, 'attendance/kiosk.html', {'event': event})
+
+
+# ------------------------------
+# Headcount Mode (totals by category, one row per event)
+# ------------------------------
+@user_passes_test(is_admin)
+def headcount(request, event_id):
+    """Record category totals for a large service in a single write."""
+    event = get_object_or_404(Event, id=event_id)
+    count, _ = EventHeadcount.objects.get_or_create(event=event)
+
+    if request.method == 'POST':
+        for category in EventHeadcount.CATEGORIES:
+            value = request.POST.get(category, '')
+            if value.isdigit():
+                setattr(count, category, int(value))
+        count.updated_by = request.user
+        count.save()
+        return redirect('attendance:headcount', event_id=event.id)
+
+    return render(request, 'attendance/headcount.html', {
+        'event': event,
+        'headcount': count,
+        'categories': [(c, getattr(count, c)) for c in EventHeadcount.CATEGORIES],
+    })
+
+
+@user_passes_test(is_admin)
+@require_POST
+def headcount_adjust(request, event_id):
+    """Apply a +/- tally from an usher; F() keeps concurrent clickers from overwriting each other."""
+    event = get_object_or_404(Event, id=event_id)
+    try:
+        data = json.loads(request.body)
+        category, delta = data['category'], int(data['delta'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"category": ..., "delta": <int>}'}, status=400)
+    if category not in EventHeadcount.CATEGORIES:
+        return JsonResponse({'error': 'Unknown category'}, status=400)
+
+    EventHeadcount.objects.get_or_create(event=event)
+    EventHeadcount.objects.filter(event=event).update(
+        # Clamp at zero without ever computing a negative unsigned value
+        **{category: Case(When(**{f'{category}__gte': -delta}, then=F(category) + delta), default=Value(0))},
+        updated_by=request.user,
+        updated_at=timezone.now(),
+    )
+    bump_version('attendance')  # queryset update skips the signal
+    count = EventHeadcount.objects.get(event=event)
+
+    return JsonResponse({c: getattr(count, c) for c in EventHeadcount.CATEGORIES} | {'total': count.total})
+
+
+# ------------------------------
+# View: Lapsed Members (Admin)
+# ------------------------------
+@user_passes_test(is_admin)
+def lapsed_members(request):
+    try:
+        missed = max(1, int(request.GET.get('missed') or streaks.lapsed_threshold()))
+    except ValueError:
+        missed = streaks.lapsed_threshold()
+
+    states = list(streaks.lapsed_members(missed)[:500])
+    missed_since = streaks.missed_counter()
+    for state in states:
+        state.missed = missed_since(state.last_seen_at)
+
+    context = {
+        'states': states,
+        'missed': missed,
+    }
+    return render(request, 'attendance/lapsed_members.html', context)
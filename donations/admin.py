@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Donation, Expense
+from .models import (
+    Campaign, Donation, Expense, GivingStatement, OfferingBatch, Pledge, RecurringGift, RecurringGiftRun,
+)
 
 @admin.register(Donation)
 class DonationAdmin(admin.ModelAdmin):
@@ -18,3 +20,53 @@ class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('title', 'amount', 'category', 'date_recorded', 'added_by')
     list_filter = ('category',)
     search_fields = ('title', 'description')
+
+
+@admin.register(GivingStatement)
+class GivingStatementAdmin(admin.ModelAdmin):
+    list_display = ('member', 'year', 'total', 'gift_count', 'generated_at', 'emailed_at', 'error')
+    list_filter = ('year',)
+    search_fields = ('member__user__username', 'member__user__last_name')
+    raw_id_fields = ('member',)
+
+
+@admin.register(OfferingBatch)
+class OfferingBatchAdmin(admin.ModelAdmin):
+    list_display = ('service_date', 'label', 'line_count', 'total', 'declared_total', 'counted_by', 'created_at')
+    list_filter = ('service_date',)
+    readonly_fields = ('total', 'line_count', 'reference', 'created_at')
+
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category', 'goal', 'raised', 'pledged', 'pledge_count', 'starts_on', 'ends_on', 'is_active')
+    list_filter = ('is_active', 'category')
+    prepopulated_fields = {'slug': ('name',)}
+    # Maintained from donations and pledges (see donations.campaigns)
+    readonly_fields = ('raised', 'gift_count', 'pledged', 'pledge_count', 'created_at')
+
+
+@admin.register(Pledge)
+class PledgeAdmin(admin.ModelAdmin):
+    list_display = ('member', 'campaign', 'amount', 'fulfilled', 'created_at')
+    list_filter = ('campaign',)
+    search_fields = ('member__user__username', 'member__user__last_name')
+    raw_id_fields = ('member',)
+    readonly_fields = ('fulfilled', 'created_at')
+
+
+class RecurringGiftRunInline(admin.TabularInline):
+    model = RecurringGiftRun
+    extra = 0
+    fields = ('period', 'status', 'attempts', 'retry_at', 'donation', 'error')
+    readonly_fields = fields
+    raw_id_fields = ('donation',)
+
+
+@admin.register(RecurringGift)
+class RecurringGiftAdmin(admin.ModelAdmin):
+    list_display = ('member', 'amount', 'category', 'frequency', 'next_run_on', 'is_active', 'failures')
+    list_filter = ('is_active', 'frequency', 'category')
+    search_fields = ('member__user__username', 'member__user__last_name', 'phone_number')
+    raw_id_fields = ('member',)
+    inlines = [RecurringGiftRunInline]
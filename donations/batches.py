@@ -0,0 +1,148 @@
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from accounts.models import Member
+from koma.cache import bump_version
+
+from . import campaigns, contributions, ledger
+from .models import Donation, OfferingBatch
+
+BATCH_LIMIT = 1000
+BATCH_METHODS = {'cash', 'bank', 'mpesa'}  # what turns up in the offering bags
+CATEGORIES = {choice for choice, _ in Donation.CATEGORY_CHOICES}
+
+
+class BatchError(ValueError):
+    """The batch was rejected; ``errors`` lists problems with individual lines."""
+
+    def __init__(self, message, errors=None, **details):
+        super().__init__(message)
+        self.errors = errors or []
+        self.details = details
+
+
+def _amount(value):
+    try:
+        amount = Decimal(str(value))
+        if not amount.is_finite():
+            return None  # NaN and Infinity can't be quantized or compared
+        amount = amount.quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return amount if amount > 0 else None
+
+
+def _member_id(value):
+    # Anything else from the JSON body (lists, objects, true/false) is not
+    # a member id, and may not even be hashable.
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def _parse_lines(lines, default_category):
+    """
+    Validate every line in one pass, resolving members with a single in_bulk.
+
+    Returns a list of (member id, amount, category, method, reference); raises
+    BatchError listing every bad line so the team can fix them all at once.
+    """
+    member_ids = {_member_id(line.get('member')) for line in lines if isinstance(line, dict)}
+    members = Member.objects.in_bulk([i for i in member_ids if i is not None])
+
+    parsed, errors = [], []
+    for number, line in enumerate(lines, start=1):
+        if not isinstance(line, dict):
+            errors.append({'line': number, 'error': 'Expected an object'})
+            continue
+        amount = _amount(line.get('amount'))
+        category = line.get('category') or default_category
+        method = line.get('payment_method') or 'cash'
+        if _member_id(line.get('member')) not in members:
+            errors.append({'line': number, 'error': 'Unknown member'})
+        elif amount is None:
+            errors.append({'line': number, 'error': 'Amount must be a positive number'})
+        elif not isinstance(category, str) or category not in CATEGORIES:
+            errors.append({'line': number, 'error': 'Unknown category'})
+        elif not isinstance(method, str) or method not in BATCH_METHODS:
+            errors.append({'line': number, 'error': 'Unsupported payment method'})
+        else:
+            reference = str(line.get('reference') or '')[:100] or None
+            parsed.append((line['member'], amount, category, method, reference))
+    if errors:
+        raise BatchError(f'{len(errors)} of {len(lines)} lines are invalid', errors)
+    return parsed
+
+
+def post_batch(data, counted_by=None):
+    """
+    Validate and record a counted offering batch in one transaction.
+
+    ``data`` is the decoded API body: ``service_date``, ``declared_total``,
+    optional ``label``, ``category`` (default for lines) and ``reference``,
+    and ``lines`` of ``{"member", "amount", "category", "payment_method",
+    "reference"}``. Nothing is written unless every line is valid and the
+    lines add up to the declared total. Returns ``(batch, created)``; a
+    batch resubmitted with the same reference returns the original.
+    """
+    lines = data.get('lines')
+    if not isinstance(lines, list) or not lines:
+        raise BatchError('"lines" must be a non-empty list')
+    if len(lines) > BATCH_LIMIT:
+        raise BatchError(f'At most {BATCH_LIMIT} lines per batch')
+    service_date = parse_date(str(data.get('service_date') or '')) or timezone.localdate()
+    declared = _amount(data.get('declared_total'))
+    if declared is None:
+        raise BatchError('"declared_total" must be a positive amount')
+
+    reference = str(data.get('reference') or '')[:64] or None
+    if reference:
+        existing = OfferingBatch.objects.filter(reference=reference).first()
+        if existing:
+            return existing, False
+
+    parsed = _parse_lines(lines, data.get('category') or 'offering')
+    counted = sum(amount for _, amount, *_ in parsed)
+    if counted != declared:
+        raise BatchError(
+            f'Lines add up to {counted} but {declared} was declared',
+            counted=str(counted), declared=str(declared),
+        )
+
+    # Midday keeps every line on the service date whatever the UTC offset.
+    donated_at = timezone.make_aware(datetime.combine(service_date, time(12)))
+    try:
+        with transaction.atomic():
+            batch = OfferingBatch.objects.create(
+                service_date=service_date,
+                label=str(data.get('label') or '')[:100],
+                declared_total=declared,
+                total=counted,
+                line_count=len(parsed),
+                reference=reference,
+                counted_by=counted_by,
+            )
+            donations = [
+                Donation(
+                    member_id=member_id, amount=amount, category=category, payment_method=method,
+                    transaction_id=line_reference, date_donated=donated_at, status='completed', batch=batch,
+                )
+                for member_id, amount, category, method, line_reference in parsed
+            ]
+            campaigns.attribute(donations)
+            donations = Donation.objects.bulk_create(donations, batch_size=500)
+            # bulk_create skips the signals, so roll the batch into the
+            # ledger, member and campaign totals here, grouped per row touched.
+            ledger.apply_many(ledger.entry(d) for d in donations)
+            contributions.apply_many(contributions.line(d) for d in donations)
+            campaigns.apply_many(campaigns.line(d) for d in donations)
+    except IntegrityError:
+        # Another submission with the same reference won the race.
+        existing = OfferingBatch.objects.filter(reference=reference).first() if reference else None
+        if existing is None:
+            raise
+        return existing, False
+    bump_version('donations')
+    return batch, True
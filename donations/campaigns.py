@@ -0,0 +1,265 @@
+"""
+Campaign progress, maintained as donations and pledges are written.
+
+Each Campaign row carries its own running totals (raised, gifts, pledged,
+pledgers) and each Pledge its ``fulfilled`` amount, moved with F()
+updates from the donation signals and the bulk paths, the same way
+donations.ledger maintains the finance rollups. Reading progress is one
+primary-key lookup, cached under the ``campaigns`` data version and pushed
+to thermometer websockets once the write commits.
+"""
+import json
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from koma.cache import bump_version, payload_timeout, versioned_key
+
+from .models import Campaign, Donation, Pledge
+
+logger = logging.getLogger(__name__)
+
+COUNTED_STATUS = 'completed'
+
+
+def group_name(slug):
+    return f"campaign_{slug}"
+
+
+# ------------------------------
+# Attribution
+# ------------------------------
+def _day_of(when):
+    return timezone.localtime(when).date() if timezone.is_aware(when) else when.date()
+
+
+def running_for(category, when):
+    """Id of the active campaign collecting ``category`` donations on that date, or None."""
+    day = _day_of(when or timezone.now())
+    return (
+        Campaign.objects.filter(is_active=True, category=category, starts_on__lte=day)
+        .filter(Q(ends_on__isnull=True) | Q(ends_on__gte=day))
+        .order_by('-starts_on')
+        .values_list('pk', flat=True)
+        .first()
+    )
+
+
+def attribute(donations):
+    """Set ``campaign`` on unsaved donations that fall in a running campaign's category."""
+    found = {}
+    for donation in donations:
+        if donation.campaign_id is not None:
+            continue
+        key = (donation.category, _day_of(donation.date_donated or timezone.now()))
+        if key not in found:
+            found[key] = running_for(donation.category, donation.date_donated)
+        donation.campaign_id = found[key]
+
+
+# ------------------------------
+# Incremental totals
+# ------------------------------
+def line(donation):
+    """
+    What a Donation adds to its campaign, or None.
+
+    Returned as ``(campaign id, member id, amount)``; only completed
+    donations attributed to a campaign count.
+    """
+    if donation is None or donation.campaign_id is None or donation.status != COUNTED_STATUS:
+        return None
+    return donation.campaign_id, donation.member_id, Decimal(donation.amount)
+
+
+def _publish_on_commit(campaign_ids):
+    def publish():
+        bump_version('campaigns')
+        for campaign_id in campaign_ids:
+            broadcast(campaign_id)
+
+    transaction.on_commit(publish)
+
+
+def apply_many(lines, sign=1):
+    """Add (or remove) donations with one update per campaign and per pledge touched."""
+    raised = defaultdict(lambda: [Decimal(0), 0])
+    given = defaultdict(Decimal)
+    for entry in lines:
+        if entry is None:
+            continue
+        campaign_id, member_id, amount = entry
+        raised[campaign_id][0] += amount
+        raised[campaign_id][1] += 1
+        given[(campaign_id, member_id)] += amount
+    if not raised:
+        return
+    for campaign_id, (amount, count) in raised.items():
+        Campaign.objects.filter(pk=campaign_id).update(
+            raised=F('raised') + sign * amount, gift_count=F('gift_count') + sign * count,
+        )
+    for (campaign_id, member_id), amount in given.items():
+        Pledge.objects.filter(campaign_id=campaign_id, member_id=member_id).update(
+            fulfilled=F('fulfilled') + sign * amount,
+        )
+    _publish_on_commit(sorted(raised))
+
+
+def apply(entry, sign=1):
+    """Add (sign=1) or remove (sign=-1) one donation from its campaign and pledge."""
+    apply_many([entry], sign)
+
+
+def move(before, after):
+    """Replace the campaign line ``before`` with ``after`` (either may be None)."""
+    if before == after:
+        return
+    apply(before, -1)
+    apply(after, 1)
+
+
+def _given(campaign_id, member_id):
+    return Donation.objects.filter(
+        campaign_id=campaign_id, member_id=member_id, status=COUNTED_STATUS,
+    ).aggregate(total=Sum('amount', default=Decimal(0)))['total']
+
+
+def pledge_added(pledge):
+    """Count a new pledge towards its campaign, crediting what the member already gave."""
+    given = _given(pledge.campaign_id, pledge.member_id)
+    if given:
+        Pledge.objects.filter(pk=pledge.pk).update(fulfilled=given)
+        pledge.fulfilled = given
+    Campaign.objects.filter(pk=pledge.campaign_id).update(
+        pledged=F('pledged') + pledge.amount, pledge_count=F('pledge_count') + 1,
+    )
+    _publish_on_commit([pledge.campaign_id])
+
+
+def pledge_changed(before, pledge):
+    """Move a pledge's amount, including to another campaign."""
+    if before == (pledge.campaign_id, pledge.member_id, pledge.amount):
+        return
+    pledge_removed(*before)
+    pledge_added(pledge)
+
+
+def pledge_removed(campaign_id, member_id, amount):
+    Campaign.objects.filter(pk=campaign_id).update(
+        pledged=F('pledged') - amount, pledge_count=F('pledge_count') - 1,
+    )
+    _publish_on_commit([campaign_id])
+
+
+# ------------------------------
+# Progress (thermometer)
+# ------------------------------
+def build_progress(campaign):
+    return {
+        'campaign': campaign.pk,
+        'slug': campaign.slug,
+        'name': campaign.name,
+        'goal': str(campaign.goal),
+        'raised': str(campaign.raised),
+        'pledged': str(campaign.pledged),
+        'gifts': campaign.gift_count,
+        'pledgers': campaign.pledge_count,
+        'percent': float(campaign.percent),
+        'ends_on': campaign.ends_on.isoformat() if campaign.ends_on else None,
+    }
+
+
+def progress(slug):
+    """``(cache key, payload JSON)`` for a campaign's thermometer, or None if it doesn't exist."""
+    key = versioned_key(('campaigns',), 'progress', slug)
+    payload = cache.get(key)
+    if payload is None:
+        campaign = Campaign.objects.filter(slug=slug).first()
+        if campaign is None:
+            return None
+        payload = json.dumps(build_progress(campaign))
+        cache.set(key, payload, payload_timeout())
+    return key, payload
+
+
+def broadcast(campaign_id):
+    """Push a campaign's current progress to its open thermometers."""
+    slug = Campaign.objects.filter(pk=campaign_id).values_list('slug', flat=True).first()
+    found = slug and progress(slug)
+    if not found:
+        return
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            group_name(slug), {'type': 'campaign.progress', 'payload': found[1]},
+        )
+    except Exception:
+        # The totals are saved; thermometers still catch up on their next poll.
+        logger.exception("Could not broadcast progress for campaign %s", campaign_id)
+
+
+# ------------------------------
+# Verify & repair
+# ------------------------------
+def _expected():
+    counted = Q(donations__status=COUNTED_STATUS)
+    campaigns = {
+        row['pk']: (row['raised'], row['gifts'])
+        for row in Campaign.objects.values('pk').annotate(
+            raised=Sum('donations__amount', filter=counted, default=Decimal(0)),
+            gifts=Count('donations', filter=counted),
+        )
+    }
+    pledges = {
+        row['campaign_id']: (row['pledged'], row['pledgers'])
+        for row in Pledge.objects.values('campaign_id').annotate(
+            pledged=Sum('amount'), pledgers=Count('pk'),
+        ).order_by()
+    }
+    given = {
+        (row['campaign_id'], row['member_id']): row['total']
+        for row in Donation.objects.filter(campaign__isnull=False, status=COUNTED_STATUS)
+        .values('campaign_id', 'member_id').annotate(total=Sum('amount')).order_by()
+    }
+    return campaigns, pledges, given
+
+
+def verify():
+    """List (what, id, stored, expected) for every campaign or pledge whose totals drifted."""
+    campaigns, pledges, given = _expected()
+    mismatches = []
+    for campaign in Campaign.objects.all():
+        stored = (campaign.raised, campaign.gift_count, campaign.pledged, campaign.pledge_count)
+        want = campaigns[campaign.pk] + pledges.get(campaign.pk, (Decimal(0), 0))
+        if stored != want:
+            mismatches.append(('campaign', campaign.pk, stored, want))
+    for pk, campaign_id, member_id, fulfilled in Pledge.objects.values_list(
+        'pk', 'campaign_id', 'member_id', 'fulfilled',
+    ).iterator(chunk_size=2000):
+        want = given.get((campaign_id, member_id), Decimal(0))
+        if fulfilled != want:
+            mismatches.append(('pledge', pk, fulfilled, want))
+    return mismatches
+
+
+def repair():
+    """Recompute every campaign's and pledge's totals from the donations. Returns the count fixed."""
+    with transaction.atomic():
+        campaign_list = list(Campaign.objects.select_for_update())
+        pledge_list = list(Pledge.objects.select_for_update())
+        campaigns, pledges, given = _expected()
+        for campaign in campaign_list:
+            campaign.raised, campaign.gift_count = campaigns[campaign.pk]
+            campaign.pledged, campaign.pledge_count = pledges.get(campaign.pk, (Decimal(0), 0))
+        for pledge in pledge_list:
+            pledge.fulfilled = given.get((pledge.campaign_id, pledge.member_id), Decimal(0))
+        Campaign.objects.bulk_update(campaign_list, ['raised', 'gift_count', 'pledged', 'pledge_count'])
+        Pledge.objects.bulk_update(pledge_list, ['fulfilled'], batch_size=500)
+        _publish_on_commit([campaign.pk for campaign in campaign_list])
+    return len(campaign_list) + len(pledge_list)
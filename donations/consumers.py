@@ -0,0 +1,28 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from . import campaigns
+
+
+class CampaignProgressConsumer(AsyncWebsocketConsumer):
+    """Public thermometer feed: the current progress on connect, then every change."""
+
+    async def connect(self):
+        slug = self.scope["url_route"]["kwargs"]["slug"]
+        found = await database_sync_to_async(campaigns.progress)(slug)
+        if found is None:
+            await self.close()
+            return
+        _, payload = found
+        self.group_name = campaigns.group_name(slug)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send(text_data=payload)
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def campaign_progress(self, event):
+        await self.send(text_data=event["payload"])
+
@@ -0,0 +1,149 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from accounts.models import Member
+
+from .models import Donation
+
+COUNTED_STATUS = 'completed'
+
+
+def line(donation):
+    """
+    What a Donation adds to its member's running totals, or None.
+
+    Returned as ``(member id, date donated, amount)``; only completed
+    donations count towards a member's giving.
+    """
+    if donation is None or donation.status != COUNTED_STATUS or donation.date_donated is None:
+        return None
+    return donation.member_id, donation.date_donated, Decimal(donation.amount)
+
+
+def _year_of(when):
+    return timezone.localtime(when).year if timezone.is_aware(when) else when.year
+
+
+def apply(contribution, sign=1):
+    """Add (sign=1) or remove (sign=-1) one donation from the member's columns."""
+    if contribution is None:
+        return
+    member_id, when, amount = contribution
+    amount = sign * amount
+    year = _year_of(when)
+    updates = {'total_contributions': F('total_contributions') + amount}
+    if year == timezone.localdate().year:
+        updates['ytd_contributions'] = Case(
+            When(ytd_year=year, then=F('ytd_contributions') + amount),
+            # First gift of the year: last year's figure is replaced, not added to
+            default=Value(max(amount, Decimal(0))),
+        )
+        updates['ytd_year'] = Value(year)
+    if sign > 0:
+        moment = Value(when, output_field=DateTimeField())
+        updates['last_gift_date'] = Greatest(Coalesce('last_gift_date', moment), moment)
+    Member.objects.filter(pk=member_id).update(**updates)
+
+    if sign < 0:
+        # Only look the latest gift up again if this one may have been it
+        latest = (
+            Donation.objects.filter(member=OuterRef('pk'), status=COUNTED_STATUS)
+            .order_by('-date_donated')
+            .values('date_donated')[:1]
+        )
+        Member.objects.filter(pk=member_id, last_gift_date__lte=when).update(last_gift_date=Subquery(latest))
+
+
+def apply_many(entries, sign=1):
+    """Apply many donations with one update per member and year touched."""
+    grouped = {}
+    for contribution in entries:
+        if contribution is None:
+            continue
+        member_id, when, amount = contribution
+        key = (member_id, _year_of(when))
+        if key in grouped:
+            latest, total = grouped[key]
+            grouped[key] = (max(latest, when), total + amount)
+        else:
+            grouped[key] = (when, amount)
+    for (member_id, _), (latest, total) in grouped.items():
+        apply((member_id, latest, total), sign)
+
+
+def move(before, after):
+    """Replace the contribution ``before`` with ``after`` (either may be None)."""
+    if before == after:
+        return
+    apply(before, -1)
+    apply(after, 1)
+
+
+# ------------------------------
+# Verify & repair
+# ------------------------------
+def _expected(member_ids=None):
+    """{member id: (total, ytd, last gift)} recomputed from completed donations."""
+    year = timezone.localdate().year
+    start = timezone.make_aware(datetime(year, 1, 1))
+    end = timezone.make_aware(datetime(year + 1, 1, 1))
+    donations = Donation.objects.filter(status=COUNTED_STATUS)
+    if member_ids is not None:
+        donations = donations.filter(member_id__in=member_ids)
+    grouped = (
+        donations.values('member_id')
+        .annotate(
+            total=Sum('amount'),
+            ytd=Sum('amount', filter=Q(date_donated__gte=start, date_donated__lt=end), default=0),
+            last=Max('date_donated'),
+        )
+        .order_by()
+    )
+    return {row['member_id']: (row['total'], row['ytd'], row['last']) for row in grouped}
+
+
+def verify():
+    """List (member id, stored, expected) for every member whose columns have drifted."""
+    year = timezone.localdate().year
+    expected = _expected()
+    empty = (Decimal(0), Decimal(0), None)
+    mismatches = []
+    stored_rows = Member.objects.values_list(
+        'id', 'total_contributions', 'ytd_contributions', 'ytd_year', 'last_gift_date'
+    ).iterator(chunk_size=2000)
+    for member_id, total, ytd, ytd_year, last in stored_rows:
+        stored = (total, ytd if ytd_year == year else Decimal(0), last)
+        want = expected.get(member_id, empty)
+        if stored != want:
+            mismatches.append((member_id, stored, want))
+    return mismatches
+
+
+def repair(member_ids, batch_size=500):
+    """Recompute the columns of ``member_ids`` from their donations. Returns the count fixed."""
+    year = timezone.localdate().year
+    empty = (Decimal(0), Decimal(0), None)
+    member_ids = list(member_ids)
+    fixed = 0
+    for i in range(0, len(member_ids), batch_size):
+        chunk = member_ids[i:i + batch_size]
+        with transaction.atomic():
+            # Lock first so a donation saved meanwhile waits for us rather
+            # than having its F() update overwritten.
+            members = list(Member.objects.select_for_update().filter(pk__in=chunk))
+            expected = _expected(chunk)
+            for member in members:
+                member.total_contributions, member.ytd_contributions, member.last_gift_date = (
+                    expected.get(member.pk, empty)
+                )
+                member.ytd_year = year
+            Member.objects.bulk_update(
+                members, ['total_contributions', 'ytd_contributions', 'ytd_year', 'last_gift_date']
+            )
+        fixed += len(members)
+    return fixed
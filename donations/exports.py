@@ -0,0 +1,109 @@
+import csv
+import tempfile
+from datetime import datetime
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+# (header, values_list field) pairs, in column order
+DONATION_COLUMNS = [
+    ('ID', 'id'),
+    ('Date', 'date_donated'),
+    ('Username', 'member__user__username'),
+    ('First Name', 'member__user__first_name'),
+    ('Last Name', 'member__user__last_name'),
+    ('Category', 'category'),
+    ('Payment Method', 'payment_method'),
+    ('Status', 'status'),
+    ('Amount', 'amount'),
+    ('Transaction ID', 'transaction_id'),
+    ('Phone Number', 'phone_number'),
+    ('Statement Ref', 'statement_ref'),
+]
+
+EXPENSE_COLUMNS = [
+    ('ID', 'id'),
+    ('Date', 'date_recorded'),
+    ('Title', 'title'),
+    ('Category', 'category'),
+    ('Amount', 'amount'),
+    ('Added By', 'added_by__username'),
+    ('Description', 'description'),
+]
+
+FORMATS = ('csv', 'xlsx')
+
+
+class Echo:
+    """File-like object whose write() hands the line back, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _local(value):
+    # Spreadsheets have no time zones; export church-local wall time.
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None, microsecond=0)
+    return value
+
+
+def iter_rows(queryset, columns, chunk_size=CHUNK_SIZE):
+    """
+    Yield plain tuples for ``columns`` straight off a server-side cursor.
+
+    ``values_list`` skips model instances and ``iterator`` skips the
+    queryset cache, so only one chunk is in memory at a time.
+    """
+    rows = queryset.values_list(*[field for _, field in columns]).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield tuple(_local(value) for value in row)
+
+
+def csv_response(queryset, columns, filename):
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield '\ufeff'  # BOM so Excel opens the file as UTF-8
+        yield writer.writerow([header for header, _ in columns])
+        for row in iter_rows(queryset, columns):
+            yield writer.writerow(['' if value is None else value for value in row])
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def xlsx_response(queryset, columns, filename):
+    """
+    Build the workbook in openpyxl's write-only mode and stream it back.
+
+    Write-only sheets flush each row to disk as it's appended, and the
+    finished file is spooled to a temporary file rather than held in
+    memory, so a long export costs disk rather than RAM.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(filename[:31])
+    sheet.append([header for header, _ in columns])
+    for row in iter_rows(queryset, columns):
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def export_response(queryset, columns, filename, fmt):
+    if fmt == 'xlsx':
+        return xlsx_response(queryset, columns, filename)
+    return csv_response(queryset, columns, filename)
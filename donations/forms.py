@@ -1,5 +1,8 @@
 from django import forms
-from .models import Donation
+from django.utils import timezone
+from accounts.forms import clean_mpesa_phone
+from accounts.widgets import MemberAutocomplete
+from .models import Donation, Pledge, RecurringGift
 
 class DonationForm(forms.ModelForm):
     donor_name = forms.CharField(
@@ -39,7 +42,7 @@ class DonationForm(forms.ModelForm):
             'status',
         ]
         widgets = {
-            'member': forms.Select(attrs={'class': 'form-select', 'required': True}),
+            'member': MemberAutocomplete(),
             'category': forms.Select(attrs={'class': 'form-select', 'required': True}),
             'amount': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Enter amount'}),
             'payment_method': forms.Select(attrs={'class': 'form-select'}),
@@ -60,3 +63,42 @@ class ExpenseForm(forms.ModelForm):
     class Meta:
         model = Expense
         fields = ['title', 'description', 'amount', 'category', 'added_by']
+
+
+class PledgeForm(forms.ModelForm):
+    class Meta:
+        model = Pledge
+        fields = ['member', 'amount', 'note']
+        widgets = {
+            'member': MemberAutocomplete(),
+            'amount': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Pledged amount'}),
+            'note': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. monthly until June'}),
+        }
+
+
+class RecurringGiftForm(forms.ModelForm):
+    class Meta:
+        model = RecurringGift
+        fields = ['amount', 'category', 'frequency', 'phone_number', 'starts_on']
+        widgets = {
+            'amount': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Amount (Ksh)'}),
+            'category': forms.Select(attrs={'class': 'form-select'}),
+            'frequency': forms.Select(attrs={'class': 'form-select'}),
+            'phone_number': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '2547XXXXXXXX'}),
+            'starts_on': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+        }
+
+    def clean_phone_number(self):
+        return clean_mpesa_phone(self.cleaned_data['phone_number'])
+
+    def clean_amount(self):
+        amount = self.cleaned_data['amount']
+        if amount < 1:
+            raise forms.ValidationError("Amount must be at least Ksh 1.")
+        return amount
+
+    def clean_starts_on(self):
+        starts_on = self.cleaned_data['starts_on']
+        if starts_on < timezone.localdate():
+            raise forms.ValidationError("Start date can't be in the past.")
+        return starts_on
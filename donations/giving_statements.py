@@ -0,0 +1,210 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections
+from django.utils import timezone
+
+from .models import Donation, GivingStatement
+from .statement_pdf import render_statement
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 200
+
+CATEGORY_LABELS = dict(Donation.CATEGORY_CHOICES)
+METHOD_LABELS = dict(Donation.PAYMENT_METHODS)
+
+
+def _year_range(year):
+    return (
+        timezone.make_aware(datetime(year, 1, 1)),
+        timezone.make_aware(datetime(year + 1, 1, 1)),
+    )
+
+
+def statement_path(year, member_id):
+    return f"statements/{year}/member-{member_id}.pdf"
+
+
+def prepare(year, member_ids=None):
+    """
+    Create a GivingStatement row for every member who gave in ``year``.
+
+    Existing rows are left alone, so a run that stopped half way picks up
+    where it left off. Returns the number of members with gifts.
+    """
+    start, end = _year_range(year)
+    givers = Donation.objects.filter(status="completed", date_donated__gte=start, date_donated__lt=end)
+    if member_ids:
+        givers = givers.filter(member_id__in=member_ids)
+    givers = list(givers.values_list("member_id", flat=True).distinct().order_by())
+    GivingStatement.objects.bulk_create(
+        [GivingStatement(member_id=member_id, year=year) for member_id in givers],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+    return len(givers)
+
+
+def _payloads(year, member_ids):
+    """
+    Yield ``(payload, total, gift count)`` for ``member_ids`` from one query.
+
+    Gifts are read in member order and split with groupby, so one pass
+    gives every member's rows, totals and category subtotals.
+    """
+    start, end = _year_range(year)
+    gifts = (
+        Donation.objects.filter(
+            member_id__in=member_ids, status="completed", date_donated__gte=start, date_donated__lt=end,
+        )
+        .order_by("member_id", "date_donated", "id")
+        .values_list(
+            "member_id", "member__user__first_name", "member__user__last_name", "member__user__username",
+            "date_donated", "category", "payment_method", "transaction_id", "amount",
+        )
+    )
+    church = getattr(settings, "CHURCH_NAME", "Koma Church")
+    issued = timezone.localdate().strftime("%d %B %Y")
+    for member_id, rows in groupby(gifts.iterator(chunk_size=2000), key=lambda row: row[0]):
+        rows = list(rows)
+        first_name, last_name, username = rows[0][1:4]
+        total = Decimal(0)
+        categories = {}
+        lines = []
+        for *_, when, category, method, reference, amount in rows:
+            total += amount
+            categories[category] = categories.get(category, Decimal(0)) + amount
+            lines.append((
+                timezone.localtime(when).strftime("%d %b %Y"),
+                CATEGORY_LABELS.get(category, category),
+                METHOD_LABELS.get(method, method),
+                reference or "",
+                f"{amount:,.2f}",
+            ))
+        yield {
+            "member_id": member_id,
+            "name": f"{first_name} {last_name}".strip() or username,
+            "year": year,
+            "church": church,
+            "issued": issued,
+            "total": f"{total:,.2f}",
+            "gifts": lines,
+            "categories": [
+                (CATEGORY_LABELS.get(category, category), f"{amount:,.2f}")
+                for category, amount in sorted(categories.items())
+            ],
+        }, total, len(rows)
+
+
+def _save_pdf(year, member_id, pdf):
+    path = statement_path(year, member_id)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.save(path, ContentFile(pdf))
+
+
+def generate(year, workers=None, member_ids=None, force=False, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Render and store statement PDFs for ``year`` across a process pool.
+
+    Members are handled ``chunk_size`` at a time: one query builds the
+    chunk's payloads, the pool renders them, and the chunk's rows are marked
+    generated before moving on. Interrupted runs resume from the first
+    unfinished chunk; ``force`` regenerates everything. Returns (done, failed).
+    """
+    prepare(year, member_ids)
+    pending = GivingStatement.objects.filter(year=year)
+    if member_ids:
+        pending = pending.filter(member_id__in=member_ids)
+    if not force:
+        pending = pending.filter(generated_at__isnull=True)
+    todo = list(pending.order_by("member_id").values_list("member_id", flat=True))
+
+    # Forked workers must not inherit (and later close) our DB sockets.
+    connections.close_all()
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i in range(0, len(todo), chunk_size):
+            chunk = todo[i:i + chunk_size]
+            payloads, totals = [], {}
+            for payload, total, count in _payloads(year, chunk):
+                payloads.append(payload)
+                totals[payload["member_id"]] = total, count
+            statements = {
+                statement.member_id: statement
+                for statement in GivingStatement.objects.filter(year=year, member_id__in=chunk)
+            }
+            now = timezone.now()
+            futures = {pool.submit(render_statement, payload): payload["member_id"] for payload in payloads}
+            for future in as_completed(futures):
+                member_id = futures[future]
+                statement = statements[member_id]
+                try:
+                    statement.file.name = _save_pdf(year, *future.result())
+                except Exception as exc:
+                    # One bad statement only costs that member's PDF
+                    logger.exception("Giving statement %s for member %s failed", year, member_id)
+                    statement.error = str(exc)[:255]
+                    failed += 1
+                    continue
+                statement.total, statement.gift_count = totals[member_id]
+                statement.generated_at, statement.emailed_at, statement.error = now, None, ""
+                done += 1
+            GivingStatement.objects.bulk_update(
+                statements.values(),
+                ["file", "total", "gift_count", "generated_at", "emailed_at", "error"],
+            )
+            if progress:
+                progress(done, failed, len(todo))
+    return done, failed
+
+
+def send(year, batch_size=50, connection=None):
+    """
+    Email generated statements that haven't been sent yet, reusing one SMTP connection.
+
+    Each batch is marked sent once the server has accepted it, so a rerun
+    only sends what's left. Returns the number of emails sent.
+    """
+    unsent = (
+        GivingStatement.objects.filter(year=year, generated_at__isnull=False, emailed_at__isnull=True)
+        .exclude(member__user__email="")
+        .select_related("member__user")
+        .order_by("pk")
+    )
+    church = getattr(settings, "CHURCH_NAME", "Koma Church")
+    connection = connection or get_connection()
+    sent = 0
+    with connection:
+        while True:
+            batch = list(unsent[:batch_size])
+            if not batch:
+                break
+            messages = []
+            for statement in batch:
+                user = statement.member.user
+                message = EmailMessage(
+                    subject=f"Your {year} giving statement",
+                    body=(
+                        f"Dear {user.get_full_name() or user.username},\n\n"
+                        f"Thank you for your faithful giving in {year}. Your giving statement "
+                        f"is attached.\n\n{church}"
+                    ),
+                    to=[user.email],
+                    connection=connection,
+                )
+                with statement.file.open("rb") as pdf:
+                    message.attach(f"giving-statement-{year}.pdf", pdf.read(), "application/pdf")
+                messages.append(message)
+            connection.send_messages(messages)
+            GivingStatement.objects.filter(pk__in=[s.pk for s in batch]).update(emailed_at=timezone.now())
+            sent += len(batch)
+    return sent
@@ -0,0 +1,211 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyLedger, Donation, Expense, MonthlyLedger
+
+
+def _day_of(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def entry(obj):
+    """
+    The ledger line a Donation or Expense contributes, or None.
+
+    Returned as ``(day, keys, amount)``: the local date it falls on, the
+    breakdown columns identifying its rollup row, and the amount.
+    """
+    if obj is None:
+        return None
+    if isinstance(obj, Donation):
+        if obj.date_donated is None:
+            return None
+        keys = {
+            'kind': 'donation',
+            'category': obj.category,
+            'payment_method': obj.payment_method,
+            'status': obj.status,
+        }
+        return _day_of(obj.date_donated), keys, Decimal(obj.amount)
+    if obj.date_recorded is None:
+        return None
+    keys = {'kind': 'expense', 'category': obj.category, 'payment_method': '', 'status': ''}
+    return _day_of(obj.date_recorded), keys, Decimal(obj.amount)
+
+
+def _bump(model, amount, count, **keys):
+    updated = model.objects.filter(**keys).update(total=F('total') + amount, count=F('count') + count)
+    if updated or count < 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(total=amount, count=count, **keys)
+    except IntegrityError:
+        model.objects.filter(**keys).update(total=F('total') + amount, count=F('count') + count)
+
+
+def apply(line, sign=1):
+    """Add (sign=1) or remove (sign=-1) one ledger line from both rollups."""
+    if line is None:
+        return
+    day, keys, amount = line
+    _bump(DailyLedger, sign * amount, sign, day=day, **keys)
+    _bump(MonthlyLedger, sign * amount, sign, month=day.replace(day=1), **keys)
+
+
+def apply_many(lines, sign=1):
+    """
+    Add (or remove) many ledger lines with one update per rollup row touched.
+
+    For bulk_create/bulk_update paths, which skip the signals.
+    """
+    daily = defaultdict(lambda: [Decimal(0), 0])
+    for line in lines:
+        if line is None:
+            continue
+        day, keys, amount = line
+        bucket = daily[(day, tuple(sorted(keys.items())))]
+        bucket[0] += amount
+        bucket[1] += 1
+    monthly = defaultdict(lambda: [Decimal(0), 0])
+    for (day, keys), (amount, count) in daily.items():
+        _bump(DailyLedger, sign * amount, sign * count, day=day, **dict(keys))
+        bucket = monthly[(day.replace(day=1), keys)]
+        bucket[0] += amount
+        bucket[1] += count
+    for (month, keys), (amount, count) in monthly.items():
+        _bump(MonthlyLedger, sign * amount, sign * count, month=month, **dict(keys))
+
+
+def move(before, after):
+    """Replace the ledger line ``before`` with ``after`` (either may be None)."""
+    if before == after:
+        return
+    apply(before, -1)
+    apply(after, 1)
+
+
+# ------------------------------
+# Rebuild & verify
+# ------------------------------
+def _expected():
+    """Recompute every daily and monthly rollup row from the raw tables."""
+    daily = defaultdict(lambda: [Decimal(0), 0])
+    sources = [
+        (Donation.objects, 'date_donated', 'donation', ['category', 'payment_method', 'status']),
+        (Expense.objects, 'date_recorded', 'expense', ['category']),
+    ]
+    for manager, date_field, kind, dims in sources:
+        grouped = (
+            manager.annotate(day=TruncDate(date_field))
+            .values('day', *dims)
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        for row in grouped:
+            key = (
+                row['day'], kind, row['category'],
+                row.get('payment_method', ''), row.get('status', ''),
+            )
+            daily[key][0] += row['total']
+            daily[key][1] += row['count']
+
+    monthly = defaultdict(lambda: [Decimal(0), 0])
+    for (day, *rest), (total, count) in daily.items():
+        bucket = monthly[(day.replace(day=1), *rest)]
+        bucket[0] += total
+        bucket[1] += count
+    return daily, monthly
+
+
+def _rows(model, period, expected):
+    return [
+        model(**{period: key[0]}, kind=key[1], category=key[2], payment_method=key[3],
+              status=key[4], total=total, count=count)
+        for key, (total, count) in expected.items()
+    ]
+
+
+def rebuild():
+    """Replace both rollup tables with freshly computed rows. Returns (daily, monthly)."""
+    daily, monthly = _expected()
+    with transaction.atomic():
+        DailyLedger.objects.all().delete()
+        MonthlyLedger.objects.all().delete()
+        DailyLedger.objects.bulk_create(_rows(DailyLedger, 'day', daily), batch_size=1000)
+        MonthlyLedger.objects.bulk_create(_rows(MonthlyLedger, 'month', monthly), batch_size=1000)
+    return len(daily), len(monthly)
+
+
+def verify():
+    """List (table, key, stored, expected) for every rollup row that has drifted."""
+    mismatches = []
+    for model, period, expected in zip(
+        (DailyLedger, MonthlyLedger), ('day', 'month'), _expected()
+    ):
+        stored = {
+            row[:5]: (row[5], row[6])
+            for row in model.objects.values_list(
+                period, 'kind', 'category', 'payment_method', 'status', 'total', 'count'
+            )
+        }
+        for key in stored.keys() | expected.keys():
+            have = stored.get(key, (Decimal(0), 0))
+            want = tuple(expected.get(key, (Decimal(0), 0)))
+            if have != want:
+                mismatches.append((model.__name__, key, have, want))
+    return mismatches
+
+
+# ------------------------------
+# Readers
+# ------------------------------
+def ledger_rows(kind, start=None, end=None):
+    """
+    Rollup rows for ``kind`` between two dates (inclusive).
+
+    Whole-history and month-aligned queries read the monthly table so their
+    cost stays flat no matter how many years of giving are stored.
+    """
+    month_aligned = (start is None or start.day == 1) and (
+        end is None or (end + timedelta(days=1)).day == 1
+    )
+    if month_aligned:
+        rows = MonthlyLedger.objects.filter(kind=kind)
+        if start:
+            rows = rows.filter(month__gte=start)
+        if end:
+            rows = rows.filter(month__lte=end)
+        return rows
+    rows = DailyLedger.objects.filter(kind=kind)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    return rows
+
+
+def _received(kind):
+    """Monthly rows for ``kind``; for donations, only money actually received."""
+    rows = MonthlyLedger.objects.filter(kind=kind)
+    return rows.filter(status='completed') if kind == 'donation' else rows
+
+
+def monthly_totals(kind, year):
+    """[(month number, total)] for one calendar year, in month order."""
+    return list(
+        _received(kind).filter(month__year=year)
+        .values_list('month__month')
+        .annotate(amount=Sum('total'))
+        .order_by('month__month')
+    )
+
+
+def grand_total(kind):
+    return _received(kind).aggregate(amount=Sum('total', default=0))['amount']
@@ -0,0 +1,42 @@
+# donations/management/commands/generate_giving_statements.py
+
+import os
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from donations import giving_statements
+
+
+class Command(BaseCommand):
+    help = "Generate (and optionally email) year-end giving statement PDFs for every member who gave"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--year", type=int, default=timezone.localdate().year - 1,
+            help="Tax year to produce statements for (default: last year).",
+        )
+        parser.add_argument("--member", type=int, action="append", dest="members", help="Only this member id (repeatable).")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="PDF rendering processes.")
+        parser.add_argument("--chunk-size", type=int, default=giving_statements.CHUNK_SIZE)
+        parser.add_argument("--force", action="store_true", help="Regenerate statements that already exist.")
+        parser.add_argument("--email", action="store_true", help="Email statements that haven't been sent yet.")
+
+    def handle(self, *args, **options):
+        year = options["year"]
+
+        def progress(done, failed, total):
+            self.stdout.write(f"  {done + failed}/{total} statements ({failed} failed)")
+
+        done, failed = giving_statements.generate(
+            year,
+            workers=options["workers"],
+            member_ids=options["members"],
+            force=options["force"],
+            chunk_size=options["chunk_size"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Generated {done} giving statements for {year} ({failed} failed)."))
+
+        if options["email"]:
+            sent = giving_statements.send(year)
+            self.stdout.write(self.style.SUCCESS(f"Emailed {sent} giving statements."))
@@ -0,0 +1,27 @@
+# donations/management/commands/rebuild_finance_ledger.py
+
+from django.core.management.base import BaseCommand, CommandError
+from donations import ledger
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily/monthly finance ledger rollups from raw donations and expenses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="Only compare the stored rollups against the raw rows; exit non-zero on drift.",
+        )
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            mismatches = ledger.verify()
+            for table, key, stored, expected in mismatches[:50]:
+                self.stdout.write(f"{table} {key}: stored {stored}, expected {expected}")
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} ledger rows have drifted; run without --verify to rebuild.")
+            self.stdout.write(self.style.SUCCESS("Finance ledger matches the raw donations and expenses."))
+            return
+
+        daily, monthly = ledger.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {daily} daily and {monthly} monthly ledger rows."))
@@ -0,0 +1,70 @@
+# donations/management/commands/reconcile_statement.py
+
+import csv
+import json
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from donations.statements import CHUNK_SIZE, reconcile_statement
+
+
+class Command(BaseCommand):
+    help = "Match an M-Pesa or bank statement CSV against unreconciled donations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Statement CSV, or - for stdin")
+        parser.add_argument(
+            "--method", choices=["mpesa", "bank"], default="mpesa",
+            help="Payment method the statement covers (default: mpesa).",
+        )
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument(
+            "--window", type=int, default=3,
+            help="Days either side of the statement date to look for a donation (default: 3).",
+        )
+        parser.add_argument("--since", type=date.fromisoformat, help="Only consider donations from this date (YYYY-MM-DD).")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--exceptions", help="Write unmatched lines and missing donations to this CSV file")
+        parser.add_argument("--dry-run", action="store_true", help="Report matches without saving them.")
+
+    def handle(self, *args, **options):
+        source = sys.stdin if options["path"] == "-" else open(
+            options["path"], newline="", encoding="utf-8-sig"
+        )
+        exceptions_file = open(options["exceptions"], "w", newline="") if options["exceptions"] else None
+        writer = csv.writer(exceptions_file) if exceptions_file else None
+        if writer:
+            writer.writerow(["kind", "line", "donation", "reason", "details"])
+
+        def on_exception(kind, details):
+            details = dict(details)
+            line, donation, reason = details.pop("line", ""), details.pop("donation", ""), details.pop("reason", "")
+            if writer:
+                writer.writerow([kind, line, donation, reason, json.dumps(details, default=str)])
+
+        try:
+            stats = reconcile_statement(
+                source,
+                method=options["method"],
+                delimiter=options["delimiter"],
+                window_days=options["window"],
+                since=options["since"],
+                chunk_size=options["chunk_size"],
+                dry_run=options["dry_run"],
+                on_exception=on_exception,
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if exceptions_file:
+                exceptions_file.close()
+
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Read {stats['lines']} incoming lines: {stats['matched']} matched "
+            f"({stats['completed']} pending donations completed), {stats['unmatched_lines']} unmatched, "
+            f"{stats['rejected']} unreadable; {stats['missing_donations']} completed donations not on the statement."
+        ))
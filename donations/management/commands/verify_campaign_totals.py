@@ -0,0 +1,27 @@
+# donations/management/commands/verify_campaign_totals.py
+
+from django.core.management.base import BaseCommand, CommandError
+from donations import campaigns
+
+
+class Command(BaseCommand):
+    help = "Check campaign and pledge running totals against the donations and repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only report drifted totals; exit non-zero if there are any.",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = campaigns.verify()
+        for kind, pk, stored, expected in mismatches[:50]:
+            self.stdout.write(f"{kind.title()} {pk}: stored {stored}, expected {expected}")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Campaign and pledge totals match their donations."))
+            return
+        if options["check"]:
+            raise CommandError(f"{len(mismatches)} totals have drifted; run without --check to repair.")
+
+        fixed = campaigns.repair()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed totals for {fixed} campaigns and pledges."))
@@ -0,0 +1,28 @@
+# donations/management/commands/verify_member_totals.py
+
+from django.core.management.base import BaseCommand, CommandError
+from donations import contributions
+
+
+class Command(BaseCommand):
+    help = "Check each member's stored giving totals against their completed donations and repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only report drifted members; exit non-zero if there are any.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        mismatches = contributions.verify()
+        for member_id, stored, expected in mismatches[:50]:
+            self.stdout.write(f"Member {member_id}: stored {stored}, expected {expected}")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Member giving totals match their donations."))
+            return
+        if options["check"]:
+            raise CommandError(f"{len(mismatches)} members have drifted; run without --check to repair.")
+
+        fixed = contributions.repair([member_id for member_id, _, _ in mismatches], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired giving totals for {fixed} members."))
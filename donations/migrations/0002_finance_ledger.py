@@ -0,0 +1,89 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:28
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_ledger(apps, schema_editor):
+    Donation = apps.get_model('donations', 'Donation')
+    Expense = apps.get_model('donations', 'Expense')
+    DailyLedger = apps.get_model('donations', 'DailyLedger')
+    MonthlyLedger = apps.get_model('donations', 'MonthlyLedger')
+
+    daily = defaultdict(lambda: [Decimal(0), 0])
+    sources = [
+        (Donation, 'date_donated', 'donation', ['category', 'payment_method', 'status']),
+        (Expense, 'date_recorded', 'expense', ['category']),
+    ]
+    for model, date_field, kind, dims in sources:
+        grouped = (
+            model.objects.annotate(day=TruncDate(date_field))
+            .values('day', *dims)
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        for row in grouped:
+            key = (row['day'], kind, row['category'], row.get('payment_method', ''), row.get('status', ''))
+            daily[key][0] += row['total']
+            daily[key][1] += row['count']
+
+    monthly = defaultdict(lambda: [Decimal(0), 0])
+    for (day, *rest), (total, count) in daily.items():
+        monthly[(day.replace(day=1), *rest)][0] += total
+        monthly[(day.replace(day=1), *rest)][1] += count
+
+    for model, period, rows in ((DailyLedger, 'day', daily), (MonthlyLedger, 'month', monthly)):
+        model.objects.bulk_create([
+            model(**{period: key[0]}, kind=key[1], category=key[2], payment_method=key[3],
+                  status=key[4], total=total, count=count)
+            for key, (total, count) in rows.items()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('donation', 'Donation'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(max_length=50)),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('day', models.DateField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'day'], name='donations_d_kind_3befcb_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'kind', 'category', 'payment_method', 'status'), name='unique_daily_ledger')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('donation', 'Donation'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(max_length=50)),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('month', models.DateField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'month'], name='donations_m_kind_30d188_idx')],
+                'constraints': [models.UniqueConstraint(fields=('month', 'kind', 'category', 'payment_method', 'status'), name='unique_monthly_ledger')],
+            },
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
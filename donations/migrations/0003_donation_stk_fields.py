@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0002_finance_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='checkout_request_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='phone_number',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='stk_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='stk_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
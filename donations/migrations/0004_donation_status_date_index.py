@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_mpesa_callback_inbox'),
+        ('donations', '0003_donation_stk_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['status', 'date_donated'], name='donations_d_status_29c6ad_idx'),
+        ),
+    ]
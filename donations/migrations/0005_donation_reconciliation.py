@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0004_donation_status_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='reconciled_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='statement_ref',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_member_giving_totals'),
+        ('donations', '0005_donation_reconciliation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GivingStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('gift_count', models.PositiveIntegerField(default=0)),
+                ('file', models.FileField(blank=True, upload_to='statements/')),
+                ('generated_at', models.DateTimeField(blank=True, null=True)),
+                ('emailed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='giving_statements', to='accounts.member')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'generated_at'], name='donations_g_year_143de3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'year'), name='unique_giving_statement')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_member_giving_totals'),
+        ('donations', '0007_offering_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150)),
+                ('slug', models.SlugField(unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('category', models.CharField(choices=[('tithe', 'Tithe'), ('offering', 'Offering'), ('charity', 'Charity'), ('building', 'Building Fund')], default='building', max_length=50)),
+                ('goal', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('starts_on', models.DateField(default=django.utils.timezone.localdate)),
+                ('ends_on', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('raised', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gift_count', models.PositiveIntegerField(default=0)),
+                ('pledged', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pledge_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-is_active', '-starts_on'],
+            },
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='donations', to='donations.campaign'),
+        ),
+        migrations.CreateModel(
+            name='Pledge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fulfilled', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pledges', to='donations.campaign')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pledges', to='accounts.member')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'member'), name='unique_campaign_pledge')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_member_giving_totals'),
+        ('donations', '0008_campaigns_pledges'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringGift',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('category', models.CharField(choices=[('tithe', 'Tithe'), ('offering', 'Offering'), ('charity', 'Charity'), ('building', 'Building Fund')], default='tithe', max_length=50)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('frequency', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly')], default='weekly', max_length=10)),
+                ('starts_on', models.DateField(default=django.utils.timezone.localdate)),
+                ('next_run_on', models.DateField(default=django.utils.timezone.localdate)),
+                ('is_active', models.BooleanField(default=True)),
+                ('failures', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_gifts', to='accounts.member')),
+            ],
+            options={
+                'ordering': ['next_run_on'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecurringGiftRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('pushed', 'Prompt sent'), ('retry', 'Waiting to retry'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('retry_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('donation', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_run', to='donations.donation')),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='donations.recurringgift')),
+            ],
+            options={
+                'ordering': ['-period'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recurringgift',
+            index=models.Index(fields=['is_active', 'next_run_on'], name='donations_r_is_acti_b0def5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringgiftrun',
+            index=models.Index(fields=['status', 'retry_at'], name='donations_r_status_7c7459_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recurringgiftrun',
+            constraint=models.UniqueConstraint(fields=('schedule', 'period'), name='unique_recurring_gift_period'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0009_recurring_gifts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recurringgiftrun',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('pushed', 'Prompt sent'), ('unknown', 'Waiting for M-Pesa'), ('retry', 'Waiting to retry'), ('failed', 'Failed')], default='queued', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0010_recurring_run_unknown'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='donation',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('unknown', 'Unconfirmed')], default='completed', max_length=20),
+        ),
+    ]
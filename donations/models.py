@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from accounts.models import Member
 from django.utils import timezone
 
@@ -14,6 +14,10 @@ class Donation(models.Model):
         ('pending', 'Pending'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        # An M-Pesa prompt that may have been sent but was never confirmed
+        # either way; settled by a matching callback, the statement
+        # reconciliation, or an admin.
+        ('unknown', 'Unconfirmed'),
     ]
 
     CATEGORY_CHOICES = [
@@ -31,6 +35,41 @@ class Donation(models.Model):
     date_donated = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
 
+    # M-Pesa STK push bookkeeping
+    phone_number = models.CharField(max_length=20, blank=True, null=True)
+    checkout_request_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    stk_attempts = models.PositiveSmallIntegerField(default=0)
+    stk_error = models.CharField(max_length=255, blank=True)
+
+    # Statement reconciliation
+    reconciled_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    statement_ref = models.CharField(max_length=100, blank=True)
+
+    # Set when the donation was entered as part of a counted offering batch
+    batch = models.ForeignKey(
+        'OfferingBatch', on_delete=models.SET_NULL, null=True, blank=True, related_name="donations"
+    )
+    # Capital campaign the gift counts towards (see donations.campaigns)
+    campaign = models.ForeignKey(
+        'Campaign', on_delete=models.SET_NULL, null=True, blank=True, related_name="donations"
+    )
+
+    class Meta:
+        indexes = [
+            # Reconciler: pending donations older than a cutoff
+            models.Index(fields=['status', 'date_donated']),
+        ]
+
+    # The ledger signals run inside these transactions, so a donation and
+    # its rollup rows are written (or rolled back) together.
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.member.user.username} - {self.amount} ({self.payment_method})"
 
@@ -53,5 +92,256 @@ class Expense(models.Model):
     date_recorded = models.DateTimeField(auto_now_add=True)
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.title} - {self.amount}"
+
+
+# =====================================================
+# Ledger Rollups
+# =====================================================
+class LedgerRollup(models.Model):
+    """Sum and count of donations/expenses sharing a period and breakdown."""
+    KIND_CHOICES = [
+        ('donation', 'Donation'),
+        ('expense', 'Expense'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    category = models.CharField(max_length=50)
+    payment_method = models.CharField(max_length=20, blank=True)  # blank for expenses
+    status = models.CharField(max_length=20, blank=True)  # blank for expenses
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyLedger(LedgerRollup):
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'kind', 'category', 'payment_method', 'status'],
+                name='unique_daily_ledger',
+            ),
+        ]
+        indexes = [models.Index(fields=['kind', 'day'])]
+
+    def __str__(self):
+        return f"{self.day} {self.kind}/{self.category}: {self.total}"
+
+
+class MonthlyLedger(LedgerRollup):
+    month = models.DateField()  # first day of the month
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'kind', 'category', 'payment_method', 'status'],
+                name='unique_monthly_ledger',
+            ),
+        ]
+        indexes = [models.Index(fields=['kind', 'month'])]
+
+    def __str__(self):
+        return f"{self.month:%b %Y} {self.kind}/{self.category}: {self.total}"
+
+
+# =====================================================
+# Year-end Giving Statements
+# =====================================================
+class GivingStatement(models.Model):
+    """One member's giving statement PDF for a tax year, and how far along it is."""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name="giving_statements")
+    year = models.PositiveSmallIntegerField()
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    gift_count = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to="statements/", blank=True)
+    generated_at = models.DateTimeField(null=True, blank=True)
+    emailed_at = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['member', 'year'], name='unique_giving_statement'),
+        ]
+        indexes = [models.Index(fields=['year', 'generated_at'])]
+
+    def __str__(self):
+        return f"{self.member} {self.year}: {self.total}"
+
+
+# =====================================================
+# Offering Batches (Sunday counting)
+# =====================================================
+class OfferingBatch(models.Model):
+    """A counting team's tally of one service's envelopes, posted in one go."""
+    service_date = models.DateField(default=timezone.localdate)
+    label = models.CharField(max_length=100, blank=True)  # e.g. "First service"
+    declared_total = models.DecimalField(max_digits=12, decimal_places=2)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    line_count = models.PositiveIntegerField(default=0)
+    # Client-generated id so a resubmitted batch isn't posted twice
+    reference = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    counted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-service_date', '-created_at']
+        verbose_name_plural = "Offering batches"
+
+    def __str__(self):
+        return f"{self.service_date} {self.label or 'Offering'}: {self.total}"
+
+
+# =====================================================
+# Campaigns & Pledges
+# =====================================================
+class Campaign(models.Model):
+    """
+    A fundraising drive with a goal, e.g. the building fund.
+
+    ``raised``/``gift_count`` and ``pledged``/``pledge_count`` are running
+    totals kept up to date by donations.campaigns as donations and pledges
+    are written, so progress is read from this row alone.
+    """
+    name = models.CharField(max_length=150)
+    slug = models.SlugField(unique=True)
+    description = models.TextField(blank=True)
+    # Donations in this category are attributed to the campaign while it runs
+    category = models.CharField(max_length=50, choices=Donation.CATEGORY_CHOICES, default='building')
+    goal = models.DecimalField(max_digits=14, decimal_places=2)
+    starts_on = models.DateField(default=timezone.localdate)
+    ends_on = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    raised = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gift_count = models.PositiveIntegerField(default=0)
+    pledged = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pledge_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-is_active', '-starts_on']
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def percent(self):
+        return min(100, round(self.raised * 100 / self.goal, 1)) if self.goal else 0
+
+
+class Pledge(models.Model):
+    """What a member has promised towards a campaign, and how much of it they've given."""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name="pledges")
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name="pledges")
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Completed campaign donations from this member, maintained incrementally
+    fulfilled = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'member'], name='unique_campaign_pledge'),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.member} → {self.campaign}: {self.amount}"
+
+    @property
+    def remaining(self):
+        return max(self.amount - self.fulfilled, 0)
+
+    @property
+    def percent(self):
+        return min(100, round(self.fulfilled * 100 / self.amount)) if self.amount else 0
+
+    # Campaign totals move in the signals, inside the same transaction
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+# =====================================================
+# Recurring Giving (scheduled STK pushes)
+# =====================================================
+class RecurringGift(models.Model):
+    """A member's standing instruction to be prompted for a gift every week or month."""
+    FREQUENCY_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name="recurring_gifts")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    category = models.CharField(max_length=50, choices=Donation.CATEGORY_CHOICES, default='tithe')
+    phone_number = models.CharField(max_length=20)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='weekly')
+    starts_on = models.DateField(default=timezone.localdate)
+    # Date of the next prompt; advanced when a period is claimed
+    next_run_on = models.DateField(default=timezone.localdate)
+    is_active = models.BooleanField(default=True)
+    # Consecutive periods that couldn't be pushed; the schedule pauses itself after a few
+    failures = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['next_run_on']
+        indexes = [
+            # Scheduler: active schedules due on or before today
+            models.Index(fields=['is_active', 'next_run_on']),
+        ]
+
+    def __str__(self):
+        return f"{self.member} {self.get_frequency_display().lower()} {self.amount}"
+
+
+class RecurringGiftRun(models.Model):
+    """One period of a schedule: the prompt sent for it, and its retries."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('pushed', 'Prompt sent'),
+        ('unknown', 'Waiting for M-Pesa'),
+        ('retry', 'Waiting to retry'),
+        ('failed', 'Failed'),
+    ]
+
+    schedule = models.ForeignKey(RecurringGift, on_delete=models.CASCADE, related_name="runs")
+    period = models.DateField()  # the scheduled date this run covers
+    donation = models.OneToOneField(
+        Donation, on_delete=models.SET_NULL, null=True, blank=True, related_name="recurring_run"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    retry_at = models.DateTimeField(default=timezone.now)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # At most one prompt per schedule per period, however often the scheduler runs
+            models.UniqueConstraint(fields=['schedule', 'period'], name='unique_recurring_gift_period'),
+        ]
+        indexes = [models.Index(fields=['status', 'retry_at'])]
+        ordering = ['-period']
+
+    def __str__(self):
+        return f"{self.schedule} {self.period}: {self.status}"
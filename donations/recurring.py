@@ -0,0 +1,260 @@
+"""
+Recurring giving: turn due schedules into STK pushes.
+
+``run_due`` is meant to run every few minutes from cron
+(``python manage.py run_recurring_gifts``). Each pass:
+
+1. claims the current period of every due schedule (indexed on
+   ``is_active, next_run_on``) by creating its RecurringGiftRun, whose
+   unique (schedule, period) makes a period impossible to prompt twice;
+2. gives each queued or retry-due run a pending Donation;
+3. sends the prompts with accounts.stk.push_prompt on a bounded thread
+   pool, paced by a shared RateLimiter so Daraja isn't flooded;
+4. records every outcome in one transaction: runs whose push failed are
+   retried later with exponential backoff, and a schedule that keeps
+   failing is paused.
+
+A push that timed out may still have prompted the phone, so its run waits
+as ``unknown`` until reconcile_pending settles the donation; only a
+donation that ends up failed is retried with a new one.
+
+A prompt the member declines is not retried; the next period still is.
+"""
+import calendar
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts import stk
+from koma.cache import bump_version
+
+from . import campaigns, ledger
+from .models import Donation, RecurringGift, RecurringGiftRun
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "recurring-gifts:lock"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ------------------------------
+# Periods
+# ------------------------------
+def next_date(schedule, after):
+    """The schedule's first run date strictly after ``after``."""
+    if schedule.frequency == 'weekly':
+        weeks = (after - schedule.starts_on).days // 7 + 1
+        return schedule.starts_on + timedelta(weeks=max(weeks, 0))
+    # Monthly on the start day, or the month's last day when it is shorter
+    year, month = after.year, after.month
+    while True:
+        day = min(schedule.starts_on.day, calendar.monthrange(year, month)[1])
+        candidate = after.replace(year=year, month=month, day=day)
+        if candidate > after and candidate >= schedule.starts_on:
+            return candidate
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def latest_due(schedule, today):
+    """The most recent run date on or before ``today`` (missed periods are skipped, not replayed)."""
+    period = schedule.next_run_on
+    following = next_date(schedule, period)
+    while following <= today:
+        period, following = following, next_date(schedule, following)
+    return period, following
+
+
+def due(today, limit=None):
+    schedules = RecurringGift.objects.filter(is_active=True, next_run_on__lte=today).order_by('next_run_on')
+    return schedules[:limit] if limit else schedules
+
+
+def claim(schedule, today):
+    """Create the run for the schedule's current period and move it on. Returns the run or None."""
+    period, following = latest_due(schedule, today)
+    try:
+        with transaction.atomic():
+            moved = RecurringGift.objects.filter(
+                pk=schedule.pk, next_run_on=schedule.next_run_on,
+            ).update(next_run_on=following)
+            if not moved:
+                return None  # another pass claimed it first
+            return RecurringGiftRun.objects.create(schedule=schedule, period=period)
+    except IntegrityError:
+        # The period was already run (e.g. the schedule was edited back)
+        RecurringGift.objects.filter(pk=schedule.pk).update(next_run_on=following)
+        return None
+
+
+def _prepare(runs):
+    """Give each queued or retrying run a fresh pending Donation to push."""
+    donations = [
+        Donation(
+            member_id=run.schedule.member_id,
+            amount=run.schedule.amount,
+            category=run.schedule.category,
+            payment_method='mpesa',
+            phone_number=run.schedule.phone_number,
+            status='pending',
+        )
+        for run in runs
+    ]
+    campaigns.attribute(donations)
+    with transaction.atomic():
+        donations = Donation.objects.bulk_create(donations, batch_size=500)
+        # bulk_create skips the signals; pending gifts only touch the ledger
+        ledger.apply_many(ledger.entry(d) for d in donations)
+        for run, donation in zip(runs, donations):
+            run.donation = donation
+            run.attempts += 1
+        RecurringGiftRun.objects.bulk_update(runs, ['donation', 'attempts'], batch_size=500)
+    if donations:
+        bump_version('donations')
+
+
+def backoff(attempts):
+    """Delay before retry ``attempts`` + 1: base * 2^(attempts - 1), capped."""
+    base = _setting('RECURRING_RETRY_BASE', 15 * 60)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), _setting('RECURRING_RETRY_MAX', 12 * 3600)))
+
+
+def _retry_or_give_up(run, now):
+    """Schedule a failed run's next attempt, or fail it for good. Returns True when giving up."""
+    if run.attempts < _setting('RECURRING_MAX_ATTEMPTS', 4):
+        run.status, run.retry_at = 'retry', now + backoff(run.attempts)
+        return False
+    run.status = 'failed'
+    return True
+
+
+def _update_schedules(succeeded, gave_up):
+    """Reset the failure count of schedules that worked; count (and maybe pause) the ones given up on."""
+    RecurringGift.objects.filter(pk__in=succeeded).update(failures=0, last_error='')
+    for run in gave_up:
+        RecurringGift.objects.filter(pk=run.schedule_id).update(failures=F('failures') + 1, last_error=run.error)
+    paused = RecurringGift.objects.filter(
+        pk__in=[run.schedule_id for run in gave_up], failures__gte=_setting('RECURRING_PAUSE_AFTER', 3),
+    ).update(is_active=False)
+    if paused:
+        logger.warning("Paused %s recurring gifts after repeated failures", paused)
+
+
+def _record(outcomes, now):
+    """
+    Store the push outcomes on donations, runs and schedules, in one transaction.
+
+    ``outcomes`` is a list of (run, checkout request id, error); both None
+    means the push timed out (see accounts.stk.push_prompt). Returns the
+    number of runs per new status.
+    """
+    counts = {"pushed": 0, "unknown": 0, "retry": 0, "failed": 0}
+    accepted, unknown, succeeded, gave_up = [], [], [], []
+    with transaction.atomic():
+        for run, checkout_request_id, error in outcomes:
+            donation = run.donation
+            if checkout_request_id:
+                donation.checkout_request_id, donation.stk_error = checkout_request_id, ''
+                accepted.append(donation)
+                run.status, run.error = 'pushed', ''
+                succeeded.append(run.schedule_id)
+            elif error is None:
+                # Maybe prompted: keep the donation pending for reconcile_pending
+                unknown.append(donation)
+                run.status, run.error = 'unknown', donation.stk_error
+            else:
+                # Saved one by one: failing moves the amount in the ledger
+                donation.status, donation.stk_error = 'failed', error[:255]
+                donation.save(update_fields=['status', 'stk_error', 'stk_attempts'])
+                run.error = donation.stk_error
+                if _retry_or_give_up(run, now):
+                    gave_up.append(run)
+            counts[run.status] += 1
+
+        Donation.objects.bulk_update(accepted, ['checkout_request_id', 'stk_error', 'stk_attempts'], batch_size=500)
+        Donation.objects.bulk_update(unknown, ['stk_error', 'stk_attempts'], batch_size=500)
+        RecurringGiftRun.objects.bulk_update(
+            [run for run, _, _ in outcomes], ['status', 'error', 'retry_at'], batch_size=500,
+        )
+        _update_schedules(succeeded, gave_up)
+    return counts
+
+
+def settle_unknown(now):
+    """
+    Move on the runs whose push timed out, once their donation is settled:
+    a completed gift counts as pushed, and one Daraja (or an admin) marked
+    failed is retried with a new donation like any failed push. Runs whose
+    donation is still pending or unconfirmed are left waiting, since the
+    member may already have paid.
+    """
+    runs = list(
+        RecurringGiftRun.objects.filter(status='unknown', donation__status__in=('completed', 'failed'))
+        .select_related('donation')
+    )
+    succeeded, gave_up = [], []
+    with transaction.atomic():
+        for run in runs:
+            if run.donation.status == 'completed':
+                run.status, run.error = 'pushed', ''
+                succeeded.append(run.schedule_id)
+            else:
+                run.error = run.donation.stk_error
+                if _retry_or_give_up(run, now):
+                    gave_up.append(run)
+        RecurringGiftRun.objects.bulk_update(runs, ['status', 'error', 'retry_at'], batch_size=500)
+        _update_schedules(succeeded, gave_up)
+    return len(runs)
+
+
+def run_due(today=None, limit=500, workers=4, rate=5, client=None):
+    """
+    Claim due periods, push their STK prompts, and record the outcomes.
+
+    Returns a dict of counts. Only one pass runs at a time; an overlapping
+    call returns straight away with ``{"locked": True}``.
+    """
+    lock_timeout = _setting('RECURRING_LOCK_TIMEOUT', 15 * 60)
+    if not cache.add(LOCK_KEY, 1, timeout=lock_timeout):
+        return {"locked": True}
+    try:
+        today = today or timezone.localdate()
+        claimed = sum(1 for schedule in due(today, limit) if claim(schedule, today))
+
+        now = timezone.now()  # after claiming, so this pass pushes what it just claimed
+        settle_unknown(now)
+
+        runs = list(
+            RecurringGiftRun.objects.filter(status__in=('queued', 'retry'), retry_at__lte=now)
+            .select_related('schedule', 'donation')
+            .order_by('retry_at')[:limit]
+        )
+        # A run only gets a new donation once its last one failed; one left
+        # behind by a crashed pass is reused (and not pushed twice), and
+        # one that may have been prompted waits as 'unknown' instead.
+        _prepare([run for run in runs if run.donation is None or run.donation.status == 'failed'])
+
+        # The pool only talks to Daraja; every write happens back here.
+        limiter = stk.RateLimiter(rate)
+
+        def push(run):
+            if run.donation.checkout_request_id:
+                return run, run.donation.checkout_request_id, ''
+            if run.donation.stk_attempts:
+                return run, None, None  # tried before a crash; may have prompted
+            return (run, *stk.push_prompt(run.donation, client, limiter))
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            outcomes = list(pool.map(push, runs))
+
+        return {"claimed": claimed, **_record(outcomes, now)}
+    finally:
+        cache.delete(LOCK_KEY)
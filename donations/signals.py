@@ -0,0 +1,101 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from koma.cache import bump_version
+
+from . import campaigns, contributions, ledger
+from .models import Campaign, Donation, Expense, Pledge
+
+
+@receiver(pre_save, sender=Donation)
+@receiver(pre_save, sender=Expense)
+def remember_ledger_line(sender, instance, raw=False, **kwargs):
+    # Edits move an amount between rollup rows, so note where it was.
+    instance._ledger_before = None
+    instance._contribution_before = None
+    instance._campaign_before = None
+    if instance.pk and not raw:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        instance._ledger_before = ledger.entry(previous)
+        if sender is Donation:
+            instance._contribution_before = contributions.line(previous)
+            instance._campaign_before = campaigns.line(previous)
+    elif sender is Donation and not raw:
+        # New gifts in a running campaign's category count towards it
+        campaigns.attribute([instance])
+
+
+@receiver(post_save, sender=Donation)
+@receiver(post_save, sender=Expense)
+def update_ledger(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ledger.move(getattr(instance, '_ledger_before', None), ledger.entry(instance))
+
+
+@receiver(post_save, sender=Donation)
+def update_member_totals(sender, instance, raw=False, **kwargs):
+    if not raw:
+        contributions.move(getattr(instance, '_contribution_before', None), contributions.line(instance))
+
+
+@receiver(post_save, sender=Donation)
+def update_campaign_totals(sender, instance, raw=False, **kwargs):
+    if not raw:
+        campaigns.move(getattr(instance, '_campaign_before', None), campaigns.line(instance))
+
+
+@receiver(post_delete, sender=Donation)
+@receiver(post_delete, sender=Expense)
+def remove_from_ledger(sender, instance, **kwargs):
+    ledger.apply(ledger.entry(instance), -1)
+
+
+@receiver(post_delete, sender=Donation)
+def remove_from_member_totals(sender, instance, **kwargs):
+    contributions.apply(contributions.line(instance), -1)
+
+
+@receiver(post_delete, sender=Donation)
+def remove_from_campaign_totals(sender, instance, **kwargs):
+    campaigns.apply(campaigns.line(instance), -1)
+
+
+@receiver(pre_save, sender=Pledge)
+def remember_pledge(sender, instance, raw=False, **kwargs):
+    instance._pledge_before = None
+    if instance.pk and not raw:
+        instance._pledge_before = (
+            sender.objects.filter(pk=instance.pk).values_list('campaign_id', 'member_id', 'amount').first()
+        )
+
+
+@receiver(post_save, sender=Pledge)
+def update_pledge_totals(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_pledge_before', None)
+    if created or before is None:
+        campaigns.pledge_added(instance)
+    else:
+        campaigns.pledge_changed(before, instance)
+
+
+@receiver(post_delete, sender=Pledge)
+def remove_pledge_totals(sender, instance, **kwargs):
+    campaigns.pledge_removed(instance.campaign_id, instance.member_id, instance.amount)
+
+
+@receiver([post_save, post_delete], sender=Donation)
+def donation_changed(sender, **kwargs):
+    bump_version("donations")
+
+
+@receiver([post_save, post_delete], sender=Expense)
+def expense_changed(sender, **kwargs):
+    bump_version("expenses")
+
+
+@receiver([post_save, post_delete], sender=Campaign)
+def campaign_changed(sender, **kwargs):
+    # Renames, new goals and deletions show on the cached thermometers
+    bump_version("campaigns")
@@ -0,0 +1,69 @@
+"""
+Giving statement PDF layout.
+
+Deliberately free of Django imports: ``render_statement`` runs in
+ProcessPoolExecutor workers and only ever sees plain data, so the workers
+don't need Django set up or a database connection.
+"""
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+TABLE_STYLE = TableStyle([
+    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("ALIGN", (-1, 0), (-1, -1), "RIGHT"),
+])
+
+
+def render_statement(statement):
+    """
+    Build one statement and return ``(member id, pdf bytes)``.
+
+    ``statement`` is a dict with ``member_id``, ``name``, ``year``,
+    ``church``, ``issued`` and ``total`` strings, ``gifts`` as (date,
+    category, method, reference, amount) string tuples, and ``categories``
+    as (category, amount) string pairs.
+    """
+    # Paragraph text is markup: a name like "Smith & Sons" or "<Ann>" must
+    # be escaped or the build fails. Table cells are plain text.
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title=f"Giving Statement {statement['year']}")
+    styles = getSampleStyleSheet()
+
+    elements = [
+        Paragraph(f"<b>{escape(statement['church'])}</b>", styles["Title"]),
+        Paragraph(f"Giving Statement for {statement['year']}", styles["Heading2"]),
+        Spacer(1, 6),
+        Paragraph(f"Prepared for: <b>{escape(statement['name'])}</b>", styles["Normal"]),
+        Paragraph(f"Issued: {statement['issued']}", styles["Normal"]),
+        Spacer(1, 12),
+        Paragraph(f"Total given in {statement['year']}: <b>Ksh {statement['total']}</b>", styles["Heading3"]),
+        Spacer(1, 12),
+    ]
+
+    summary = Table([["Category", "Total (Ksh)"], *statement["categories"]], colWidths=[300, 150])
+    summary.setStyle(TABLE_STYLE)
+    elements += [summary, Spacer(1, 20)]
+
+    elements.append(Paragraph("<b>Gifts</b>", styles["Heading3"]))
+    gifts = Table(
+        [["Date", "Category", "Method", "Reference", "Amount (Ksh)"], *statement["gifts"]],
+        colWidths=[75, 95, 85, 130, 90],
+        repeatRows=1,
+    )
+    gifts.setStyle(TABLE_STYLE)
+    elements += [gifts, Spacer(1, 20)]
+
+    elements.append(Paragraph(
+        "Thank you for your generosity. This statement lists the completed gifts we received "
+        "from you during the year.",
+        styles["Italic"],
+    ))
+    doc.build(elements)
+    return statement["member_id"], buffer.getvalue()
@@ -0,0 +1,270 @@
+import csv
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from koma.cache import bump_version
+
+from . import campaigns, contributions, ledger
+from .models import Donation
+
+CHUNK_SIZE = 2000
+
+# Header names used by M-Pesa and the banks' CSV exports, by meaning
+COLUMN_ALIASES = {
+    "reference": ("receipt no.", "receipt no", "receipt", "reference", "transaction id", "ref", "trans id"),
+    "date": ("completion time", "transaction date", "value date", "date", "initiation time"),
+    "amount": ("paid in", "credit", "amount", "deposit"),
+    "phone": ("phone", "phone number", "msisdn", "mobile"),
+    "details": ("details", "description", "narration", "other party info", "particulars"),
+}
+DATE_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y", "%d-%b-%Y", "%d %b %Y")
+PHONE_IN_TEXT = re.compile(r"(?:\+?254|0)(7\d{8}|1\d{8})")
+
+StatementLine = namedtuple("StatementLine", "line reference day amount phone raw")
+
+
+def _phone_key(phone):
+    """Compare phone numbers on their last nine digits (07.. / 2547.. / +2547..)."""
+    digits = "".join(ch for ch in phone or "" if ch.isdigit())
+    return digits[-9:] if len(digits) >= 9 else None
+
+
+def _parse_day(value):
+    value = (value or "").strip()
+    when = parse_datetime(value.replace("T", " ")) if value else None
+    if when:
+        return when.date()
+    day = parse_date(value) if value else None
+    if day:
+        return day
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    value = (value or "").replace(",", "").replace("KES", "").replace("Ksh", "").strip()
+    if not value:
+        return None
+    try:
+        return Decimal(value).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return None
+
+
+def _resolve_columns(fieldnames):
+    normalised = {(name or "").strip().lower(): name for name in fieldnames or []}
+    columns = {}
+    for meaning, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalised:
+                columns[meaning] = normalised[alias]
+                break
+    missing = {"date", "amount"} - columns.keys()
+    if missing:
+        raise ValueError(f"Statement is missing a column for: {', '.join(sorted(missing))}")
+    return columns
+
+
+def iter_statement(lines, delimiter=",", on_reject=None):
+    """
+    Yield StatementLine tuples lazily from a CSV statement.
+
+    Only money coming in is yielded; withdrawals and charges are skipped.
+    Lines whose date or amount can't be read go to ``on_reject``.
+    """
+    reader = csv.DictReader(lines, delimiter=delimiter)
+    columns = _resolve_columns(reader.fieldnames)
+    days = {}
+    for row in reader:
+        raw_amount = row.get(columns["amount"])
+        amount = _parse_amount(raw_amount)
+        if amount is None or amount <= 0:
+            if (raw_amount or "").strip() and amount is None and on_reject:
+                on_reject(reader.line_num, "Unreadable amount", row)
+            continue
+
+        raw_date = row.get(columns["date"])
+        # Statements repeat the same dates; parse each one once
+        if raw_date not in days:
+            days[raw_date] = _parse_day(raw_date)
+        day = days[raw_date]
+        if day is None:
+            if on_reject:
+                on_reject(reader.line_num, "Unreadable date", row)
+            continue
+
+        phone = row.get(columns["phone"]) if "phone" in columns else None
+        if not phone and "details" in columns:
+            found = PHONE_IN_TEXT.search(row.get(columns["details"]) or "")
+            phone = found.group(1) if found else None
+        reference = (row.get(columns["reference"]) or "").strip().upper() if "reference" in columns else ""
+        yield StatementLine(reader.line_num, reference, day, amount, _phone_key(phone), row)
+
+
+class DonationIndex:
+    """
+    In-memory hash index of unreconciled donations.
+
+    Keyed on transaction id for exact matches, and on (phone, amount) with a
+    date-sorted list per key for the windowed match. Matched donations are
+    taken out so each one is reconciled at most once.
+    """
+
+    def __init__(self, donations):
+        self.by_reference = {}
+        self.by_phone_amount = defaultdict(list)
+        self.rows = {}
+        for pk, status, reference, phone, member_phone, amount, when in donations:
+            day = timezone.localtime(when).date()
+            amount = Decimal(amount).quantize(Decimal("0.01"))
+            self.rows[pk] = (status, day, amount)
+            if reference:
+                self.by_reference[reference.strip().upper()] = pk
+            phone = _phone_key(phone) or _phone_key(member_phone)
+            if phone:
+                insort(self.by_phone_amount[(phone, amount)], (day, pk))
+
+    @classmethod
+    def unreconciled(cls, method, since=None):
+        # Only the statement's own channel: a cash gift of the same amount
+        # must not be matched (or reported missing) against M-Pesa lines.
+        donations = (
+            Donation.objects.filter(reconciled_at__isnull=True, payment_method=method)
+            .exclude(status="failed")
+        )
+        if since:
+            donations = donations.filter(date_donated__date__gte=since)
+        return cls(donations.values_list(
+            "id", "status", "transaction_id", "phone_number", "member__phone", "amount", "date_donated",
+        ).iterator(chunk_size=5000))
+
+    def _take(self, pk):
+        status, _, _ = self.rows.pop(pk)
+        return pk, status
+
+    def match(self, line, window):
+        """Return (donation id, status, how) for a statement line, or None."""
+        if line.reference:
+            pk = self.by_reference.get(line.reference)
+            if pk in self.rows and self.rows[pk][2] == line.amount:
+                del self.by_reference[line.reference]
+                return (*self._take(pk), "reference")
+
+        if line.phone:
+            candidates = self.by_phone_amount.get((line.phone, line.amount))
+            if candidates:
+                # Nearest unmatched donation within the window
+                start = bisect_left(candidates, (line.day - window, 0))
+                best = None
+                for i in range(start, len(candidates)):
+                    day, pk = candidates[i]
+                    if day > line.day + window:
+                        break
+                    if pk in self.rows and (best is None or abs(day - line.day) < abs(candidates[best][0] - line.day)):
+                        best = i
+                if best is not None:
+                    day, pk = candidates.pop(best)
+                    return (*self._take(pk), "phone+amount")
+        return None
+
+    def unmatched_between(self, first, last):
+        """Completed donations dated inside the statement's period that it didn't cover."""
+        return [
+            (pk, day, amount)
+            for pk, (status, day, amount) in self.rows.items()
+            if status == "completed" and first <= day <= last
+        ]
+
+
+def _apply(matches, dry_run):
+    """Mark a chunk of (donation id, statement ref, how matched) tuples as reconciled."""
+    if dry_run or not matches:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        donations = Donation.objects.select_for_update().in_bulk([pk for pk, _, _ in matches])
+        changed = []
+        for pk, reference, _ in matches:
+            donation = donations.get(pk)
+            if donation is None or donation.reconciled_at:
+                continue
+            ledger_before, totals_before = ledger.entry(donation), contributions.line(donation)
+            campaign_before = campaigns.line(donation)
+            donation.reconciled_at = now
+            donation.statement_ref = reference[:100]
+            # Money on the statement settles a donation still waiting on M-Pesa
+            if donation.status in ("pending", "unknown"):
+                donation.status = "completed"
+                # bulk_update skips the signals, so move the amount here
+                ledger.move(ledger_before, ledger.entry(donation))
+                contributions.move(totals_before, contributions.line(donation))
+                campaigns.move(campaign_before, campaigns.line(donation))
+            changed.append(donation)
+        Donation.objects.bulk_update(changed, ["reconciled_at", "statement_ref", "status"], batch_size=500)
+    bump_version("donations")
+
+
+def reconcile_statement(lines, method="mpesa", delimiter=",", window_days=3, since=None, chunk_size=CHUNK_SIZE,
+                        dry_run=False, on_exception=None):
+    """
+    Stream a statement against unreconciled donations and apply the matches.
+
+    ``method`` is the payment method the statement covers ("mpesa" for an
+    M-Pesa statement, "bank" for a bank one); other donations are ignored.
+
+    Memory is bounded by the number of unreconciled donations (the hash
+    index), not the statement length. ``on_exception(kind, details)`` gets
+    every statement line that matched nothing and every donation dated
+    within the statement's period that the statement didn't cover.
+    Returns a dict of counts.
+    """
+    report = on_exception or (lambda kind, details: None)
+    index = DonationIndex.unreconciled(method, since)
+    window = timedelta(days=window_days)
+    stats = {"lines": 0, "matched": 0, "completed": 0, "unmatched_lines": 0, "rejected": 0, "missing_donations": 0}
+    first = last = None
+    batch = []
+
+    def on_reject(line, reason, row):
+        stats["rejected"] += 1
+        report("rejected", {"line": line, "reason": reason, **row})
+
+    for line in iter_statement(lines, delimiter, on_reject):
+        stats["lines"] += 1
+        first = line.day if first is None or line.day < first else first
+        last = line.day if last is None or line.day > last else last
+
+        found = index.match(line, window)
+        if found is None:
+            stats["unmatched_lines"] += 1
+            report("unmatched_line", {"line": line.line, "reason": "No matching donation", **line.raw})
+            continue
+        pk, status, how = found
+        stats["matched"] += 1
+        if status in ("pending", "unknown"):
+            stats["completed"] += 1
+        batch.append((pk, line.reference or f"line {line.line}", how))
+        if len(batch) >= chunk_size:
+            _apply(batch, dry_run)
+            batch = []
+    _apply(batch, dry_run)
+
+    if first is not None:
+        for pk, day, amount in index.unmatched_between(first, last):
+            stats["missing_donations"] += 1
+            report("missing_donation", {
+                "donation": pk, "date": day.isoformat(), "amount": str(amount),
+                "reason": "Completed donation not found on the statement",
+            })
+    return stats
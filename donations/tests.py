@@ -1,3 +1,184 @@
-from django.test import TestCase
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Member
+from accounts.mpesa import MpesaError
+
+from . import campaigns, contributions, ledger, recurring
+from .batches import BatchError, post_batch
+from .models import Campaign, Donation, RecurringGift, RecurringGiftRun
+
+
+def make_member(username):
+    return Member.objects.get_or_create(user=User.objects.create_user(username))[0]
+
+
+class FakeDaraja:
+    """Answers STK pushes from a list of outcomes: a checkout id, an error dict, or an exception."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.pushes = 0
+
+    def stk_push(self, **kwargs):
+        self.pushes += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ws_CO_ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, dict):
+            return outcome
+        return {"ResponseCode": "0", "CheckoutRequestID": f"{outcome}-{self.pushes}"}
+
+
+class RollupsTestCase(TestCase):
+    def assertRollupsAgree(self):
+        self.assertEqual(ledger.verify(), [])
+        self.assertEqual(contributions.verify(), [])
+        self.assertEqual(campaigns.verify(), [])
+
+
+class OfferingBatchTests(RollupsTestCase):
+    def setUp(self):
+        self.members = [make_member(f"m{i}") for i in range(3)]
+        Campaign.objects.create(name="Roof", slug="roof", category="building", goal=1000)
+
+    def test_batch_keeps_rollups_in_step(self):
+        data = {
+            "declared_total": "650",
+            "reference": "sunday-1",
+            "lines": [
+                {"member": self.members[0].pk, "amount": "100"},
+                {"member": self.members[1].pk, "amount": "250", "category": "building"},
+                {"member": self.members[2].pk, "amount": "300", "category": "tithe", "payment_method": "mpesa"},
+            ],
+        }
+        batch, created = post_batch(data)
+        self.assertTrue(created)
+        self.assertEqual(batch.total, Decimal("650"))
+        self.assertEqual(Campaign.objects.get(slug="roof").raised, Decimal("250"))
+        self.assertRollupsAgree()
+
+        # Resubmitting the same reference returns the batch, without counting it twice
+        self.assertEqual(post_batch(data), (batch, False))
+        self.assertEqual(Donation.objects.count(), 3)
+        self.assertRollupsAgree()
+
+    def test_invalid_batch_writes_nothing(self):
+        with self.assertRaises(BatchError) as raised:
+            post_batch({"declared_total": "100", "lines": [
+                {"member": self.members[0].pk, "amount": "100"},
+                {"member": self.members[1].pk, "amount": "-5"},
+                {"member": self.members[1].pk, "amount": "NaN"},
+                {"member": self.members[1].pk, "amount": "Infinity"},
+            ]})
+        self.assertEqual(
+            [error["line"] for error in raised.exception.errors if error["error"] == "Amount must be a positive number"],
+            [2, 3, 4],
+        )
+        self.assertFalse(Donation.objects.exists())
+        self.assertRollupsAgree()
+
+    def test_lines_with_wrong_types_are_reported(self):
+        with self.assertRaises(BatchError) as raised:
+            post_batch({"declared_total": "500", "lines": [
+                {"member": [self.members[0].pk], "amount": "100"},
+                {"member": True, "amount": "100"},
+                {"member": self.members[0].pk, "amount": "100", "category": ["tithe"]},
+                {"member": self.members[0].pk, "amount": "100", "payment_method": {"cash": 1}},
+                {"member": self.members[0].pk, "amount": "100"},
+            ]})
+        self.assertEqual(
+            [(error["line"], error["error"]) for error in raised.exception.errors],
+            [(1, "Unknown member"), (2, "Unknown member"), (3, "Unknown category"), (4, "Unsupported payment method")],
+        )
+
+
+class CampaignProgressTests(TestCase):
+    def test_progress_follows_campaign_edits_and_deletes(self):
+        campaign = Campaign.objects.create(name="Roof", slug="roof", goal=1000)
+        self.assertEqual(json.loads(campaigns.progress("roof")[1])["goal"], "1000.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign.goal = 2500
+            campaign.save()
+        self.assertEqual(json.loads(campaigns.progress("roof")[1])["goal"], "2500.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign.delete()
+        self.assertIsNone(campaigns.progress("roof"))
+
+
+@override_settings(RECURRING_RETRY_BASE=0)
+class RecurringTests(RollupsTestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        self.schedule = RecurringGift.objects.create(
+            member=make_member("regular"), amount=200, phone_number="254712345678",
+            starts_on=self.today - timedelta(days=14), next_run_on=self.today - timedelta(days=14),
+        )
+
+    def test_claim_is_idempotent(self):
+        run = recurring.claim(self.schedule, self.today)
+        self.assertEqual(run.period, self.today)
+        # A second claim from a stale copy of the schedule loses the race
+        self.assertIsNone(recurring.claim(self.schedule, self.today))
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.next_run_on, self.today + timedelta(days=7))
+        self.assertEqual(RecurringGiftRun.objects.count(), 1)
+
+    def test_claim_skips_a_period_already_run(self):
+        RecurringGiftRun.objects.create(schedule=self.schedule, period=self.today)
+        self.assertIsNone(recurring.claim(self.schedule, self.today))
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.next_run_on, self.today + timedelta(days=7))
+
+    def test_run_due_pushes_once_per_period(self):
+        client = FakeDaraja()
+        self.assertEqual(
+            recurring.run_due(client=client, rate=0),
+            {"claimed": 1, "pushed": 1, "unknown": 0, "retry": 0, "failed": 0},
+        )
+        self.assertEqual(recurring.run_due(client=client, rate=0)["claimed"], 0)
+        self.assertEqual(client.pushes, 1)
+        self.assertEqual(Donation.objects.get().status, "pending")
+        self.assertRollupsAgree()
+
+    @mock.patch("accounts.stk.time.sleep")
+    def test_failed_push_is_retried_with_a_new_donation(self, sleep):
+        client = FakeDaraja(MpesaError("down", retryable=True), MpesaError("down", retryable=True),
+                            MpesaError("down", retryable=True))
+        self.assertEqual(recurring.run_due(client=client, rate=0)["retry"], 1)
+        self.assertEqual(recurring.run_due(client=client, rate=0)["pushed"], 1)
+        self.assertEqual(
+            sorted(Donation.objects.values_list("status", flat=True)), ["failed", "pending"],
+        )
+        self.assertRollupsAgree()
+
+    def test_timed_out_push_waits_for_daraja(self):
+        client = FakeDaraja(MpesaError("read timed out"))
+        self.assertEqual(recurring.run_due(client=client, rate=0)["unknown"], 1)
+        # Reconciliation can't ask Daraja about it, so the run keeps waiting
+        donation = Donation.objects.get()
+        donation.status = "unknown"
+        donation.save()
+        self.assertEqual(recurring.run_due(client=client, rate=0)["claimed"], 0)
+        self.assertEqual(client.pushes, 1)
+        # Only a reported failure retries it
+        donation.status = "failed"
+        donation.save()
+        self.assertEqual(recurring.run_due(client=client, rate=0)["pushed"], 1)
+        self.assertEqual(client.pushes, 2)
+        self.assertRollupsAgree()
+
+    def test_next_date_keeps_month_end(self):
+        schedule = RecurringGift(frequency="monthly", starts_on=date(2026, 1, 31))
+        self.assertEqual(recurring.next_date(schedule, date(2026, 1, 31)), date(2026, 2, 28))
+        self.assertEqual(recurring.next_date(schedule, date(2026, 2, 28)), date(2026, 3, 31))
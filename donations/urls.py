@@ -7,12 +7,29 @@ urlpatterns = [
     path('', views.index, name='index'),  # Redirects /donations/ to finances dashboard
     path('finances/', views.finances_dashboard, name='finances'),
     path('list/', views.donation_list, name='summary'),
+    path('export/donations.<str:fmt>', views.export_donations, name='export_donations'),
+    path('export/expenses.<str:fmt>', views.export_expenses, name='export_expenses'),
     path('<int:pk>/', views.donation_detail, name='detail'),
     
     # ---- Donation Routes ----
     path('donate/', views.add_donation, name='make_donation'),  # renamed for clarity
     path('contribute/', views.add_donation, name='make_contribution'),  # alias for dashboard link
 
+    # ---- Recurring Giving ----
+    path('recurring/', views.recurring_gifts, name='recurring_gifts'),
+    path('recurring/<int:pk>/<str:action>/', views.recurring_gift_action, name='recurring_gift_action'),
+
+    # ---- Offering Batches ----
+    path('offerings/', views.offering_batches, name='offering_batches'),
+    path('offerings/roster/', views.offering_roster, name='offering_roster'),
+    path('offerings/api/batches/', views.offering_batch_api, name='offering_batch_api'),
+
+    # ---- Campaigns & Pledges ----
+    path('campaigns/', views.campaign_list, name='campaigns'),
+    path('campaigns/<slug:slug>/', views.campaign_detail, name='campaign_detail'),
+    path('campaigns/<slug:slug>/thermometer/', views.campaign_thermometer, name='campaign_thermometer'),
+    path('campaigns/<slug:slug>/progress.json', views.campaign_progress, name='campaign_progress'),
+
     # ---- Expense Routes ----
     path('expense/add/', views.add_expense, name='add_expense'),
 ]
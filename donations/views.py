@@ -1,7 +1,28 @@
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Sum
-from .models import Donation, Expense
-from .forms import DonationForm, ExpenseForm
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET, require_POST
+
+from koma.cache import versioned_key
+from accounts import roster
+from accounts.models import Member
+from . import batches, campaigns, exports, ledger, recurring
+from .models import Campaign, Donation, Expense, OfferingBatch, Pledge, RecurringGift
+from .forms import DonationForm, ExpenseForm, PledgeForm, RecurringGiftForm
+
+def is_admin(user):
+    """Check if the user is staff or superuser."""
+    return user.is_staff or user.is_superuser
+
 
 # Redirect root /donations/ to finances dashboard
 def index(request):
@@ -9,52 +30,177 @@ def index(request):
 
 
 # ---------------- Finances Dashboard ----------------
-def finances_dashboard(request):
-    donations_qs = Donation.objects.all()
-
-    # Filter donations based on GET parameters
-    start = request.GET.get('start')
-    end = request.GET.get('end')
-    method = request.GET.get('method')
-    category = request.GET.get('category')
-
-    if start:
-        donations_qs = donations_qs.filter(date_donated__date__gte=start)
-    if end:
-        donations_qs = donations_qs.filter(date_donated__date__lte=end)
-    if method:
-        donations_qs = donations_qs.filter(payment_method=method)
-    if category:
-        donations_qs = donations_qs.filter(category=category)
-
-    # Totals
-    total_donations = donations_qs.aggregate(total=Sum('amount'))['total'] or 0
-    total_expenses = Expense.objects.aggregate(total=Sum('amount'))['total'] or 0
-    net_balance = total_donations - total_expenses
-
-    # Donations by category for chart
-    categories = (
-        Donation.objects
-        .values('category')
-        .annotate(total=Sum('amount'))
+def _finance_filters(params):
+    """
+    Clean the dashboard's GET filters.
+
+    Unknown methods/categories and unparseable dates are dropped, so junk
+    query strings can't fan out into separate cache entries.
+    """
+    filters = {}
+    for name in ('start', 'end'):
+        value = parse_date(params.get(name) or '')
+        if value:
+            filters[name] = value
+    if params.get('method') in dict(Donation.PAYMENT_METHODS):
+        filters['method'] = params['method']
+    if params.get('category') in dict(Donation.CATEGORY_CHOICES):
+        filters['category'] = params['category']
+    return filters
+
+
+def _date_range(field, filters):
+    """Turn start/end dates into a range on ``field`` that can use its index."""
+    lookups = {}
+    if 'start' in filters:
+        lookups[f'{field}__gte'] = timezone.make_aware(datetime.combine(filters['start'], time.min))
+    if 'end' in filters:
+        lookups[f'{field}__lt'] = timezone.make_aware(datetime.combine(filters['end'] + timedelta(days=1), time.min))
+    return lookups
+
+
+def _filters_key(filters):
+    return [f'{name}={value}' for name, value in sorted(filters.items())]
+
+
+def _donation_filters(filters):
+    lookups = _date_range('date_donated', filters)
+    if 'method' in filters:
+        lookups['payment_method'] = filters['method']
+    if 'category' in filters:
+        lookups['category'] = filters['category']
+    return lookups
+
+
+def _expense_filters(filters):
+    """Only the date range applies to expenses."""
+    return _date_range('date_recorded', filters)
+
+
+def _breakdown(field, choices):
+    """Conditional Sum() aggregates of ledger totals for every choice of ``field``."""
+    return {
+        f'{field}:{value}': Sum('total', filter=Q(**{field: value}), default=0)
+        for value, _ in choices
+    }
+
+
+def finance_summary(filters):
+    """
+    Totals and breakdowns for the finances dashboard.
+
+    Read from the ledger rollups in a single pass per kind: the per-category,
+    per-method and per-status sums are conditional aggregates of the same
+    scan. The result is cached per filter set until a Donation or Expense is
+    written.
+    """
+    key = versioned_key(('donations', 'expenses'), 'finances', *_filters_key(filters))
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    donation_rows = ledger.ledger_rows('donation', filters.get('start'), filters.get('end'))
+    if 'method' in filters:
+        donation_rows = donation_rows.filter(payment_method=filters['method'])
+    if 'category' in filters:
+        donation_rows = donation_rows.filter(category=filters['category'])
+    donation_totals = donation_rows.aggregate(
+        # Pending, unconfirmed and failed gifts show in the status breakdown
+        # but are not money received.
+        overall=Sum('total', filter=Q(status='completed'), default=0),
+        **_breakdown('category', Donation.CATEGORY_CHOICES),
+        **_breakdown('payment_method', Donation.PAYMENT_METHODS),
+        **_breakdown('status', Donation.STATUS_CHOICES),
     )
+    # Expenses have no payment method, and their categories differ from
+    # donation categories, so only the date range applies.
+    expense_totals = ledger.ledger_rows('expense', filters.get('start'), filters.get('end')).aggregate(
+        overall=Sum('total', default=0),
+        **_breakdown('category', Expense.CATEGORY_CHOICES),
+    )
+
+    def split(totals, field, choices):
+        return [
+            {field: label, 'total': totals[f'{field}:{value}']}
+            for value, label in choices
+        ]
 
-    # Recent records
-    recent_donations = donations_qs.order_by('-date_donated')[:12]
-    recent_expenses = Expense.objects.order_by('-date_recorded')[:12]
+    summary = {
+        'total_donations': donation_totals['overall'],
+        'total_expenses': expense_totals['overall'],
+        'net_balance': donation_totals['overall'] - expense_totals['overall'],
+        'categories': split(donation_totals, 'category', Donation.CATEGORY_CHOICES),
+        'methods': split(donation_totals, 'payment_method', Donation.PAYMENT_METHODS),
+        'statuses': split(donation_totals, 'status', Donation.STATUS_CHOICES),
+        'expense_categories': split(expense_totals, 'category', Expense.CATEGORY_CHOICES),
+    }
+    cache.set(key, summary, getattr(settings, 'FINANCES_CACHE_TIMEOUT', 60 * 60))
+    return summary
+
+
+def finances_dashboard(request):
+    filters = _finance_filters(request.GET)
+    summary = finance_summary(filters)
+
+    key = versioned_key(('donations', 'expenses'), 'finances-recent', *_filters_key(filters))
+    recent = cache.get(key)
+    if recent is None:
+        recent = {
+            'donations': list(
+                Donation.objects.filter(**_donation_filters(filters))
+                .select_related('member__user')
+                .order_by('-date_donated')[:12]
+            ),
+            'expenses': list(
+                Expense.objects.filter(**_expense_filters(filters)).order_by('-date_recorded')[:12]
+            ),
+        }
+        cache.set(key, recent, getattr(settings, 'FINANCES_CACHE_TIMEOUT', 60 * 60))
 
     context = {
-        'total_donations': total_donations,
-        'total_expenses': total_expenses,
-        'net_balance': net_balance,
-        'categories': categories,
-        'donations': recent_donations,
-        'expenses': recent_expenses,
+        **summary,
+        **recent,
+        'filters': filters,
+        'payment_methods': Donation.PAYMENT_METHODS,
+        'donation_categories': Donation.CATEGORY_CHOICES,
     }
 
     return render(request, 'donations/finances.html', context)
 
 
+# ---------------- Exports ----------------
+def _export_name(kind, filters):
+    parts = [kind]
+    if 'start' in filters or 'end' in filters:
+        parts.append(f"{filters.get('start', 'start')}_to_{filters.get('end', 'today')}")
+    parts += [filters[name] for name in ('category', 'method') if name in filters]
+    return '-'.join(str(part) for part in parts)
+
+
+@user_passes_test(is_admin)
+def export_donations(request, fmt):
+    """Donations matching the finances dashboard filters, as CSV or XLSX."""
+    if fmt not in exports.FORMATS:
+        raise Http404
+    filters = _finance_filters(request.GET)
+    donations = Donation.objects.filter(**_donation_filters(filters)).order_by('date_donated', 'id')
+    return exports.export_response(
+        donations, exports.DONATION_COLUMNS, _export_name('donations', filters), fmt
+    )
+
+
+@user_passes_test(is_admin)
+def export_expenses(request, fmt):
+    """Expenses in the dashboard's date range, as CSV or XLSX."""
+    if fmt not in exports.FORMATS:
+        raise Http404
+    filters = _finance_filters(request.GET)
+    expenses = Expense.objects.filter(**_expense_filters(filters)).order_by('date_recorded', 'id')
+    return exports.export_response(
+        expenses, exports.EXPENSE_COLUMNS, _export_name('expenses', filters), fmt
+    )
+
+
 # ---------------- Donations List & Detail ----------------
 def donation_list(request):
     donations = Donation.objects.order_by('-date_donated')
@@ -90,3 +236,154 @@ def add_expense(request):
         form = ExpenseForm()
 
     return render(request, 'donations/expense_form.html', {'form': form})
+
+
+# ---------------- Offering Batches (Sunday counting) ----------------
+def build_offering_roster():
+    """Compact member list for the counting screen: [member id, display name, phone suffix]."""
+    rows = (
+        Member.objects.filter(user__is_active=True)
+        .order_by('user__first_name', 'user__last_name', 'user__username')
+        .values_list('id', 'user__first_name', 'user__last_name', 'user__username', 'phone')
+    )
+    return roster.compact(rows)
+
+
+@user_passes_test(is_admin)
+@require_GET
+def offering_roster(request):
+    """Served once per counting session; the screen revalidates with If-None-Match."""
+    return roster.roster_response(request, 'offering-roster', build_offering_roster)
+
+
+@user_passes_test(is_admin)
+@require_POST
+def offering_batch_api(request):
+    """
+    Post a counted offering batch as JSON (see donations.batches.post_batch).
+
+    All-or-nothing: a bad line or a total that doesn't match the declared
+    amount rejects the whole batch with the reasons, and nothing is saved.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+
+    try:
+        batch, created = batches.post_batch(data, counted_by=request.user)
+    except batches.BatchError as exc:
+        return JsonResponse({'error': str(exc), 'errors': exc.errors, **exc.details}, status=400)
+
+    return JsonResponse({
+        'batch': batch.id,
+        'lines': batch.line_count,
+        'total': str(batch.total),
+        'created': created,
+    }, status=201 if created else 200)
+
+
+@user_passes_test(is_admin)
+def offering_batches(request):
+    recent = OfferingBatch.objects.select_related('counted_by')[:30]
+    return render(request, 'donations/offering_batches.html', {
+        'batches': recent,
+        'categories': Donation.CATEGORY_CHOICES,
+        'today': timezone.localdate(),
+    })
+
+
+# ---------------- Campaigns & Pledges ----------------
+@require_GET
+def campaign_progress(request, slug):
+    """Public thermometer JSON, read from the campaign's stored totals via the cache."""
+    found = campaigns.progress(slug)
+    if found is None:
+        raise Http404("No such campaign")
+    key, payload = found
+    etag = f'"{key}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponse(status=304)
+    response = HttpResponse(payload, content_type='application/json')
+    response['ETag'] = etag
+    response['Access-Control-Allow-Origin'] = '*'  # embedded on the church website
+    return response
+
+
+def campaign_thermometer(request, slug):
+    campaign = get_object_or_404(Campaign, slug=slug)
+    return render(request, 'donations/campaign_thermometer.html', {'campaign': campaign})
+
+
+@user_passes_test(is_admin)
+def campaign_list(request):
+    return render(request, 'donations/campaigns.html', {'campaigns': Campaign.objects.all()})
+
+
+@user_passes_test(is_admin)
+def campaign_detail(request, slug):
+    campaign = get_object_or_404(Campaign, slug=slug)
+    if request.method == 'POST':
+        form = PledgeForm(request.POST)
+        if form.is_valid():
+            # One pledge per member: pledging again replaces the amount
+            Pledge.objects.update_or_create(
+                campaign=campaign, member=form.cleaned_data['member'],
+                defaults={'amount': form.cleaned_data['amount'], 'note': form.cleaned_data['note']},
+            )
+            messages.success(request, "Pledge saved.")
+            return redirect('donations:campaign_detail', slug=slug)
+    else:
+        form = PledgeForm()
+
+    pledges = campaign.pledges.select_related('member__user').order_by('member__user__first_name')
+    return render(request, 'donations/campaign_detail.html', {
+        'campaign': campaign,
+        'pledges': pledges,
+        'form': form,
+    })
+
+
+# ---------------- Recurring Giving ----------------
+@login_required
+def recurring_gifts(request):
+    member = get_object_or_404(Member, user=request.user)
+    if request.method == 'POST':
+        form = RecurringGiftForm(request.POST)
+        if form.is_valid():
+            schedule = form.save(commit=False)
+            schedule.member = member
+            schedule.next_run_on = schedule.starts_on
+            schedule.save()
+            messages.success(request, "Recurring gift set up. You'll get an M-Pesa prompt on each due date.")
+            return redirect('donations:recurring_gifts')
+    else:
+        form = RecurringGiftForm(initial={'phone_number': member.phone, 'starts_on': timezone.localdate()})
+
+    schedules = member.recurring_gifts.prefetch_related('runs__donation').order_by('-is_active', 'next_run_on')
+    return render(request, 'donations/recurring_gifts.html', {'form': form, 'schedules': schedules})
+
+
+@login_required
+@require_POST
+def recurring_gift_action(request, pk, action):
+    schedule = get_object_or_404(RecurringGift, pk=pk, member__user=request.user)
+    if action == 'pause':
+        schedule.is_active = False
+        schedule.save(update_fields=['is_active'])
+        messages.info(request, "Recurring gift paused.")
+    elif action == 'resume':
+        # Pick up from the next due date rather than replaying the paused ones
+        today = timezone.localdate()
+        schedule.next_run_on = recurring.next_date(schedule, today - timedelta(days=1))
+        schedule.is_active, schedule.failures, schedule.last_error = True, 0, ''
+        schedule.save(update_fields=['next_run_on', 'is_active', 'failures', 'last_error'])
+        messages.success(request, f"Recurring gift resumed from {schedule.next_run_on:%b %d}.")
+    elif action == 'cancel':
+        schedule.delete()
+        messages.info(request, "Recurring gift cancelled.")
+    else:
+        raise Http404("Unknown action")
+    return redirect('donations:recurring_gifts')
@@ -1,7 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
+from koma.cache import bump_version
+
 
 class Event(models.Model):
     title = models.CharField(max_length=255)
@@ -39,3 +43,11 @@ class EventRegistration(models.Model):
 
     def __str__(self):
         return f"{self.member.username} registered for {self.event.title}"
+
+
+# =====================================================
+# Signals: invalidate cached reports
+# =====================================================
+@receiver([post_save, post_delete], sender=Event)
+def bump_events_version(sender, **kwargs):
+    bump_version("events")
@@ -1,14 +1,23 @@
 import os
 from channels.auth import AuthMiddlewareStack
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
-import chat.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'koma.settings')
+django_asgi_app = get_asgi_application()
+
+import chat.routing  # noqa: E402  (needs the app registry loaded)
+import donations.routing  # noqa: E402
+from accounts.consumers import MpesaStkWorker, ReportWorker  # noqa: E402
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
-        URLRouter(chat.routing.websocket_urlpatterns)
+        URLRouter(chat.routing.websocket_urlpatterns + donations.routing.websocket_urlpatterns)
     ),
+    # Background jobs, served by `python manage.py runworker mpesa-stk reports`
+    "channel": ChannelNameRouter({
+        "mpesa-stk": MpesaStkWorker.as_asgi(),
+        "reports": ReportWorker.as_asgi(),
+    }),
 })
@@ -0,0 +1,120 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# =====================================================
+# Data-version counters
+# =====================================================
+# Every cached payload is keyed by the versions of the data it was built
+# from. Writers bump the version of their namespace instead of hunting down
+# individual cache keys, so stale entries simply stop being looked up (and
+# expire after DATA_CACHE_TIMEOUT, see payload_timeout).
+
+
+def _version_key(namespace):
+    return f"data-version:{namespace}"
+
+
+def _stamp_key(namespace):
+    return f"data-version-stamp:{namespace}"
+
+
+def _now():
+    return datetime.now(tz=dt_timezone.utc).timestamp()
+
+
+def get_versions(*namespaces):
+    """Return a {namespace: version} dict in a single cache round trip."""
+    found = cache.get_many([_version_key(ns) for ns in namespaces])
+    versions = {}
+    for ns in namespaces:
+        version = found.get(_version_key(ns))
+        if version is None:
+            # Seed from the clock so a counter lost to eviction never comes
+            # back at a value an older cached payload was keyed with.
+            cache.add(_version_key(ns), int(_now()), timeout=None)
+            version = cache.get(_version_key(ns))
+        versions[ns] = version
+    return versions
+
+
+def get_last_modified(*namespaces):
+    """Return the most recent bump time across the given namespaces, or None."""
+    found = cache.get_many([_stamp_key(ns) for ns in namespaces])
+    if not found:
+        return None
+    return datetime.fromtimestamp(max(found.values()), tz=dt_timezone.utc)
+
+
+def _bump(namespaces):
+    stamp = _now()
+    for ns in namespaces:
+        try:
+            cache.incr(_version_key(ns))
+        except ValueError:
+            cache.set(_version_key(ns), int(stamp), timeout=None)
+    cache.set_many({_stamp_key(ns): stamp for ns in namespaces}, timeout=None)
+
+
+def bump_version(*namespaces):
+    """
+    Invalidate every payload built from the given namespaces, once the
+    current transaction commits (straight away outside one).
+
+    Bumping earlier would let a reader rebuild from the uncommitted state's
+    predecessor and cache it under the new version until the next bump.
+    """
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def payload_timeout():
+    """How long cached payloads live: superseded versions are never read again, so let them go."""
+    return getattr(settings, "DATA_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def versioned_key(namespaces, *parts):
+    """Build a cache key that changes whenever any namespace is bumped."""
+    versions = get_versions(*namespaces)
+    stamp = "-".join(f"{ns}{versions[ns]}" for ns in namespaces)
+    return ":".join([stamp, *(str(p) for p in parts)])
+
+
+# =====================================================
+# Single-flight recomputation
+# =====================================================
+def get_or_compute(key, compute, timeout=None, wait=10.0, lock_timeout=60):
+    """
+    Return ``cache[key]``, calling ``compute()`` to fill it on a miss. The
+    value is kept for ``timeout`` seconds (default: payload_timeout()).
+
+    Concurrent misses for the same key compute it once: the first caller
+    takes a short-lived lock and the others poll for its result instead of
+    running the same queries in parallel. A waiter gives up after ``wait``
+    seconds and computes the value itself, so a crashed holder never blocks
+    a page for longer than that.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock = f"{key}:computing"
+    deadline = time.monotonic() + wait
+    while not cache.add(lock, 1, timeout=lock_timeout):
+        time.sleep(0.05)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if time.monotonic() >= deadline:
+            return compute()
+    try:
+        # Filled by the previous holder between our miss and taking the lock
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            cache.set(key, value, payload_timeout() if timeout is None else timeout)
+        return value
+    finally:
+        cache.delete(lock)
@@ -1,6 +1,10 @@
 # models.py
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from koma.cache import bump_version
 
 # ------------------------------
 # Admin-defined volunteer opportunities
@@ -37,6 +41,15 @@ class Volunteer(models.Model):
         return f"{self.user.username} - {self.opportunity.department}"
 
 
+# ------------------------------
+# Signals: invalidate cached reports
+# ------------------------------
+@receiver([post_save, post_delete], sender=Volunteer)
+@receiver([post_save, post_delete], sender=VolunteerOpportunity)
+def bump_volunteers_version(sender, **kwargs):
+    bump_version("volunteers")
+
+
 # views.py
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Volunteer, VolunteerOpportunity